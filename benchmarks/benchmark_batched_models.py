@@ -0,0 +1,50 @@
+"""Compare N separate simulations of small models with one batched run.
+
+Usage: python benchmark_batched_models.py [N_MODELS]
+"""
+
+import sys
+import time
+
+from topkappy import (
+    KappaModel,
+    KappaAgent,
+    KappaRule,
+    KappaSiteState,
+    get_batched_simulation_results,
+)
+
+
+def make_model(rate):
+    return KappaModel(
+        agents=[KappaAgent("A", ("b",)), KappaAgent("B", ("b",))],
+        rules=[
+            KappaRule(
+                "a.b",
+                [KappaSiteState("A", "b", "."), KappaSiteState("B", "b", ".")],
+                "->",
+                [KappaSiteState("A", "b", "1"), KappaSiteState("B", "b", "1")],
+                rate=rate,
+            )
+        ],
+        initial_quantities={"A": 20, "B": 20},
+        duration=10,
+        snapshot_times={"end": 10},
+        plots=[KappaSiteState("B", "b", ".")],
+    )
+
+
+n_models = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+models = [make_model(0.001 * (i + 1)) for i in range(n_models)]
+
+t0 = time.time()
+separate_results = [model.get_simulation_results() for model in models]
+separate_duration = time.time() - t0
+
+t0 = time.time()
+batched_results = get_batched_simulation_results(models)
+batched_duration = time.time() - t0
+
+print("%d separate runs: %.02fs" % (n_models, separate_duration))
+print("1 batched run: %.02fs" % batched_duration)
+print("Speed-up: x%.01f" % (separate_duration / batched_duration))
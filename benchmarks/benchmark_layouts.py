@@ -0,0 +1,61 @@
+"""Compare the networkx and grid force-directed layouts on synthetic polymers.
+
+Each polymer is a linear chain of agents A(l, r) bound r-to-l, converted to a
+graph with ports like in ``plot_snapshot_agents``. The grid layout is also
+timed with a warm start from the layout of a slightly shorter polymer.
+
+Usage: python benchmark_layouts.py [MAX_AGENTS] [N_THREADS]
+"""
+
+import sys
+import time
+
+import networkx as nx
+
+from topkappy import snapshot_agent_nodes_to_graph, grid_force_directed_layout
+
+max_agents = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+n_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+
+def polymer_nodes(n_agents):
+    nodes = []
+    for i in range(n_agents):
+        left = [[i - 1, 1]] if i > 0 else []
+        right = [[i + 1, 0]] if i < n_agents - 1 else []
+        nodes.append(
+            {
+                "node_type": "A",
+                "node_sites": [
+                    {
+                        "site_name": name,
+                        "site_type": ["port", {"port_links": links, "port_states": []}],
+                    }
+                    for name, links in [("l", left), ("r", right)]
+                ],
+            }
+        )
+    return nodes
+
+
+print("agents | graph nodes | networkx FR (s) | grid (s) | grid, warm start (s)")
+n_agents = 250
+while n_agents <= max_agents:
+    graph = snapshot_agent_nodes_to_graph(polymer_nodes(n_agents))
+    t0 = time.time()
+    nx.layout.fruchterman_reingold_layout(graph, seed=123)
+    t1 = time.time()
+    grid_force_directed_layout(graph, n_threads=n_threads)
+    t2 = time.time()
+    shorter = snapshot_agent_nodes_to_graph(polymer_nodes(n_agents - 10))
+    cached_positions = grid_force_directed_layout(shorter, n_threads=n_threads)
+    t3 = time.time()
+    grid_force_directed_layout(
+        graph, positions=cached_positions, iterations=15, n_threads=n_threads
+    )
+    t4 = time.time()
+    print(
+        "%6d | %11d | %15.2f | %8.2f | %20.2f"
+        % (n_agents, len(graph), t1 - t0, t2 - t1, t4 - t3)
+    )
+    n_agents *= 2
@@ -0,0 +1,76 @@
+"""Compare tau-leaping with exact (Gillespie) simulations of the README model.
+
+The copy numbers of the README model are multiplied (and the rates divided)
+by a scale factor, so that the mean-field dynamics stay the same.
+
+Usage: python benchmark_tau_leaping.py [SCALE] [REPLICATES]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from topkappy import (
+    KappaModel,
+    KappaAgent,
+    KappaRule,
+    KappaSiteState,
+    simulate_gillespie,
+    simulate_tau_leaping,
+)
+
+scale = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+replicates = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+model = KappaModel(
+    agents=[
+        KappaAgent("A", ("a", "b")),
+        KappaAgent("B", ("b", "c")),
+        KappaAgent("C", ("c", "d")),
+    ],
+    rules=[
+        KappaRule(
+            "a.b",
+            [KappaSiteState("A", "b", "."), KappaSiteState("B", "b", ".")],
+            "->",
+            [KappaSiteState("A", "b", "1"), KappaSiteState("B", "b", "1")],
+            rate=0.5e-2 / scale,
+        ),
+        KappaRule(
+            "b.c",
+            [KappaSiteState("B", "c", "."), KappaSiteState("C", "c", ".")],
+            "->",
+            [KappaSiteState("B", "c", "1"), KappaSiteState("C", "c", "1")],
+            rate=2.1e-2 / scale,
+        ),
+    ],
+    initial_quantities={"A": 100 * scale, "B": 100 * scale, "C": 100 * scale},
+    duration=10,
+    plots=[KappaSiteState("B", "b", "."), KappaSiteState("C", "c", ".")],
+)
+
+
+def summary(results):
+    finals = np.array(
+        [
+            [r["plots"][label][-1] for label in ("|B(b[.])|", "|C(c[.])|")]
+            for r in results
+        ]
+    )
+    return "final values mean %s, std %s" % (finals.mean(axis=0), finals.std(axis=0))
+
+
+t0 = time.time()
+exact_results = [simulate_gillespie(model, seed=i) for i in range(replicates)]
+exact_duration = time.time() - t0
+print("Exact: %.02fs, %s" % (exact_duration, summary(exact_results)))
+
+for epsilon in (0.01, 0.03, 0.1):
+    t0 = time.time()
+    results = simulate_tau_leaping(model, replicates, epsilon=epsilon, seed=0)
+    duration = time.time() - t0
+    print(
+        "Tau-leaping (epsilon=%.02f): %.02fs (x%.0f), %s"
+        % (epsilon, duration, exact_duration / duration, summary(results))
+    )
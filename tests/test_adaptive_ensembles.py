@@ -0,0 +1,45 @@
+from topkappy import (
+    KappaModel,
+    KappaAgent,
+    KappaRule,
+    KappaSiteState,
+    run_adaptive_ensemble,
+    run_adaptive_sweep,
+)
+
+
+def binding_model(binding_rate):
+    free_sites = [KappaSiteState("A", "b", "."), KappaSiteState("B", "a", ".")]
+    bound_sites = [KappaSiteState("A", "b", "1"), KappaSiteState("B", "a", "1")]
+    return KappaModel(
+        agents=[KappaAgent("A", ("b",)), KappaAgent("B", ("a",))],
+        rules=[
+            KappaRule("binding", free_sites, "->", bound_sites, rate=binding_rate),
+            KappaRule("unbinding", bound_sites, "->", free_sites, rate=0.1),
+        ],
+        initial_quantities={"A": 100, "B": 100},
+        duration=5,
+        plot_time_step=1,
+        plots=[KappaSiteState("A", "b", ".")],
+        engine="gillespie",
+    )
+
+
+def test_run_adaptive_sweep():
+    quiet_model, noisy_model = binding_model(0), binding_model(2e-3)
+    quiet, noisy = run_adaptive_sweep(
+        [quiet_model, noisy_model],
+        target_width=2,
+        min_replicates=3,
+        batch_size=20,
+        seed=1,
+    )
+    assert quiet["converged"] and quiet["replicates"] == 3
+    assert quiet["mean"]["|A(b[.])|"] == 100
+    assert noisy["converged"] and noisy["replicates"] > 10
+    assert noisy["confidence_interval_width"]["|A(b[.])|"] <= 2
+    budget_limited = run_adaptive_ensemble(
+        noisy_model, target_width=0.01, max_replicates=12, seed=1
+    )
+    assert budget_limited["replicates"] == 12
+    assert not budget_limited["converged"]
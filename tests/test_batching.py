@@ -0,0 +1,70 @@
+import pytest
+from topkappy import KappaModel, KappaAgent, KappaRule, KappaSiteState, ModelsBatch
+
+
+def make_model(rate, duration=10):
+    return KappaModel(
+        agents=[KappaAgent("A", ("b",)), KappaAgent("B", ("b",))],
+        rules=[
+            KappaRule(
+                "a.b",
+                [KappaSiteState("A", "b", "."), KappaSiteState("B", "b", ".")],
+                "->",
+                [KappaSiteState("A", "b", "1"), KappaSiteState("B", "b", "1")],
+                rate=rate,
+            )
+        ],
+        initial_quantities={"A": 10, "B": 10},
+        duration=duration,
+        snapshot_times={"end": duration},
+        plots=[KappaSiteState("B", "b", "."), "|A()|"],
+    )
+
+
+def test_models_batch():
+    batch = ModelsBatch([make_model(0.1), make_model(0.2, duration=0.2)])
+    script = batch.packed_model._full_kappa_script()
+    assert "'m1_a.b' m1_A(b[.]),m1_B(b[.]) -> m1_A(b[1]),m1_B(b[1]) @ 0.2" in script
+    assert "%plot: |m1_B(b[.])|" in script
+    assert "%plot: |m0_A()|" in script
+    assert script.count("$SNAPSHOT") == 2
+    node = {"node_sites": []}
+    packed_results = {
+        "plots": {
+            "[T]": (0, 0.1, 0.2, 0.3),
+            "|m0_B(b[.])|": (10, 9, 8, 7),
+            "|m0_A()|": (10, 10, 10, 10),
+            "|m1_B(b[.])|": (10, 8, 6, 4),
+            "|m1_A()|": (10, 10, 10, 10),
+        },
+        "snapshots": {
+            "batch_snapshot_0": {
+                "snapshot_agents": [
+                    [3, [dict(node, node_type="m0_A")]],
+                    [2, [dict(node, node_type="m1_A")]],
+                ]
+            }
+        },
+        "seed": 42,
+    }
+    results_0, results_1 = batch.unpack_results(packed_results)
+    assert results_0["seed"] is None and results_0["batch_seed"] == 42
+    assert results_0["plots"]["|B(b[.])|"] == (10, 9, 8, 7)
+    assert results_1["plots"] == {
+        "[T]": (0, 0.1, 0.2),
+        "|B(b[.])|": (10, 8, 6),
+        "|A()|": (10, 10, 10),
+    }
+    assert results_0["snapshots"] == {}
+    agents = results_1["snapshots"]["end"]["snapshot_agents"]
+    assert agents == [[2, [dict(node, node_type="A")]]]
+
+
+def test_models_batch_settings():
+    snapshot = {"snapshot_agents": [[7, [{"node_type": "A", "node_sites": []}]]]}
+    models = [make_model(0.1), make_model(0.1).copy(initial_snapshot=snapshot)]
+    script = ModelsBatch(models).packed_model._full_kappa_script()
+    assert "%init: 7 m1_A()" in script
+    for settings in [{"seed": 1}, {"timeout": 10}, {"engine": "ode"}]:
+        with pytest.raises(ValueError):
+            ModelsBatch([make_model(0.1), make_model(0.1).copy(**settings)])
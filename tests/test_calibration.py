@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from topkappy import (
+    KappaModel,
+    KappaAgent,
+    KappaRule,
+    KappaSiteState,
+    RatesCalibration,
+)
+
+
+def binding_model(binding_rate, unbinding_rate, **parameters):
+    free_sites = [KappaSiteState("A", "b", "."), KappaSiteState("B", "a", ".")]
+    bound_sites = [KappaSiteState("A", "b", "1"), KappaSiteState("B", "a", "1")]
+    return KappaModel(
+        agents=[KappaAgent("A", ("b",)), KappaAgent("B", ("a",))],
+        rules=[
+            KappaRule("binding", free_sites, "->", bound_sites, rate=binding_rate),
+            KappaRule("unbinding", bound_sites, "->", free_sites, rate=unbinding_rate),
+        ],
+        initial_quantities={"A": 200, "B": 100},
+        duration=20,
+        plot_time_step=1,
+        plots=[KappaSiteState("A", "b", ".")],
+        **parameters
+    )
+
+
+def test_rates_calibration():
+    true_model = binding_model(2e-3, 0.05, engine="ode")
+    plots = true_model.get_simulation_results()["plots"]
+    times = [2, 5, 10, 20]
+    targets = {"|A(b[.])|": (times, np.interp(times, plots["[T]"], plots["|A(b[.])|"]))}
+    calibration = RatesCalibration(
+        binding_model(1e-4, 0.5, engine="ode"),
+        targets=targets,
+        bounds={"binding": (1e-4, 1e-2), "unbinding": (1e-3, 1)},
+    )
+    for fit in [
+        calibration.differential_evolution(generations=25, population_size=10),
+        calibration.cma_es(generations=25),
+    ]:
+        assert fit["history"][-1] <= fit["history"][0]
+        assert abs(np.log(fit["rates"]["binding"] / 2e-3)) < 0.1
+        assert abs(np.log(fit["rates"]["unbinding"] / 0.05)) < 0.2
+    fitted = calibration.fitted_model(fit)
+    assert [rule.rate for rule in fitted.rules] == [
+        fit["rates"]["binding"],
+        fit["rates"]["unbinding"],
+    ]
+
+    # Warm start from the previous population: no new simulation needed.
+    n_cached = len(calibration.evaluator.cache)
+    warm_fit = calibration.differential_evolution(
+        generations=0, population_size=10, initial_rates=fit["population"]
+    )
+    assert len(calibration.evaluator.cache) == n_cached
+    assert warm_fit["loss"] <= fit["loss"]
+    warm_fit = calibration.cma_es(generations=0, initial_rates=fit["rates"])
+    assert len(calibration.evaluator.cache) == n_cached
+    assert warm_fit["loss"] == fit["loss"]
+    assert warm_fit["history"] == [fit["loss"]]
+    with pytest.raises(ValueError):
+        calibration.differential_evolution(population_size=3)
+
+
+def test_calibration_optimum_on_bound():
+    true_model = binding_model(2e-3, 0.05, engine="ode")
+    plots = true_model.get_simulation_results()["plots"]
+    times = [1, 2, 5, 10, 20]
+    targets = {"|A(b[.])|": (times, np.interp(times, plots["[T]"], plots["|A(b[.])|"]))}
+    for seed in range(3):
+        calibration = RatesCalibration(
+            binding_model(1e-4, 0.5, engine="ode"),
+            targets=targets,
+            bounds={"binding": (1e-4, 2e-3), "unbinding": (1e-3, 1)},
+            seed=seed,
+        )
+        fit = calibration.cma_es(generations=30)
+        # The search doesn't stall on the bound of the binding rate.
+        assert fit["loss"] < 0.01
+        assert abs(np.log(fit["rates"]["binding"] / 2e-3)) < 1e-6
+        assert abs(np.log(fit["rates"]["unbinding"] / 0.05)) < 0.01
+
+
+def test_replicates_averaging():
+    model = binding_model(2e-3, 0.05, engine="gillespie")
+    targets = {"|A(b[.])|": ([20], [120])}
+    calibration = RatesCalibration(
+        model, targets, bounds={"binding": (1e-4, 1e-2)}, replicates=4
+    )
+    losses = calibration.losses([{"binding": 2e-3}, {"binding": 2e-3}])
+    assert len(calibration.evaluator.cache) == 4
+    assert losses[0] == losses[1]
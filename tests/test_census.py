@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+from topkappy import KappaModel, KappaAgent, KappaRule, KappaSiteState, snapshot_census
+
+
+def test_complexes_census():
+    model = KappaModel(
+        agents=[KappaAgent("A", ("b",)), KappaAgent("B", ("a",))],
+        rules=[
+            KappaRule(
+                "binding",
+                [KappaSiteState("A", "b", "."), KappaSiteState("B", "a", ".")],
+                "->",
+                [KappaSiteState("A", "b", "1"), KappaSiteState("B", "a", "1")],
+                rate=1e-2,
+            )
+        ],
+        initial_quantities={"A": 50, "B": 30},
+        duration=10,
+        plot_time_step=1,
+        census_period=2.5,
+        snapshot_times={"end": 10},
+        engine="gillespie",
+        seed=1,
+    )
+    script = model._full_kappa_script()
+    assert '%mod: alarm 2.500 do $SNAPSHOT "census_1";' in script
+    assert '%mod: alarm 10.000 do $SNAPSHOT "census_4";' in script
+    results = model.get_simulation_results()
+    assert list(results["snapshots"]) == ["end"]
+    census = results["census"]
+    assert [c["time"] for c in census] == [2.5, 5.0, 7.5, 10.0]
+    for c in census:
+        n_dimers = c["species"].get("A(b[1]), B(a[1])", 0)
+        assert c["complex_sizes"] == {1: 80 - 2 * n_dimers, 2: n_dimers}
+        assert set(c["species"]) <= {"A(b[1]), B(a[1])", "A(b[.])", "B(a[.])"}
+    assert census[-1]["complex_sizes"][2] > census[0]["complex_sizes"][2] > 0
+    assert "census" not in model.copy(census_period=None).get_simulation_results()
+    with pytest.raises(ValueError):
+        model.copy(snapshot_times={"census_2": 5})
+    assert (
+        "census_2"
+        in model.copy(census_period=None, snapshot_times={"census_2": 5}).snapshot_times
+    )
+
+
+def port(name, links=()):
+    return {
+        "site_name": name,
+        "site_type": ["port", {"port_links": list(links), "port_states": []}],
+    }
+
+
+def test_canonical_species():
+    a_b_b = [
+        {"node_type": "A", "node_sites": [port("x", [[1, 0]]), port("y", [[2, 1]])]},
+        {"node_type": "B", "node_sites": [port("a", [[0, 0]]), port("c")]},
+        {"node_type": "B", "node_sites": [port("c"), port("a", [[0, 1]])]},
+    ]
+    b_b_a = [
+        {"node_type": "B", "node_sites": [port("a", [[2, 0]]), port("c")]},
+        {"node_type": "B", "node_sites": [port("c"), port("a", [[2, 1]])]},
+        {"node_type": "A", "node_sites": [port("y", [[0, 0]]), port("x", [[1, 1]])]},
+    ]
+    census = snapshot_census([[2, a_b_b], [3, b_b_a]])
+    assert census["species"] == {"A(x[1], y[2]), B(a[1], c[.]), B(a[2], c[.])": 5}
+
+
+def test_large_complexes_census():
+    def ring(n_agents, positions):
+        # positions[k] is the index, in the nodes list, of the k-th agent.
+        nodes = [None] * n_agents
+        for k, i in enumerate(positions):
+            left = [positions[(k - 1) % n_agents], 1]
+            right = [positions[(k + 1) % n_agents], 0]
+            nodes[i] = {
+                "node_type": "A",
+                "node_sites": [port("l", [left]), port("r", [right])],
+            }
+        return nodes
+
+    n_agents = 1000
+    in_order = ring(n_agents, list(range(n_agents)))
+    scrambled = ring(n_agents, [(7 * k) % n_agents for k in range(n_agents)][::-1])
+    chain = ring(n_agents, list(range(n_agents)))
+    chain[0]["node_sites"][0] = port("l")
+    chain[-1]["node_sites"][1] = port("r")
+    start_time = time.time()
+    census = snapshot_census([[1, in_order], [2, scrambled], [1, chain]])
+    assert time.time() - start_time < 5
+    assert census["complex_sizes"] == {1000: 4}
+    assert sorted(census["species"].values()) == [1, 3]
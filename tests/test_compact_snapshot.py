@@ -0,0 +1,37 @@
+import os
+from topkappy import CompactSnapshot, snapshot_agent_nodes_to_graph
+
+
+def port(name, links=(), states=()):
+    return {
+        "site_name": name,
+        "site_type": ["port", {"port_links": list(links), "port_states": list(states)}],
+    }
+
+
+SNAPSHOT_AGENTS = [
+    [
+        3,
+        [
+            {"node_type": "A", "node_sites": [port("a"), port("b", [[1, 0]])]},
+            {"node_type": "B", "node_sites": [port("b", [[0, 1]]), port("c")]},
+        ],
+    ],
+    [12, [{"node_type": "C", "node_sites": [port("c"), port("d", states=["u"])]}]],
+]
+
+
+def test_compact_snapshot_round_trip(tmpdir):
+    snapshot = CompactSnapshot.from_snapshot_agents(SNAPSHOT_AGENTS)
+    assert len(snapshot) == 2
+    assert snapshot[1] == SNAPSHOT_AGENTS[1]
+    assert snapshot.to_snapshot_agents() == SNAPSHOT_AGENTS
+    path = os.path.join(str(tmpdir), "snapshot.tksnap")
+    snapshot.write(path)
+    for mmap in (True, False):
+        loaded = CompactSnapshot.read(path, mmap=mmap)
+        assert loaded.to_snapshot_agents() == SNAPSHOT_AGENTS
+    count, nodes = loaded[-2]
+    graph = snapshot_agent_nodes_to_graph(nodes, with_ports=False)
+    assert count == 3
+    assert graph.number_of_edges() == 1
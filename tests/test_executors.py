@@ -0,0 +1,94 @@
+from concurrent import futures
+import os
+import pytest
+from topkappy import (
+    KappaModel,
+    KappaAgent,
+    KappaRule,
+    KappaSiteState,
+    SerialExecutor,
+    FuturesExecutor,
+    LocalProcessExecutor,
+    LocalWorkers,
+)
+
+TASKS = [[3, 1, 2], [2, 1], [], [5, 4]]
+EXPECTED = [[1, 2, 3], [1, 2], [], [4, 5]]
+
+
+def test_local_executors():
+    executors = [
+        SerialExecutor(),
+        FuturesExecutor(futures.ThreadPoolExecutor(2)),
+        LocalProcessExecutor(n_workers=2),
+    ]
+    for executor in executors:
+        with executor:
+            assert executor.map(sorted, TASKS) == EXPECTED
+
+
+def test_local_workers():
+    with LocalWorkers(n_workers=3) as workers:
+        with workers.executor() as executor:
+            assert executor.map(sorted, TASKS) == EXPECTED
+            assert executor.map(sorted, TASKS[:1]) == EXPECTED[:1]
+            with pytest.raises(TypeError):
+                executor.map(sorted, [1, 2])
+
+
+def test_local_workers_shared_and_stopped():
+    workers = LocalWorkers(n_workers=2)
+    executor, other_executor = workers.executor(), workers.executor()
+    # Two executors connected to the same workers don't block each other.
+    assert executor.map(sorted, TASKS) == EXPECTED
+    assert other_executor.map(sorted, TASKS) == EXPECTED
+    # The workers stop even though the executors are still connected.
+    workers.stop()
+    assert not any(process.is_alive() for process in workers.processes)
+    with pytest.raises(ConnectionError):
+        executor.map(sorted, TASKS)
+    executor.close()
+    other_executor.close()
+
+
+def exit_on_none(task):
+    """Crash the worker process on task None."""
+    if task is None:
+        os._exit(1)
+    return sorted(task)
+
+
+def test_worker_crashes():
+    with LocalWorkers(n_workers=3) as workers:
+        with workers.executor() as executor:
+            with pytest.raises(ConnectionError):
+                executor.map(exit_on_none, TASKS + [None])
+            assert len(executor.connections) == 1
+            assert executor.map(exit_on_none, TASKS) == EXPECTED
+
+
+def test_simulation_tasks_in_workers():
+    model = KappaModel(
+        agents=[KappaAgent("A", ("b",)), KappaAgent("B", ("a",))],
+        rules=[
+            KappaRule(
+                "a.b",
+                [KappaSiteState("A", "b", "."), KappaSiteState("B", "a", ".")],
+                "<->",
+                [KappaSiteState("A", "b", "1"), KappaSiteState("B", "a", "1")],
+                rate=(1e-2, 0.1),
+            )
+        ],
+        initial_quantities={"A": 50, "B": 50},
+        duration=5,
+        snapshot_times={"end": 5},
+        plots=["|A(b[.])|"],
+        engine="gillespie",
+    )
+    tasks = [model.simulation_task(seed=seed) for seed in range(6)]
+    expected = SerialExecutor().run_tasks(tasks)
+    with LocalProcessExecutor(n_workers=2) as executor:
+        assert executor.run_tasks(tasks) == expected
+    with LocalWorkers(n_workers=2) as workers:
+        with workers.executor() as executor:
+            assert executor.run_tasks(tasks) == expected
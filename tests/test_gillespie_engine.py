@@ -0,0 +1,62 @@
+from topkappy import (
+    KappaModel,
+    KappaAgent,
+    KappaRule,
+    KappaSiteState,
+    run_simulation_task,
+)
+
+
+def make_model(rate=0.5e-2, quantity=100):
+    return KappaModel(
+        agents=[
+            KappaAgent("A", ("a", "b")),
+            KappaAgent("B", ("b", "c")),
+            KappaAgent("C", ("c", "d")),
+        ],
+        rules=[
+            KappaRule(
+                "a.b",
+                [KappaSiteState("A", "b", "."), KappaSiteState("B", "b", ".")],
+                "->",
+                [KappaSiteState("A", "b", "1"), KappaSiteState("B", "b", "1")],
+                rate=rate,
+            ),
+            KappaRule(
+                "b.c",
+                [KappaSiteState("B", "c", "."), KappaSiteState("C", "c", ".")],
+                "<->",
+                [KappaSiteState("B", "c", "1"), KappaSiteState("C", "c", "1")],
+                rate=(2.1e-2, 0.01),
+            ),
+        ],
+        initial_quantities={"A": quantity, "B": quantity, "C": quantity},
+        duration=10,
+        snapshot_times={"end": 10},
+        plots=[KappaSiteState("B", "b", "."), KappaSiteState("C", "c", ".")],
+        engine="gillespie",
+    )
+
+
+def test_gillespie_engine():
+    model = make_model()
+    results = model.get_simulation_results()
+    plots = results["plots"]
+    assert len(plots["[T]"]) == 101
+    assert plots["|B(b[.])|"][0] == 100
+    assert 0 < plots["|B(b[.])|"][-1] < 50
+    agents = results["snapshots"]["end"]["snapshot_agents"]
+    assert sum(count * len(nodes) for count, nodes in agents) == 300
+    assert ["A", "B", "C"] in [[n["node_type"] for n in nodes] for _, nodes in agents]
+    task = model.simulation_task(seed=123)
+    assert run_simulation_task(task) == run_simulation_task(task)
+
+
+def test_gillespie_engine_deadlock():
+    model = make_model(rate=10, quantity=5).copy(
+        rules=make_model(rate=10).rules[:1], snapshot_times={}
+    )
+    results = model.get_simulation_results()
+    assert len(results["plots"]["[T]"]) < 101
+    deadlock_agents = results["snapshots"]["deadlock"]["snapshot_agents"]
+    assert [(count, len(nodes)) for count, nodes in deadlock_agents] == [(5, 2), (5, 1)]
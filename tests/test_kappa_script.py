@@ -0,0 +1,33 @@
+import io
+import os
+from topkappy import KappaModel, KappaAgent, KappaRule, KappaSiteState
+
+
+def test_write_kappa_script(tmpdir):
+    model = KappaModel(
+        agents=[KappaAgent("A", ("a", "b")), KappaAgent("B", ("b", "c"))],
+        rules=[
+            KappaRule(
+                "a.b",
+                [KappaSiteState("A", "b", "."), KappaSiteState("B", "b", ".")],
+                "->",
+                [KappaSiteState("A", "b", "1"), KappaSiteState("B", "b", "1")],
+                rate=0.5e-2,
+            )
+        ],
+        initial_quantities={"A": 100, "B": 100},
+        duration=10,
+        snapshot_times={"end": 10},
+        plots=[KappaSiteState("B", "b", ".")],
+    )
+    script = model._full_kappa_script()
+    assert script.startswith("%agent: A(a, b)\n%agent: B(b, c)\n\n'a.b' A(b[.])")
+    assert script.endswith('SNAPSHOT "end";\n\n%plot: |B(b[.])|')
+    stream = io.StringIO()
+    model.write_kappa_script(stream)
+    assert stream.getvalue() == script
+    path = os.path.join(str(tmpdir), "model.ka")
+    task = model.simulation_task(script_file=path)
+    assert task.model_string is None
+    with open(path, "r") as f:
+        assert f.read() == script
@@ -0,0 +1,47 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import networkx as nx
+import numpy as np
+from topkappy import (
+    grid_force_directed_layout,
+    batch_force_directed_layouts,
+    plot_snapshot_agent_nodes_graph,
+)
+
+
+def test_grid_force_directed_layout():
+    graph = nx.grid_2d_graph(15, 15)
+    positions = grid_force_directed_layout(graph, seed=1)
+    xy = np.array([positions[node] for node in graph])
+    assert xy.shape == (225, 2) and np.abs(xy).max() <= 1 + 1e-9
+    edges_lengths = [
+        np.linalg.norm(positions[u] - positions[v]) for u, v in graph.edges()
+    ]
+    far_pairs_distance = np.linalg.norm(positions[(0, 0)] - positions[(14, 14)])
+    assert far_pairs_distance > 5 * np.mean(edges_lengths)
+
+    threaded = grid_force_directed_layout(graph, seed=1, n_threads=3)
+    assert all(np.allclose(threaded[n], positions[n]) for n in graph)
+
+    graph.add_edge((14, 14), "new_node")
+    warm = grid_force_directed_layout(graph, positions=positions, iterations=10)
+    moves = [np.linalg.norm(warm[n] - positions[n]) for n in positions]
+    assert np.median(moves) < 0.1
+
+    graph = nx.Graph()
+    graph.add_node(0, node_type="agent", node_name="A")
+    graph.add_node(1, node_type="port", node_name="b")
+    graph.add_edge(0, 1, edge_type="port")
+    plot_snapshot_agent_nodes_graph(graph, layout_method="grid")
+
+
+def test_batch_force_directed_layouts():
+    graphs = [nx.path_graph(12), nx.cycle_graph(10), nx.path_graph(1)]
+    for graph, positions in zip(graphs, batch_force_directed_layouts(graphs)):
+        xy = np.array([positions[node] for node in graph])
+        assert np.abs(xy).max() <= 1 + 1e-6
+        distances = np.linalg.norm(xy[:, None] - xy[None], axis=2)
+        if len(graph) > 1:
+            assert distances[np.triu_indices(len(graph), 1)].min() > 0.05
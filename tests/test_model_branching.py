@@ -0,0 +1,101 @@
+import pytest
+from topkappy import (
+    KappaModel,
+    KappaAgent,
+    KappaRule,
+    KappaSiteState,
+    diff_models,
+    simulate_branches,
+    snapshot_agents_to_kappa_inits,
+)
+
+
+def port(name, links=(), states=()):
+    return {
+        "site_name": name,
+        "site_type": ["port", {"port_links": list(links), "port_states": list(states)}],
+    }
+
+
+def make_model(rate, **parameters):
+    return KappaModel(
+        agents=[KappaAgent("A", ("a", "b")), KappaAgent("B", ("b", "c"))],
+        rules=[
+            KappaRule(
+                "a.b",
+                [KappaSiteState("A", "b", "."), KappaSiteState("B", "b", ".")],
+                "->",
+                [KappaSiteState("A", "b", "1"), KappaSiteState("B", "b", "1")],
+                rate=rate,
+            )
+        ],
+        initial_quantities={"A": 100, "B": 100},
+        duration=10,
+        plots=[KappaSiteState("B", "b", ".")],
+        **parameters
+    )
+
+
+def test_model_from_snapshot():
+    snapshot_agents = [
+        [
+            3,
+            [
+                {"node_type": "A", "node_sites": [port("a"), port("b", [[1, 0]])]},
+                {"node_type": "B", "node_sites": [port("b", [[0, 1]]), port("c")]},
+            ],
+        ],
+        [12, [{"node_type": "B", "node_sites": [port("b"), port("c", states=["u"])]}]],
+    ]
+    assert snapshot_agents_to_kappa_inits(snapshot_agents) == [
+        "%init: 3 A(a[.], b[1]), B(b[1], c[.])",
+        "%init: 12 B(b[.], c[.]{u})",
+    ]
+    model = make_model(0.1).copy(
+        initial_quantities={"A": 5},
+        initial_snapshot={"snapshot_agents": snapshot_agents},
+    )
+    script = model._full_kappa_script()
+    assert "%init: 5 A()\n%init: 3 A(a[.], b[1]), B(b[1], c[.])\n" in script
+
+
+def test_diff_models():
+    model = make_model(0.1)
+    assert diff_models(model, model.copy()) == {}
+    diff = diff_models(model, model.copy(rules=make_model(0.2).rules, duration=5))
+    assert sorted(diff) == ["parameters", "rules"]
+    assert diff["rules"]["added"][0].endswith("@ 0.2")
+    assert diff["parameters"]["removed"] == ["pause_condition: [T] > 10.0000"]
+
+
+def test_simulate_branches():
+    base_model = make_model(5e-4, engine="gillespie", seed=1)
+    models = [
+        base_model.copy(snapshot_times={"s": 2, "late": 8}),
+        make_model(1e-2, engine="gillespie", snapshot_times={"s": 4}, seed=2),
+        base_model.copy(plots=[KappaSiteState("A", "b", ".")]),
+    ]
+    results = simulate_branches(base_model, models, branch_time=5)
+    for result in results:
+        assert result["status"] == "completed"
+        times = result["plots"]["[T]"]
+        assert len(times) == 101
+        assert abs(times[-1] - 10) < 1e-6
+        assert all(t2 > t1 for t1, t2 in zip(times, times[1:]))
+    first, second, unbranched = results
+    # Both branches share the first phase, then diverge.
+    assert first["plots"]["|B(b[.])|"][:51] == second["plots"]["|B(b[.])|"][:51]
+    assert first["plots"]["|B(b[.])|"][-1] > second["plots"]["|B(b[.])|"][-1]
+    assert first["seed"][0] == second["seed"][0]
+    # Snapshots with the same name at different times are not mixed up.
+    assert first["snapshots"]["s"]["snapshot_event"] < (
+        second["snapshots"]["s"]["snapshot_event"]
+    )
+    assert sorted(first["snapshots"]) == ["late", "s"]
+    assert unbranched["plots"]["|A(b[.])|"][0] == 100
+    assert isinstance(unbranched["seed"], int)
+
+    with pytest.raises(ValueError):
+        simulate_branches(make_model(1e-3, engine="ode"), models, branch_time=5)
+    with pytest.raises(ValueError):
+        simulate_branches(base_model, [base_model.copy(duration=4)], branch_time=5)
@@ -0,0 +1,95 @@
+import kappy
+from topkappy import (
+    KappaModel,
+    KappaAgent,
+    KappaRule,
+    KappaSiteState,
+    KappaModelTemplate,
+)
+from topkappy import simulation_tasks
+
+
+class FakeKappaClient:
+    """Record the files of the project, "simulate" by plotting the %var lines."""
+
+    def __init__(self):
+        self.files = {}
+        self.uploads = []
+        self.ids = 0
+
+    def make_unique_id(self, prefix):
+        self.ids += 1
+        return "%s_%d" % (prefix, self.ids)
+
+    def add_model_string(self, model_string, position=1, file_id=None):
+        self.files[file_id] = (position, model_string)
+        self.uploads.append(file_id)
+
+    def file_delete(self, file_id):
+        self.files.pop(file_id)
+
+    def project_parse(self):
+        positions = sorted(position for position, _ in self.files.values())
+        assert positions == [0, 1]
+
+    def simulation_start(self, parameter):
+        pass
+
+    def wait_for_simulation_stop(self):
+        pass
+
+    def simulation_plot(self, limit=None):
+        variables = [
+            line.split("'")[1:]
+            for position, string in self.files.values()
+            for line in string.split("\n")
+            if line.startswith("%var:") and position == 0
+        ]
+        legend = ["[T]"] + [name for name, _ in variables]
+        return {"legend": legend, "series": [[0] + [float(v) for _, v in variables]]}
+
+    def simulation_snapshots(self):
+        return []
+
+    def simulation_snapshot(self, name):
+        raise kappy.KappaError("No snapshot")
+
+    def simulation_delete(self):
+        pass
+
+
+def test_kappa_model_template(monkeypatch):
+    free_sites = [KappaSiteState("A", "b", "."), KappaSiteState("B", "a", ".")]
+    bound_sites = [KappaSiteState("A", "b", "1"), KappaSiteState("B", "a", "1")]
+    model = KappaModel(
+        agents=[KappaAgent("A", ("b",)), KappaAgent("B", ("a",))],
+        rules=[KappaRule("ab", free_sites, "<->", bound_sites, rate=(1e-3, 0.1))],
+        initial_quantities={"A": 100, "B": 50},
+        duration=10,
+    )
+    template = KappaModelTemplate(model, quantity_agents=["A"])
+    assert "@ 'rate_ab', 'rate_ab_reverse'" in template.template_string
+    assert "%init: 'n_A' A()" in template.template_string
+    assert "%init: 50 B()" in template.template_string
+    variables = template.variables_string(rates={"ab": (2e-3, 0.2)})
+    assert variables.split("\n") == [
+        "%var: 'rate_ab' 0.002",
+        "%var: 'rate_ab_reverse' 0.2",
+        "%var: 'n_A' 100",
+    ]
+    instance = template.model_instance({"ab": (2e-3, 0.2)}, {"A": 300})
+    assert instance.rules[0].rate == (2e-3, 0.2)
+    assert instance.initial_quantities == {"A": 300, "B": 50}
+
+    client = FakeKappaClient()
+    monkeypatch.setattr(simulation_tasks.kappy, "KappaStd", lambda: client)
+    monkeypatch.setattr(simulation_tasks._warm_clients, "client", None, raising=False)
+    for n in [10, 20, 30]:
+        results = template.get_simulation_results(initial_quantities={"A": n})
+        assert results["plots"]["n_A"] == (n,)
+    assert client.uploads.count(template.template_id) == 1
+    assert list(client.files) == [template.template_id]
+
+    # A regular (non-template) task run on the warm client unloads the template.
+    simulation_tasks._load_warm_template(client, None, None)
+    assert client.files == {}
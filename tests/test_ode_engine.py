@@ -0,0 +1,45 @@
+import pytest
+from topkappy import KappaModel, KappaAgent, KappaRule, KappaSiteState
+from topkappy.reaction_networks import UnsupportedModelError
+import topkappy.ode_engine
+
+
+def make_model(**parameters):
+    return KappaModel(
+        agents=[KappaAgent("A", ("a", "b")), KappaAgent("B", ("b", "c"))],
+        rules=[
+            KappaRule(
+                "a.b",
+                [KappaSiteState("A", "b", "."), KappaSiteState("B", "b", ".")],
+                "->",
+                [KappaSiteState("A", "b", "1"), KappaSiteState("B", "b", "1")],
+                rate=0.5e-2,
+            )
+        ],
+        initial_quantities={"A": 100, "B": 100},
+        duration=10,
+        plots=[KappaSiteState("B", "b", "."), "|A()|", "|B(c[.])|"],
+        engine="ode",
+        **parameters
+    )
+
+
+@pytest.mark.parametrize("use_scipy", [True, False])
+def test_ode_engine(monkeypatch, use_scipy):
+    if not use_scipy:
+        monkeypatch.setattr(topkappy.ode_engine, "SCIPY_AVAILABLE", False)
+    elif not topkappy.ode_engine.SCIPY_AVAILABLE:
+        pytest.skip("Scipy not installed")
+    plots = make_model().get_simulation_results()["plots"]
+    assert len(plots["[T]"]) == 101
+    # Analytical solution of dn/dt = -k.n^2
+    assert abs(plots["|B(b[.])|"][-1] - 100.0 / 6) < 1e-3
+    assert plots["|A()|"][-1] == 100
+    assert plots["|B(c[.])|"][-1] == 100
+    plots = make_model(plot_points="final").get_simulation_results()["plots"]
+    assert plots["[T]"] == (10.0,)
+
+
+def test_ode_engine_unsupported_model():
+    with pytest.raises(UnsupportedModelError):
+        make_model().copy(plots=["|A(b[_])|"]).get_simulation_results()
@@ -0,0 +1,48 @@
+import numpy as np
+from topkappy import RunningStatistics, PlotSeriesAggregator
+
+
+def test_running_statistics():
+    values = np.random.default_rng(0).normal(size=(50, 3))
+    statistics, first_half, second_half = [RunningStatistics() for _ in range(3)]
+    for i, value in enumerate(values):
+        statistics.add(value)
+        (first_half if i < 20 else second_half).add(value)
+    first_half.merge(second_half)
+    for running in [statistics, first_half]:
+        assert running.count == 50
+        assert np.allclose(running.mean, values.mean(axis=0))
+        assert np.allclose(running.variance, values.var(axis=0, ddof=1))
+    width = statistics.confidence_interval_width(0.95)
+    assert np.allclose(width, 2 * 1.96 * values.std(axis=0, ddof=1) / np.sqrt(50), 1e-3)
+    assert np.isnan(RunningStatistics().variance)
+
+
+def test_plot_series_aggregator():
+    rng = np.random.default_rng(0)
+    aggregator = PlotSeriesAggregator(times=[0, 1, 2], quantiles=(0.1, 0.5, 0.9))
+    all_values = []
+    for i in range(2000):
+        times = [0, 1, 2] if i % 2 else [0, 0.5, 1, 1.5, 2]
+        values = rng.exponential(size=len(times)) + np.array(times)
+        aggregator.add({"plots": {"[T]": times, "|A()|": values}})
+        all_values.append(np.interp([0, 1, 2], times, values))
+    all_values = np.array(all_values)
+    assert len(aggregator) == 2000
+    summary = aggregator.summary()["|A()|"]
+    assert np.allclose(summary["mean"], all_values.mean(axis=0))
+    assert np.allclose(summary["std"], all_values.std(axis=0, ddof=1))
+    assert np.allclose(summary["min"], all_values.min(axis=0))
+    assert np.allclose(summary["max"], all_values.max(axis=0))
+    for q, estimate in summary["quantiles"].items():
+        expected = np.quantile(all_values, q, axis=0)
+        assert np.allclose(estimate, expected, rtol=0.05)
+
+
+def test_normal_quantile(monkeypatch):
+    from topkappy import online_statistics
+
+    assert abs(online_statistics.normal_quantile(0.975) - 1.959964) < 1e-5
+    monkeypatch.setattr(online_statistics, "SCIPY_AVAILABLE", False)
+    assert abs(online_statistics.normal_quantile(0.975) - 1.959964) < 1e-5
+    assert abs(online_statistics.normal_quantile(0.5)) < 1e-9
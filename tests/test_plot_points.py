@@ -0,0 +1,68 @@
+import pytest
+from topkappy import KappaModel
+from topkappy.plot_points import select_plot_points
+from topkappy.simulation_tasks import get_plot_data
+
+
+class FakeKappaClient:
+    """Serve the plot of a 0.1-period simulation of 10 time units."""
+
+    series = [[0.1 * i, 100 - i] for i in range(101)]
+
+    def simulation_plot(self, limit=None):
+        series = self.series
+        if limit is not None:
+            offset = (
+                len(series) - limit.points if limit.offset is None else limit.offset
+            )
+            series = series[offset : offset + limit.points]
+        return {"legend": ["[T]", "|A()|"], "series": series}
+
+
+def test_get_plot_data():
+    client = FakeKappaClient()
+    full = get_plot_data(client)
+    assert len(full["[T]"]) == 101
+    assert get_plot_data(client, "final") == {"[T]": (10.0,), "|A()|": (0,)}
+    times = get_plot_data(client, {"times": [0.5, 2]}, plot_period=0.1)
+    assert times["|A()|"] == (95, 80)
+    for every in (1, 3, 7):
+        for page_size in (5, 13, 1000):
+            data = get_plot_data(client, {"every": every}, page_size=page_size)
+            assert data["|A()|"] == full["|A()|"][::every]
+            assert data == select_plot_points(full, {"every": every}, 0.1)
+    assert select_plot_points(full, {"times": [0.5, 2]}, 0.1) == times
+    for plot_points in ({"times": ()}, {"times": [20, 30]}):
+        data = get_plot_data(client, plot_points, plot_period=0.1)
+        assert data == {"[T]": (), "|A()|": ()}
+        assert data == select_plot_points(full, plot_points, 0.1)
+    partial = get_plot_data(client, {"times": [2, 30]}, plot_period=0.1)
+    assert partial == select_plot_points(full, {"times": [2, 30]}, 0.1)
+    assert partial == {"[T]": (2.0,), "|A()|": (80,)}
+
+
+def test_plot_points_validation():
+    invalid_plot_points = [
+        "last",
+        {"every": 0},
+        {"every": -2},
+        {"every": 2.5},
+        {"every": True},
+        {"times": 5},
+        {"times": [1, "2"]},
+        {"times": [-1]},
+    ]
+    for plot_points in invalid_plot_points:
+        with pytest.raises(ValueError):
+            KappaModel(
+                agents=[], rules=[], initial_quantities={}, plot_points=plot_points
+            )
+    for plot_points in ({"every": 3}, {"times": [0, 2.5]}, {"times": ()}):
+        model = KappaModel(
+            agents=[],
+            rules=[],
+            initial_quantities={},
+            duration=10,
+            plot_points=plot_points,
+        )
+        assert model.plot_points == plot_points
@@ -0,0 +1,54 @@
+from topkappy import (
+    KappaModel,
+    KappaAgent,
+    KappaRule,
+    KappaSiteState,
+    run_ensemble,
+    run_simulation_task,
+    spawn_seeds,
+)
+
+
+def make_model(seed=None):
+    return KappaModel(
+        agents=[KappaAgent("A", ("b",)), KappaAgent("B", ("a",))],
+        rules=[
+            KappaRule(
+                "a.b",
+                [KappaSiteState("A", "b", "."), KappaSiteState("B", "a", ".")],
+                "<->",
+                [KappaSiteState("A", "b", "1"), KappaSiteState("B", "a", "1")],
+                rate=(1e-2, 0.1),
+            )
+        ],
+        initial_quantities={"A": 50, "B": 50},
+        duration=5,
+        plots=["|A(b[.])|"],
+        engine="gillespie",
+        seed=seed,
+    )
+
+
+def test_spawn_seeds():
+    assert spawn_seeds(1, 5) == spawn_seeds(1, 5)
+    assert len(set(spawn_seeds(1, 5) + spawn_seeds(2, 5))) == 10
+
+
+def test_reproducible_runs():
+    results = make_model().get_simulation_results()
+    replay = make_model(seed=results["seed"]).get_simulation_results()
+    assert replay == results
+
+    ensemble = run_ensemble(make_model(), replicates=4, seed=3)
+    seeds = [result["seed"] for result in ensemble]
+    assert len(set(seeds)) == 4
+    assert run_ensemble(make_model(seed=3), replicates=4) == ensemble
+    assert run_ensemble(make_model(), replicates=4, seed=4) != ensemble
+
+
+def test_task_cache_keys():
+    task = make_model().simulation_task(seed=1)
+    assert task.cache_key() == make_model().simulation_task(seed=1).cache_key()
+    assert task.cache_key() != make_model().simulation_task(seed=2).cache_key()
+    assert make_model().simulation_task().cache_key() is None
+    assert run_simulation_task(task)["plots"] == run_simulation_task(task)["plots"]
@@ -0,0 +1,58 @@
+import numpy as np
+from topkappy import (
+    KappaModel,
+    KappaAgent,
+    KappaRule,
+    KappaSiteState,
+    RuleRatesEvaluator,
+    finite_differences_sensitivities,
+    morris_screening,
+    sobol_indices,
+)
+
+
+def binding_model(**parameters):
+    free_sites = [KappaSiteState("A", "b", "."), KappaSiteState("B", "a", ".")]
+    bound_sites = [KappaSiteState("A", "b", "1"), KappaSiteState("B", "a", "1")]
+    return KappaModel(
+        agents=[KappaAgent("A", ("b",)), KappaAgent("B", ("a",)), KappaAgent("C", ())],
+        rules=[
+            KappaRule("binding", free_sites, "->", bound_sites, rate=1e-3),
+            KappaRule("unbinding", bound_sites, "->", free_sites, rate=0.1),
+        ],
+        initial_quantities={"A": 200, "B": 200},
+        duration=20,
+        plot_time_step=1,
+        plots=[KappaSiteState("A", "b", "."), "|C()|"],
+        **parameters
+    )
+
+
+def test_finite_differences_sensitivities():
+    sensitivities = finite_differences_sensitivities(binding_model(engine="ode"))
+    free_a = sensitivities["|A(b[.])|"]
+    assert free_a["binding"] < -0.1
+    assert free_a["unbinding"] > 0.1
+    assert np.isnan(sensitivities["|C()|"]["binding"])
+
+
+def test_common_random_numbers_and_cache():
+    model = binding_model(engine="gillespie")
+    evaluator = RuleRatesEvaluator(model, replicates=3, seed=5)
+    values = evaluator.evaluate([{"binding": 1e-3}, {"binding": 1e-3}])
+    assert len(evaluator.cache) == 3
+    assert (values[0] == values[1]).all()
+    evaluator.evaluate([{"binding": 1e-3}, {"binding": 2e-3}])
+    assert len(evaluator.cache) == 6
+    sensitivities = finite_differences_sensitivities(model, ["binding"], replicates=3)
+    assert sensitivities["|A(b[.])|"]["binding"] < 0
+
+
+def test_morris_and_sobol():
+    model = binding_model(engine="ode")
+    bounds = {"binding": (1e-4, 1e-2), "unbinding": (1e-3, 1e-2)}
+    morris = morris_screening(model, bounds, trajectories=6, seed=1)["|A(b[.])|"]
+    assert morris["binding"][0] > morris["unbinding"][0] > 0
+    sobol = sobol_indices(model, bounds, samples=64, seed=1)["|A(b[.])|"]
+    assert sobol["binding"][1] > sobol["unbinding"][1]
+    assert sobol["binding"][0] > 0.5
@@ -0,0 +1,101 @@
+import os
+import threading
+import pytest
+from topkappy import (
+    KappaModel,
+    KappaAgent,
+    KappaRule,
+    KappaSiteState,
+    SimulationTask,
+    run_simulation_task,
+)
+from topkappy.simulation_tasks import wait_for_simulation_stop
+
+
+class FakeRunningKappaClient:
+    """Simulator which never stops, doing 100 events per status request."""
+
+    def __init__(self):
+        self.events = 0
+        self.paused = False
+        self.sim_agent = type("Process", (), {"pid": os.getpid()})
+
+    def simulation_info(self):
+        self.events += 100
+        progress = {
+            "simulation_progress_is_running": not self.paused,
+            "simulation_progress_event": self.events,
+        }
+        return {"simulation_info_progress": progress}
+
+    def simulation_pause(self):
+        self.paused = True
+
+
+def test_wait_for_simulation_stop():
+    def status(**limits):
+        task = SimulationTask("", 0.1, "[T] > 1", [], **limits)
+        return wait_for_simulation_stop(FakeRunningKappaClient(), task)
+
+    assert status(max_events=1000) == "max_events"
+    assert status(timeout=0.15) == "timeout"
+    assert status(max_memory=0.001) == "max_memory"
+    cancel_event = threading.Event()
+    cancel_event.set()
+    task = SimulationTask("", 0.1, "[T] > 1", [])
+    client = FakeRunningKappaClient()
+    assert wait_for_simulation_stop(client, task, cancel_event) == "cancelled"
+    assert client.paused
+
+
+def test_gillespie_limits():
+    free_sites = [KappaSiteState("A", "b", "."), KappaSiteState("B", "a", ".")]
+    bound_sites = [KappaSiteState("A", "b", "1"), KappaSiteState("B", "a", "1")]
+    model = KappaModel(
+        agents=[KappaAgent("A", ("b",)), KappaAgent("B", ("a",))],
+        rules=[
+            KappaRule("binding", free_sites, "<->", bound_sites, rate=(1e-2, 1)),
+        ],
+        initial_quantities={"A": 100, "B": 100},
+        duration=100,
+        plot_time_step=1,
+        plots=[KappaSiteState("A", "b", ".")],
+        engine="gillespie",
+    )
+    complete = model.get_simulation_results()
+    assert complete["status"] == "completed"
+    assert len(complete["plots"]["[T]"]) == 101
+    interrupted = model.copy(max_events=500).get_simulation_results()
+    assert interrupted["status"] == "max_events"
+    assert 1 <= len(interrupted["plots"]["[T]"]) < 101
+    cancel_event = threading.Event()
+    cancel_event.set()
+    task = model.simulation_task(seed=1)
+    cancelled = run_simulation_task(task, cancel_event=cancel_event)
+    assert cancelled["status"] == "cancelled"
+
+
+def test_native_engines_limits():
+    free_sites = [KappaSiteState("A", "b", "."), KappaSiteState("B", "a", ".")]
+    bound_sites = [KappaSiteState("A", "b", "1"), KappaSiteState("B", "a", "1")]
+    model = KappaModel(
+        agents=[KappaAgent("A", ("b",)), KappaAgent("B", ("a",))],
+        rules=[
+            KappaRule("binding", free_sites, "<->", bound_sites, rate=(1e-3, 1)),
+        ],
+        initial_quantities={"A": 1000, "B": 1000},
+        duration=100,
+        plot_time_step=1,
+        plots=[KappaSiteState("A", "b", ".")],
+        engine="tau_leaping",
+    )
+    assert model.get_simulation_results()["status"] == "completed"
+    interrupted = model.copy(max_events=1000).get_simulation_results()
+    assert interrupted["status"] == "max_events"
+    assert 1 <= len(interrupted["plots"]["[T]"]) < 101
+    timed_out = model.copy(timeout=1e-9).get_simulation_results()
+    assert timed_out["status"] == "timeout"
+    assert timed_out["plots"]["[T]"] == (0.0,)
+    for engine, limits in [("ode", {"timeout": 1}), ("gillespie", {"max_memory": 1})]:
+        with pytest.raises(ValueError):
+            model.copy(engine=engine, **limits)
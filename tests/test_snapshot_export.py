@@ -0,0 +1,41 @@
+import json
+import os
+from topkappy import (
+    snapshot_agent_nodes_to_graph,
+    complex_graph_to_svg,
+    write_snapshot_agents_report,
+)
+
+
+def port(name, links=()):
+    return {
+        "site_name": name,
+        "site_type": ["port", {"port_links": list(links), "port_states": []}],
+    }
+
+
+DIMER = [
+    {"node_type": "A", "node_sites": [port("b", [[1, 0]])]},
+    {"node_type": "B<&>", "node_sites": [port("a", [[0, 0]])]},
+]
+MONOMER = [{"node_type": "A", "node_sites": [port("b")]}]
+
+
+def test_snapshot_export(tmpdir):
+    svg = complex_graph_to_svg(snapshot_agent_nodes_to_graph(DIMER))
+    assert svg.startswith("<svg") and svg.endswith("</svg>")
+    assert svg.count("<line") == 3 and "B&lt;&amp;&gt;" in svg
+
+    snapshot = {"snapshot_agents": [[30, DIMER], [10, MONOMER]]}
+    svg_path = os.path.join(str(tmpdir), "report.svg")
+    write_snapshot_agents_report(snapshot, svg_path, columns=1)
+    with open(svg_path, "r") as f:
+        svg = f.read()
+    assert "75.0%" in svg and "25.0%" in svg
+    json_path = os.path.join(str(tmpdir), "report.json")
+    write_snapshot_agents_report(snapshot, json_path, with_ports=False)
+    with open(json_path, "r") as f:
+        complexes = json.load(f)
+    assert [c["count"] for c in complexes] == [30, 10]
+    assert [len(c["nodes"]) for c in complexes] == [2, 1]
+    assert complexes[0]["edges"][0]["type"] == "link"
@@ -0,0 +1,37 @@
+import kappy
+from topkappy.simulation_tasks import get_snapshots, get_census, list_snapshot_ids
+
+
+class FakeKappaClient:
+    """Client whose simulation produced the snapshots end, broken and deadlock."""
+
+    def __init__(self):
+        self.requests = []
+
+    def simulation_snapshots(self):
+        self.requests.append("catalog")
+        return {"snapshot_ids": ["end.ka", "broken.ka", "deadlock", "census_0.ka"]}
+
+    def simulation_snapshot(self, snapshot_id):
+        self.requests.append(snapshot_id)
+        if snapshot_id == "broken.ka":
+            raise kappy.KappaError("Corrupted snapshot")
+        return {"snapshot_agents": [[2, [{"node_type": "A", "node_sites": []}]]]}
+
+
+def test_get_snapshots():
+    client = FakeKappaClient()
+    snapshots, errors = get_snapshots(client, ["end", "broken", "late"])
+    assert sorted(snapshots) == ["deadlock", "end"]
+    assert sorted(errors) == ["broken", "late"]
+    assert "Corrupted snapshot" in errors["broken"]
+    assert client.requests == ["catalog", "end.ka", "broken.ka", "deadlock"]
+
+
+def test_get_census():
+    client = FakeKappaClient()
+    snapshot_ids = list_snapshot_ids(client)
+    census, errors = get_census(client, {"census_0": 0, "census_1": 1}, snapshot_ids)
+    assert [c["time"] for c in census] == [0]
+    assert errors == {"census_1": "Snapshot not produced by the simulation"}
+    assert client.requests == ["catalog", "census_0.ka"]
@@ -0,0 +1,38 @@
+import numpy as np
+from topkappy import (
+    KappaModel,
+    KappaAgent,
+    KappaRule,
+    KappaSiteState,
+    simulate_tau_leaping,
+    simulate_ode,
+)
+
+
+def test_tau_leaping():
+    model = KappaModel(
+        agents=[KappaAgent("A", ("a", "b")), KappaAgent("B", ("b", "c"))],
+        rules=[
+            KappaRule(
+                "a.b",
+                [KappaSiteState("A", "b", "."), KappaSiteState("B", "b", ".")],
+                "<->",
+                [KappaSiteState("A", "b", "1"), KappaSiteState("B", "b", "1")],
+                rate=(1e-4, 0.1),
+            )
+        ],
+        initial_quantities={"A": 2000, "B": 2000},
+        duration=10,
+        plots=[KappaSiteState("B", "b", ".")],
+    )
+    results = simulate_tau_leaping(model, replicates=50, epsilon=0.03, seed=1)
+    assert len(results) == 50
+    assert all(len(r["plots"]["[T]"]) == 101 for r in results)
+    finals = [r["plots"]["|B(b[.])|"][-1] for r in results]
+    expected = simulate_ode(model)["plots"]["|B(b[.])|"][-1]
+    assert abs(np.mean(finals) - expected) < 0.02 * expected
+    assert np.std(finals) > 0
+    same_seed_results = simulate_tau_leaping(model, replicates=50, seed=1)
+    assert same_seed_results == results
+    single_run = model.copy(engine="tau_leaping").get_simulation_results()
+    assert single_run["snapshots"] == {}
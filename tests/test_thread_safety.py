@@ -0,0 +1,75 @@
+import threading
+from topkappy import (
+    KappaModel,
+    KappaAgent,
+    KappaRule,
+    KappaSiteState,
+    LocalThreadExecutor,
+    SerialExecutor,
+)
+
+
+def make_model(quantity):
+    return KappaModel(
+        agents=[KappaAgent("A", ("b",)), KappaAgent("B", ("a",))],
+        rules=[
+            KappaRule(
+                "a.b",
+                [KappaSiteState("A", "b", "."), KappaSiteState("B", "a", ".")],
+                "<->",
+                [KappaSiteState("A", "b", "1"), KappaSiteState("B", "a", "1")],
+                rate=(1e-2, 0.1),
+            )
+        ],
+        initial_quantities={"A": quantity, "B": quantity},
+        duration=5,
+        snapshot_times={"end": 5},
+        plots=["|A()|"],
+        engine="gillespie",
+    )
+
+
+def test_concurrent_runs_have_no_cross_talk():
+    tasks = [
+        make_model(quantity).simulation_task(seed=seed)
+        for quantity in range(10, 60, 5)
+        for seed in range(4)
+    ]
+    with LocalThreadExecutor(n_workers=8) as executor:
+        threaded_results = executor.run_tasks(tasks)
+    assert threaded_results == SerialExecutor().run_tasks(tasks)
+    for task, result in zip(tasks, threaded_results):
+        quantity = task.model.initial_quantities["A"]
+        assert result["plots"]["|A()|"][0] == quantity
+        agents = result["snapshots"]["end"]["snapshot_agents"]
+        assert sum(count * len(nodes) for count, nodes in agents) == 2 * quantity
+
+
+def test_tasks_are_frozen_snapshots_of_the_model():
+    model = make_model(10)
+    task = model.simulation_task()
+    model.plots.append("|B()|")
+    model.initial_quantities["A"] = 1000
+    model.set_parameters(duration=50)
+    assert task.model.plots == ["|A()|"]
+    assert task.model.initial_quantities["A"] == 10
+    assert task.pause_condition == "[T] > 5.0000"
+
+    # Tasks created while the parameters change are always consistent.
+    stop = threading.Event()
+
+    def change_parameters():
+        while not stop.is_set():
+            for duration in [1, 2]:
+                model.set_parameters(duration=duration, plot_time_step=0.1 * duration)
+
+    thread = threading.Thread(target=change_parameters)
+    thread.start()
+    try:
+        for _ in range(300):
+            task = model.copy(engine="kappa").simulation_task()
+            duration = 10 * task.plot_period
+            assert task.pause_condition == "[T] > %.04f" % duration
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,50 @@
+import os
+import numpy as np
+import pytest
+from topkappy import TrajectoryStore
+
+
+def test_trajectory_store(tmpdir):
+    directory = os.path.join(str(tmpdir), "store")
+    with TrajectoryStore(directory, chunk_size=3) as store:
+        for i in range(7):
+            plots = {"[T]": [0, 1, 2], "|A()|": [i, i + 1, i + 2]}
+            if i == 6:
+                plots["|B()|"] = [1, 1, 1]
+            store.append({"plots": plots}, parameters={"rate": i % 2}, seed=i)
+    store = TrajectoryStore(directory, mode="r")
+    assert len(store) == 7
+    assert len(store.chunks) == 3
+    runs = store.read(columns=["|A()|"], where={"rate": 0})
+    assert [run["seed"] for run in runs] == [0, 2, 4, 6]
+    assert list(runs[0]["plots"]) == ["|A()|"]
+    assert np.allclose(runs[1]["plots"]["|A()|"], [2, 3, 4])
+    runs = store.read(where=lambda parameters, seed: seed > 4)
+    assert "|B()|" not in runs[0]["plots"]
+    assert np.allclose(runs[1]["plots"]["|B()|"], [1, 1, 1])
+
+    # Reading doesn't rewrite the store, nor creates one at a mistyped path.
+    metadata_mtime = os.path.getmtime(os.path.join(directory, "store.json"))
+    assert len(TrajectoryStore(directory).read()) == 7
+    assert os.path.getmtime(os.path.join(directory, "store.json")) == metadata_mtime
+    with pytest.raises(ValueError):
+        store.append({"[T]": [0]})
+    typo = os.path.join(str(tmpdir), "stor")
+    with pytest.raises(FileNotFoundError):
+        TrajectoryStore(typo, mode="r")
+    assert TrajectoryStore(typo).read() == []
+    assert not os.path.exists(typo)
+
+    # Written columns are read back even if all-NaN, numpy values are stored.
+    with TrajectoryStore(typo) as store:
+        store.append(
+            {"[T]": [0, 1], "|A()|": [np.nan, np.nan]},
+            parameters={"rate": np.float64(0.5), "n": np.int64(3)},
+            seed=np.int64(7),
+        )
+        with pytest.raises(TypeError):
+            store.append({"[T]": [0]}, parameters={"model": object()})
+    (run,) = TrajectoryStore(typo, mode="r").read()
+    assert sorted(run["plots"]) == ["[T]", "|A()|"]
+    assert np.isnan(run["plots"]["|A()|"]).all()
+    assert run["parameters"] == {"rate": 0.5, "n": 3} and run["seed"] == 7
@@ -0,0 +1,245 @@
+import json
+
+import numpy as np
+
+MAGIC = b"TKSNAP01"
+ALIGNMENT = 8
+
+ARRAY_NAMES = (
+    "complex_counts",
+    "complex_offsets",
+    "agent_types",
+    "agent_site_offsets",
+    "site_names",
+    "site_link_offsets",
+    "links",
+    "site_state_offsets",
+    "states",
+)
+
+
+class _StringTable:
+    """Map strings to consecutive integer ids (and back)."""
+
+    def __init__(self, strings=()):
+        self.strings = list(strings)
+        self.ids = {s: i for i, s in enumerate(self.strings)}
+
+    def id(self, string):
+        if string not in self.ids:
+            self.ids[string] = len(self.strings)
+            self.strings.append(string)
+        return self.ids[string]
+
+
+class CompactSnapshot:
+    """Flat-array representation of the agents of a Kappa snapshot.
+
+    The snapshot agents (a list of ``[count, nodes]`` complexes, as found in
+    ``simulation_results['snapshots']['NAME']['snapshot_agents']``) are
+    stored as a few int32 arrays, which is much lighter than the kappy JSON
+    and can be memory-mapped from disk.
+
+    All indices are int32. For the n-th complex, its agents are the
+    ``agent_types[complex_offsets[n]:complex_offsets[n + 1]]``, the sites of
+    agent a are ``site_names[agent_site_offsets[a]:agent_site_offsets[a+1]]``,
+    and the links and internal states of site s are delimited in the same way
+    by ``site_link_offsets`` and ``site_state_offsets``. Links are stored as
+    ``(agent, site)`` pairs local to the complex, exactly like in kappy.
+
+    Only "port" sites (the only kind generated by topkappy) are supported.
+
+    Examples
+    --------
+
+    >>> agents = sim_results['snapshots']['end']['snapshot_agents']
+    >>> snapshot = CompactSnapshot.from_snapshot_agents(agents)
+    >>> snapshot.write('end.tksnap')
+    >>> snapshot = CompactSnapshot.read('end.tksnap')  # memory-mapped
+    >>> count, nodes = snapshot[12]  # O(1) access to the 13th complex
+    >>> fig, axes = plot_snapshot_agents(snapshot.to_snapshot_agents())
+
+    Parameters
+    ----------
+
+    arrays
+      A dict {array_name: array} with all arrays in ``ARRAY_NAMES``.
+
+    agent_names
+      List of agent names, indexed by the ids in ``agent_types``.
+
+    site_names_table
+      List of site names, indexed by the ids in ``site_names``.
+
+    states_table
+      List of site internal states, indexed by the ids in ``states``.
+    """
+
+    def __init__(self, arrays, agent_names, site_names_table, states_table):
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.agent_names = list(agent_names)
+        self.site_names_table = list(site_names_table)
+        self.states_table = list(states_table)
+
+    @classmethod
+    def from_snapshot_agents(cls, snapshot_agents):
+        """Create a CompactSnapshot from kappy-style snapshot agents."""
+        agent_names, site_names, states = [_StringTable() for _ in range(3)]
+        counts, agent_types, sites, links, site_states = [], [], [], [], []
+        complex_offsets, agent_site_offsets = [0], [0]
+        site_link_offsets, site_state_offsets = [0], [0]
+        for count, nodes in snapshot_agents:
+            counts.append(count)
+            for node in nodes:
+                agent_types.append(agent_names.id(node["node_type"]))
+                for site in node["node_sites"]:
+                    site_type, site_data = site["site_type"]
+                    if site_type != "port":
+                        raise ValueError(
+                            "Unsupported site type %s in CompactSnapshot" % site_type
+                        )
+                    sites.append(site_names.id(site["site_name"]))
+                    links.extend(site_data["port_links"])
+                    site_link_offsets.append(len(links))
+                    site_states.extend(
+                        states.id(state) for state in site_data["port_states"]
+                    )
+                    site_state_offsets.append(len(site_states))
+                agent_site_offsets.append(len(sites))
+            complex_offsets.append(len(agent_types))
+        arrays = dict(
+            complex_counts=counts,
+            complex_offsets=complex_offsets,
+            agent_types=agent_types,
+            agent_site_offsets=agent_site_offsets,
+            site_names=sites,
+            site_link_offsets=site_link_offsets,
+            links=np.array(links, dtype="int32").reshape((-1, 2)),
+            site_state_offsets=site_state_offsets,
+            states=site_states,
+        )
+        arrays = {k: np.asarray(v, dtype="int32") for k, v in arrays.items()}
+        return CompactSnapshot(
+            arrays, agent_names.strings, site_names.strings, states.strings
+        )
+
+    def __len__(self):
+        return len(self.complex_counts)
+
+    def __getitem__(self, index):
+        """Return the (count, nodes) of the i-th complex, in kappy format."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Complex index out of range: %d" % index)
+        nodes = []
+        start, end = self.complex_offsets[index : index + 2]
+        for agent in range(start, end):
+            node_sites = []
+            site_start, site_end = self.agent_site_offsets[agent : agent + 2]
+            for site in range(site_start, site_end):
+                link_start, link_end = self.site_link_offsets[site : site + 2]
+                state_start, state_end = self.site_state_offsets[site : site + 2]
+                port_data = {
+                    "port_links": self.links[link_start:link_end].tolist(),
+                    "port_states": [
+                        self.states_table[state]
+                        for state in self.states[state_start:state_end]
+                    ],
+                }
+                node_sites.append(
+                    {
+                        "site_name": self.site_names_table[self.site_names[site]],
+                        "site_type": ["port", port_data],
+                    }
+                )
+            nodes.append(
+                {
+                    "node_type": self.agent_names[self.agent_types[agent]],
+                    "node_sites": node_sites,
+                }
+            )
+        return [int(self.complex_counts[index]), nodes]
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def to_snapshot_agents(self):
+        """Return the snapshot agents as a list of [count, nodes] complexes.
+
+        The result can be fed to ``plot_snapshot_agents`` or (nodes only) to
+        ``snapshot_agent_nodes_to_graph``.
+        """
+        return list(self)
+
+    def write(self, filepath):
+        """Write the snapshot to a binary file that can be memory-mapped.
+
+        The file starts with a magic string, the size of a JSON header, the
+        JSON header (string tables and arrays layout), then the raw arrays.
+        """
+        layout, offset = {}, 0
+        for name in ARRAY_NAMES:
+            array = getattr(self, name)
+            layout[name] = dict(offset=offset, shape=list(array.shape))
+            offset += _aligned(array.nbytes)
+        header = json.dumps(
+            dict(
+                agent_names=self.agent_names,
+                site_names_table=self.site_names_table,
+                states_table=self.states_table,
+                layout=layout,
+            )
+        ).encode("utf-8")
+        header += b" " * (_aligned(len(header)) - len(header))
+        with open(filepath, "wb") as f:
+            f.write(MAGIC)
+            f.write(np.array(len(header), dtype="<u8").tobytes())
+            f.write(header)
+            for name in ARRAY_NAMES:
+                data = np.ascontiguousarray(getattr(self, name), dtype="<i4")
+                f.write(data.tobytes())
+                f.write(b"\0" * (_aligned(data.nbytes) - data.nbytes))
+
+    @classmethod
+    def read(cls, filepath, mmap=True):
+        """Read a snapshot written with ``CompactSnapshot.write``.
+
+        If mmap is True, the arrays are memory-mapped (read-only) rather than
+        loaded, so opening even a huge snapshot is instantaneous and only the
+        accessed complexes are read from disk.
+        """
+        with open(filepath, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError("%s is not a topkappy snapshot file" % filepath)
+            header_size = int(np.frombuffer(f.read(8), dtype="<u8")[0])
+            header = json.loads(f.read(header_size).decode("utf-8"))
+        data_start = len(MAGIC) + 8 + header_size
+        arrays = {}
+        for name, array_layout in header["layout"].items():
+            shape = tuple(array_layout["shape"])
+            offset = data_start + array_layout["offset"]
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.zeros(shape, dtype="<i4")
+            elif mmap:
+                arrays[name] = np.memmap(
+                    filepath, dtype="<i4", mode="r", offset=offset, shape=shape
+                )
+            else:
+                with open(filepath, "rb") as f:
+                    f.seek(offset)
+                    arrays[name] = np.fromfile(
+                        f, dtype="<i4", count=int(np.prod(shape))
+                    ).reshape(shape)
+        return CompactSnapshot(
+            arrays,
+            agent_names=header["agent_names"],
+            site_names_table=header["site_names_table"],
+            states_table=header["states_table"],
+        )
+
+
+def _aligned(size):
+    """Round the size up to the next multiple of ALIGNMENT."""
+    return ALIGNMENT * ((size + ALIGNMENT - 1) // ALIGNMENT)
@@ -1,8 +1,13 @@
+import threading
+
 import kappy
 from .KappaClasses import KappaAgent, KappaSiteState
-from .FormattedKappaError import FormattedKappaError
+from .snapshot_inits import iter_snapshot_agents_kappa_inits
+from .plot_points import check_plot_points
+from .simulation_tasks import SimulationTask, run_simulation_task
+from .census import census_snapshot_times, is_census_snapshot_name
 
-import time
+ENGINES = ("kappa", "ode", "gillespie", "tau_leaping")
 
 
 class KappaModel:
@@ -42,8 +47,71 @@ class KappaModel:
     stop_condition
       String representing a Kappa stopping condition. If none is provided,
       the simulation stops after the provided ``duration`` is reached.
+
+    plot_points
+      Which points of the plots are retrieved from the simulator and
+      returned: 'all' (default), 'final' (last point only), {'every': k}
+      (one point every k plot time steps) or {'times': [t1, t2, ...]} (the
+      points closest to these times). Retrieving fewer points makes each
+      run lighter when only e.g. the final values matter.
+
+    engine
+      Simulation engine: either 'kappa' (default, stochastic simulation with
+      KaSim through kappy) or 'ode' for a fast deterministic (mean-field)
+      simulation of simple binding models (see ``simulate_ode``), which
+      returns no snapshots, 'gillespie' for an in-process stochastic
+      simulation of simple binding models (see ``simulate_gillespie``), or
+      'tau_leaping' for an approximate but faster stochastic simulation of
+      simple binding models, without snapshots (see
+      ``simulate_tau_leaping``).
+
+    initial_snapshot
+      A snapshot from a previous simulation (either the snapshot dict or its
+      ``snapshot_agents``), to start the simulation from the complexes of
+      that snapshot (in addition to the ``initial_quantities``).
+
+    timeout
+      Maximal wall-clock duration of a simulation, in seconds. Simulations
+      exceeding it are interrupted and their results contain the plots up
+      to the interruption, with status 'timeout' (see
+      ``run_simulation_task``).
+
+    max_events
+      Maximal number of events of a simulation (result status
+      'max_events' when exceeded).
+
+    max_memory
+      Maximal memory of the Kappa simulator process, in megabytes (result
+      status 'max_memory' when exceeded). Only for the 'kappa' engine, and
+      ``timeout`` and ``max_events`` are not supported by the 'ode' engine.
+
+    census_period
+      If provided, a "census" of the complexes is taken at every multiple of
+      this period (up to the duration): the simulator dumps a snapshot,
+      which is reduced right away to histograms of the complexes sizes and
+      species (see ``snapshot_census``) and discarded. The census are
+      returned in ``simulation_results['census']``, which holds in memory
+      (and returns) much less than many ``snapshot_times``. Note that with
+      the 'kappa' engine each census still dumps a full snapshot, which is
+      sent by the simulator, so the simulator I/O is the same as with
+      snapshots. Only for the 'kappa' and 'gillespie' engines, and models
+      with a duration. The census snapshots are named 'census_1',
+      'census_2'..., names which the ``snapshot_times`` can't use.
+
+    seed
+      Seed of the simulations of the model (by default, each simulation
+      gets a new random seed). The seed of each simulation is recorded in
+      its results, see ``get_simulation_results``.
+
+    A model can be simulated from several threads at once (e.g. with a
+    ``LocalThreadExecutor``): each run works on a frozen copy of the model
+    (see ``frozen_copy``) and with its own Kappa client, so changing the
+    model (e.g. with ``set_parameters``) during a run does not affect it.
     """
 
+    # Shared by all models, only held while copying or setting parameters.
+    _state_lock = threading.RLock()
+
     def __init__(
         self,
         agents,
@@ -54,13 +122,47 @@ class KappaModel:
         plot_time_step=0.1,
         duration=None,
         stop_condition=None,
+        initial_snapshot=None,
+        plot_points="all",
+        engine="kappa",
+        timeout=None,
+        max_events=None,
+        max_memory=None,
+        census_period=None,
+        seed=None,
     ):
 
         self.agents = agents
         self.rules = rules
         self.initial_quantities = initial_quantities
+        self.initial_snapshot = initial_snapshot
         self.snapshot_times = snapshot_times or {}
         self.plots = list(plots)
+        check_plot_points(plot_points)
+        self.plot_points = plot_points
+        if engine not in ENGINES:
+            raise ValueError("engine should be one of %s" % (ENGINES,))
+        self.engine = engine
+        if (max_memory is not None) and (engine != "kappa"):
+            raise ValueError("max_memory is only supported by the 'kappa' engine.")
+        if (engine == "ode") and (timeout is not None or max_events is not None):
+            raise ValueError("The 'ode' engine supports no timeout or max_events.")
+        self.timeout = timeout
+        self.max_events = max_events
+        self.max_memory = max_memory
+        if (census_period is not None) and (duration is None):
+            raise ValueError("A census_period requires a model duration.")
+        if census_period is not None:
+            reserved_names = [
+                sid for sid in self.snapshot_times if is_census_snapshot_name(sid)
+            ]
+            if len(reserved_names):
+                raise ValueError(
+                    "Snapshot names %s are reserved for the census snapshots."
+                    % reserved_names
+                )
+        self.census_period = census_period
+        self.seed = seed
         self.set_parameters(
             duration=duration,
             stop_condition=stop_condition,
@@ -73,43 +175,104 @@ class KappaModel:
         Do not attempt to set these parameters otherwise than with this
         function, e.g. directly by accessing self.parameters: it won't work.
         """
-        if stop_condition is None:
-            stop_condition = "[T] > %.04f" % duration
-        self.parameters = kappy.SimulationParameter(
-            plot_period=plot_time_step, pause_condition=stop_condition
+        pause_condition = stop_condition
+        if pause_condition is None:
+            pause_condition = "[T] > %.04f" % duration
+        parameters = kappy.SimulationParameter(
+            plot_period=plot_time_step, pause_condition=pause_condition
         )
+        with self._state_lock:
+            self.duration = duration
+            self.stop_condition = stop_condition
+            self.plot_time_step = plot_time_step
+            self.parameters = parameters
 
-    def _kappa_script_for_agents_declarations(self):
-        """Generate the script for declaring agents."""
-        return "\n".join([a._kappa_declaration() for a in self.agents])
+    def copy(self, **changes):
+        """Return a copy of the model, with some constructor parameters changed.
 
-    def _kappa_script_for_rules(self):
-        """Generate the script for declaring all complexation rules."""
-        return "\n".join([r._kappa() for r in self.rules])
+        Examples
+        --------
 
-    def _kappa_script_for_initial_quantities(self):
-        """Generate the script for declaring all initial quantities."""
-        return "\n".join(
-            [
-                "%%init: %d %s()"
-                % (n, agent.name if isinstance(agent, KappaAgent) else agent)
-                for agent, n in self.initial_quantities.items()
-            ]
+        >>> longer_model = model.copy(duration=100, snapshot_times={})
+        """
+        with self._state_lock:
+            parameters = self._constructor_parameters()
+        parameters.update(changes)
+        return self.__class__(**parameters)
+
+    def _constructor_parameters(self):
+        return dict(
+            agents=self.agents,
+            rules=self.rules,
+            initial_quantities=self.initial_quantities,
+            snapshot_times=self.snapshot_times,
+            plots=self.plots,
+            plot_time_step=self.plot_time_step,
+            duration=self.duration,
+            stop_condition=self.stop_condition,
+            initial_snapshot=self.initial_snapshot,
+            plot_points=self.plot_points,
+            engine=self.engine,
+            timeout=self.timeout,
+            max_events=self.max_events,
+            max_memory=self.max_memory,
+            census_period=self.census_period,
+            seed=self.seed,
         )
 
-    def _kappa_script_for_snapshots(self):
-        """Generate the script for declaring when snapshots are recorded."""
-        return "\n".join(
-            [
-                '%%mod: alarm %.03f do $SNAPSHOT "%s";' % (t, sid)
-                for sid, t in self.snapshot_times.items()
-            ]
+    def frozen_copy(self):
+        """Return a copy of the model independent from later changes to it.
+
+        The lists and dicts of the model (agents, rules, plots, initial
+        quantities, snapshot times) are copied, so modifying them in place
+        afterwards doesn't affect the copy. The initial snapshot is shared
+        and should not be modified in place.
+        """
+        with self._state_lock:
+            parameters = self._constructor_parameters()
+            for name in ["agents", "rules", "plots"]:
+                parameters[name] = list(parameters[name])
+            for name in ["initial_quantities", "snapshot_times"]:
+                if isinstance(parameters[name], dict):
+                    parameters[name] = dict(parameters[name])
+        return self.__class__(**parameters)
+
+    def _kappa_lines_for_agents_declarations(self):
+        """Generate the lines declaring agents."""
+        return (a._kappa_declaration() for a in self.agents)
+
+    def _kappa_lines_for_rules(self):
+        """Generate the lines declaring all complexation rules."""
+        return (r._kappa() for r in self.rules)
+
+    def _kappa_lines_for_initial_quantities(self):
+        """Generate the lines declaring all initial quantities."""
+        for agent, n in self.initial_quantities.items():
+            name = agent.name if isinstance(agent, KappaAgent) else agent
+            yield "%%init: %d %s()" % (n, name)
+        if self.initial_snapshot is not None:
+            for line in iter_snapshot_agents_kappa_inits(self.initial_snapshot):
+                yield line
+
+    @property
+    def census_snapshot_times(self):
+        """Dict {snapshot_name: time} of the snapshots used for the census."""
+        if self.census_period is None:
+            return {}
+        return census_snapshot_times(self.census_period, self.duration)
+
+    def _kappa_lines_for_snapshots(self):
+        """Generate the lines declaring when snapshots are recorded."""
+        all_snapshot_times = dict(self.snapshot_times, **self.census_snapshot_times)
+        return (
+            '%%mod: alarm %.03f do $SNAPSHOT "%s";' % (t, sid)
+            for sid, t in all_snapshot_times.items()
         )
 
     def _auto_plot_item_string(self, item):
         """Generate the Kappa string for the number of agents or sites.
 
-        This is mainly a helper for _kappa_script_for_plotted.
+        This is mainly a helper for _kappa_lines_for_plotted.
         """
         if isinstance(item, KappaAgent):
             return "|%s()|" % item.name
@@ -118,31 +281,114 @@ class KappaModel:
         else:
             return item
 
+    def _kappa_lines_for_plotted(self):
+        """Generate the lines declaring what gets plotted."""
+        return (
+            "%%plot: %s" % self._auto_plot_item_string(plot_item)
+            for plot_item in self.plots
+        )
+
+    def _kappa_script_sections(self):
+        """Return the line generators of the sections of the script."""
+        return [
+            self._kappa_lines_for_agents_declarations(),
+            self._kappa_lines_for_rules(),
+            self._kappa_lines_for_initial_quantities(),
+            self._kappa_lines_for_snapshots(),
+            self._kappa_lines_for_plotted(),
+        ]
+
+    def _kappa_script_for_agents_declarations(self):
+        """Generate the script for declaring agents."""
+        return "\n".join(self._kappa_lines_for_agents_declarations())
+
+    def _kappa_script_for_rules(self):
+        """Generate the script for declaring all complexation rules."""
+        return "\n".join(self._kappa_lines_for_rules())
+
+    def _kappa_script_for_initial_quantities(self):
+        """Generate the script for declaring all initial quantities."""
+        return "\n".join(self._kappa_lines_for_initial_quantities())
+
+    def _kappa_script_for_snapshots(self):
+        """Generate the script for declaring when snapshots are recorded."""
+        return "\n".join(self._kappa_lines_for_snapshots())
+
     def _kappa_script_for_plotted(self):
         """Generate the script for declaring what gets plotted."""
-        return "\n".join(
-            [
-                "%%plot: %s" % self._auto_plot_item_string(plot_item)
-                for plot_item in self.plots
-            ]
-        )
+        return "\n".join(self._kappa_lines_for_plotted())
 
     def _full_kappa_script(self):
         """Generate the full script to be passed to the Kappa simulator."""
-        return "\n\n".join(
-            [
-                self._kappa_script_for_agents_declarations(),
-                self._kappa_script_for_rules(),
-                self._kappa_script_for_initial_quantities(),
-                self._kappa_script_for_snapshots(),
-                self._kappa_script_for_plotted(),
-            ]
+        return "\n\n".join("\n".join(lines) for lines in self._kappa_script_sections())
+
+    def write_kappa_script(self, target):
+        """Write the full Kappa script of the model to a file, line by line.
+
+        The script is never entirely in memory, so this is the way to go for
+        generated models with millions of lines. The written script is
+        identical to the one used by ``get_simulation_results()``.
+
+        Parameters
+        ----------
+
+        target
+          Either a file path or a writable (text) file-like object.
+        """
+        if not hasattr(target, "write"):
+            with open(target, "w") as f:
+                return self.write_kappa_script(f)
+        for i, lines in enumerate(self._kappa_script_sections()):
+            if i > 0:
+                target.write("\n\n")
+            for j, line in enumerate(lines):
+                if j > 0:
+                    target.write("\n")
+                target.write(line)
+
+    def simulation_task(self, seed=None, script_file=None):
+        """Return a picklable SimulationTask to run this model elsewhere.
+
+        If a script_file path is provided, the script is streamed to that
+        file (see ``write_kappa_script``) and the task refers to the file
+        rather than carrying the script.
+
+        The seed defaults to the model's ``seed``.
+
+        See ``topkappy.executors`` for running tasks in other processes.
+
+        The task is created from a frozen copy of the model (see
+        ``frozen_copy``), so it is not affected by later changes to the model.
+        """
+        model = self.frozen_copy()
+        if model.engine != "kappa":
+            model_string = script_file = None
+        elif script_file is None:
+            model_string = model._full_kappa_script()
+        else:
+            model.write_kappa_script(script_file)
+            model_string = None
+        return SimulationTask(
+            model_string=model_string,
+            plot_period=model.parameters.plot_period,
+            pause_condition=model.parameters.pause_condition,
+            snapshot_names=list(model.snapshot_times),
+            seed=model.seed if seed is None else seed,
+            model_file=script_file,
+            plot_points=model.plot_points,
+            engine=model.engine,
+            model=model if model.engine != "kappa" else None,
+            timeout=model.timeout,
+            max_events=model.max_events,
+            max_memory=model.max_memory,
+            census_snapshot_times=model.census_snapshot_times,
         )
 
-    def get_simulation_results(self):
+    def get_simulation_results(self, executor=None, script_file=None, seed=None):
         """Run a simulation of the model and return results as a dict.
 
-        The result is of the form {plots: {}, snapshots {}}.
+        The result is of the form {plots: {}, snapshots {}, status: '',
+        seed: 123}.
 
         The plots dict is of the form {'[T]': [...], 'A()': [...]} where the
         values are lists of numbers.
@@ -152,43 +398,33 @@ class KappaModel:
         that time point, and how often they occur. (See kappy documentation
         for more).
 
+        The status is 'completed' unless the simulation was interrupted by
+        the model's ``timeout``, ``max_events`` or ``max_memory`` limit, in
+        which case the plots stop at the interruption.
+
+        Models with a ``census_period`` also have a "census" entry: a list
+        of dicts {time, complex_sizes, species}, one per census.
+
+        The seed is the one of the simulation: the ``seed`` parameter, or
+        the model's seed, or a random seed. Running the model again with
+        that seed replays the simulation.
+
+        If some snapshots could not be retrieved (e.g. because the
+        simulation stopped before their time), the result also has a
+        "snapshot_errors" entry: a dict {snapshot_name: error_message}.
+
         Topkappy has a methods like ``plot_simulation_time_series`` or
         ``plot_snapshot_agents`` to help make sense of the simulation
         results.
+
+        If an executor (see ``topkappy.executors``) is provided, the
+        simulation is run by that executor, e.g. in a worker process.
+
+        If a script_file path is provided, the Kappa script is streamed to
+        that file and loaded by the simulator from there, instead of being
+        built as one string in memory (recommended for giant models).
         """
-        model_string = self._full_kappa_script()
-        kappa_client = kappy.KappaStd()
-        kappa_client.add_model_string(model_string)
-        try:
-            kappa_client.project_parse()
-        except kappy.KappaError as kappa_error:
-            raise FormattedKappaError.from_kappa_error(kappa_error, model_string)
-        kappa_client.simulation_start(self.parameters)
-        kappa_client.wait_for_simulation_stop()
-        plot_data = kappa_client.simulation_plot()
-        plot_data = dict(zip(plot_data["legend"], zip(*plot_data["series"])))
-        snapshots = {}
-
-        _ = kappa_client.simulation_snapshots()
-        # print(kappa_client.__dict__)
-
-        def get_shapshots():
-            snapshots = {}
-            for sid in list(self.snapshot_times) + ["deadlock"]:
-                try:
-                    name = sid + ".ka"
-                    snapshots[sid] = kappa_client.simulation_snapshot(name)
-                except:
-                    try:
-                        snapshots[sid] = kappa_client.simulation_snapshot(sid)
-                    except:
-                        pass
-            return snapshots
-
-        for _try in range(3):
-            snapshots = get_shapshots()
-            if len(snapshots):
-                break
-            time.sleep(0.2)
-
-        return {"plots": plot_data, "snapshots": snapshots}
+        task = self.simulation_task(seed=seed, script_file=script_file)
+        if executor is None:
+            return run_simulation_task(task)
+        return executor.run_tasks([task])[0]
@@ -0,0 +1,207 @@
+import copy
+import hashlib
+
+from .KappaClasses import KappaAgent, KappaRule
+from .snapshot_inits import iter_snapshot_agents_kappa_inits
+from .simulation_tasks import run_simulation_task
+
+
+def _agent_name(agent):
+    return agent.name if isinstance(agent, KappaAgent) else agent
+
+
+class KappaModelTemplate:
+    """Family of KappaModels differing only by their rates and initial counts.
+
+    The rates of the rules and the initial quantities of the agents become
+    Kappa ``%var`` variables of a template script, which is rendered only
+    once. Each instance of the family is then only a few ``%var`` lines.
+    When the simulations are run with a long-lived Kappa client (e.g. by
+    the workers of ``topkappy.executors``), the template is uploaded to the
+    simulator once, and only the variables file changes between runs.
+
+    Examples
+    --------
+
+    >>> template = KappaModelTemplate(model)
+    >>> tasks = [
+    >>>     template.simulation_task(rates={"a.b": rate}, initial_quantities={"A": n})
+    >>>     for rate in rates
+    >>>     for n in [100, 200, 500]
+    >>> ]
+    >>> results = executor.run_tasks(tasks)
+
+    Parameters
+    ----------
+
+    model
+      The KappaModel providing the structure of the family, and the default
+      values of the variables.
+
+    rate_rules
+      Names of the rules whose rates are variables (default: all rules). The
+      rate of a '<->' rule named "r" gives variables "rate_r" and
+      "rate_r_reverse", overridden with a pair of values.
+
+    quantity_agents
+      Names of the agents whose initial quantities are variables named e.g.
+      "n_A" (default: all agents of ``model.initial_quantities``).
+    """
+
+    def __init__(self, model, rate_rules=None, quantity_agents=None):
+        self.model = model
+        if rate_rules is None:
+            rate_rules = [rule.name for rule in model.rules]
+        quantities = {_agent_name(a): n for a, n in model.initial_quantities.items()}
+        if quantity_agents is None:
+            quantity_agents = list(quantities)
+        self.default_values = {}
+        self.rate_variables = {}
+        template_rules = []
+        for rule in model.rules:
+            if rule.name not in rate_rules:
+                template_rules.append(rule)
+                continue
+            names = ["rate_%s" % rule.name]
+            values = [rule.rate]
+            if isinstance(rule.rate, (list, tuple)):
+                names.append("rate_%s_reverse" % rule.name)
+                values = list(rule.rate)
+            self.rate_variables[rule.name] = names
+            self.default_values.update(zip(names, values))
+            template_rules.append(
+                KappaRule(
+                    name=rule.name,
+                    reactants=rule.reactants,
+                    sense=rule.sense,
+                    products=rule.products,
+                    rate=", ".join("'%s'" % name for name in names),
+                )
+            )
+        self.quantity_variables = {}
+        for agent in quantity_agents:
+            if agent not in quantities:
+                raise ValueError("Agent %s has no initial quantity" % agent)
+            self.quantity_variables[agent] = "n_%s" % agent
+            self.default_values["n_%s" % agent] = quantities[agent]
+        self.template_model = model.copy(rules=template_rules)
+        self.template_string = self._render_template()
+        template_hash = hashlib.sha1(self.template_string.encode("utf-8"))
+        self.template_id = "template_%s" % template_hash.hexdigest()[:16]
+        self._prototype_task = None
+
+    def _template_lines_for_initial_quantities(self):
+        model = self.template_model
+        for agent, n in model.initial_quantities.items():
+            name = _agent_name(agent)
+            if name in self.quantity_variables:
+                yield "%%init: '%s' %s()" % (self.quantity_variables[name], name)
+            else:
+                yield "%%init: %d %s()" % (n, name)
+        if model.initial_snapshot is not None:
+            for line in iter_snapshot_agents_kappa_inits(model.initial_snapshot):
+                yield line
+
+    def _render_template(self):
+        sections = self.template_model._kappa_script_sections()
+        sections[2] = self._template_lines_for_initial_quantities()
+        return "\n\n".join("\n".join(lines) for lines in sections)
+
+    def variables_values(self, rates=None, initial_quantities=None):
+        """Return {variable_name: value} for the given rates and quantities.
+
+        Parameters
+        ----------
+
+        rates
+          A dict {rule_name: rate} (or pair of rates for '<->' rules) of
+          rates overriding the model's.
+
+        initial_quantities
+          A dict {agent_name: quantity} overriding the model's.
+        """
+        values = dict(self.default_values)
+        for rule_name, rate in (rates or {}).items():
+            if rule_name not in self.rate_variables:
+                raise ValueError("Rule %s has no rate variable" % rule_name)
+            names = self.rate_variables[rule_name]
+            rate = list(rate) if isinstance(rate, (list, tuple)) else [rate]
+            if len(rate) != len(names):
+                raise ValueError("Rule %s needs %d rates" % (rule_name, len(names)))
+            values.update(zip(names, rate))
+        for agent, quantity in (initial_quantities or {}).items():
+            agent = _agent_name(agent)
+            if agent not in self.quantity_variables:
+                raise ValueError("Agent %s has no quantity variable" % agent)
+            values[self.quantity_variables[agent]] = quantity
+        return values
+
+    def variables_string(self, rates=None, initial_quantities=None):
+        """Return the '%var:' lines of an instance of the template."""
+        values = self.variables_values(rates, initial_quantities)
+        return "\n".join("%%var: '%s' %s" % item for item in values.items())
+
+    def model_instance(self, rates=None, initial_quantities=None):
+        """Return the (full) KappaModel of an instance of the template."""
+        values = self.variables_values(rates, initial_quantities)
+        rules = []
+        for rule in self.model.rules:
+            names = self.rate_variables.get(rule.name)
+            if names is not None:
+                rate = [values[name] for name in names]
+                rule = KappaRule(
+                    name=rule.name,
+                    reactants=rule.reactants,
+                    sense=rule.sense,
+                    products=rule.products,
+                    rate=tuple(rate) if len(rate) > 1 else rate[0],
+                )
+            rules.append(rule)
+        quantities = {}
+        for agent, n in self.model.initial_quantities.items():
+            name = _agent_name(agent)
+            if name in self.quantity_variables:
+                n = values[self.quantity_variables[name]]
+            quantities[agent] = n
+        return self.model.copy(rules=rules, initial_quantities=quantities)
+
+    def simulation_task(self, rates=None, initial_quantities=None, seed=None):
+        """Return a SimulationTask for an instance of the template.
+
+        For the 'kappa' engine, the task only carries the instance's
+        variables (and a reference to the template script, rendered once),
+        see ``run_simulation_task``. For the other engines, it is the task
+        of the ``model_instance``.
+        """
+        if self.model.engine != "kappa":
+            model = self.model_instance(rates, initial_quantities)
+            return model.simulation_task(seed=seed)
+        if self._prototype_task is None:
+            self._prototype_task = self.template_model.simulation_task()
+            self._prototype_task.model_string = None
+        task = copy.copy(self._prototype_task)
+        task.model_string = self.variables_string(rates, initial_quantities)
+        task.template_id = self.template_id
+        task.template_string = self.template_string
+        task.seed = self.model.seed if seed is None else seed
+        return task
+
+    def get_simulation_results(
+        self,
+        rates=None,
+        initial_quantities=None,
+        executor=None,
+        kappa_client="warm",
+        seed=None,
+    ):
+        """Simulate an instance of the template, return results as a dict.
+
+        By default, the simulation is run on the warm Kappa client of the
+        current thread, so that the template is only uploaded once for all
+        instances. See ``KappaModel.get_simulation_results`` for the results
+        format.
+        """
+        task = self.simulation_task(rates, initial_quantities, seed=seed)
+        if executor is None:
+            return run_simulation_task(task, kappa_client=kappa_client)
+        return executor.run_tasks([task])[0]
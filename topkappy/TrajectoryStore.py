@@ -0,0 +1,236 @@
+import json
+import os
+
+import numpy as np
+
+
+def _to_json(obj):
+    """Convert the Numpy scalars and arrays of parameters and seeds for JSON."""
+    if isinstance(obj, (np.generic, np.ndarray)):
+        return obj.tolist()
+    raise TypeError(
+        "Run parameters and seeds must be JSON-serializable, not %s"
+        % type(obj).__name__
+    )
+
+
+class TrajectoryStore:
+    """Chunked, columnar on-disk store for the plot series of many runs.
+
+    Each appended run is recorded with its parameters and seed. Runs are
+    buffered in memory and written by chunks of ``chunk_size`` runs, in a
+    directory with the following (zarr-like) layout::
+
+        store.json              columns (plot legends) and chunk names
+        chunk_00000/runs.json   parameters, seed and columns of each run
+        chunk_00000/offsets.npy start of each run in the column arrays
+        chunk_00000/column_0.npy concatenated series of the first column
+        ...
+
+    Reads only open the files of the requested columns (memory-mapped) and
+    only slice the runs matching the ``where`` predicate, so a few
+    observables of a few runs can be retrieved without loading everything.
+
+    Examples
+    --------
+
+    >>> with TrajectoryStore('sweep_results') as store:
+    >>>     for rate in rates:
+    >>>         results = make_model(rate).get_simulation_results()
+    >>>         store.append(results, parameters={'rate': rate}, seed=None)
+    >>> runs = TrajectoryStore('sweep_results', mode='r').read(
+    >>>     columns=['[T]', '|B(b[.])|'], where={'rate': 0.01})
+
+    Parameters
+    ----------
+
+    directory
+      Path to the store's directory. An existing store is re-opened.
+
+    chunk_size
+      Number of runs per chunk on disk.
+
+    mode
+      Either 'a' (default) to read and append to the store, whose directory
+      is created when the first runs are written, or 'r' to only read an
+      existing store (a FileNotFoundError is raised if there is none).
+    """
+
+    def __init__(self, directory, chunk_size=100, mode="a"):
+        if mode not in ("r", "a"):
+            raise ValueError("mode should be 'r' or 'a', not %s" % (mode,))
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.mode = mode
+        self._buffer = []
+        if os.path.exists(self._metadata_path):
+            with open(self._metadata_path, "r") as f:
+                metadata = json.load(f)
+        elif mode == "r":
+            raise FileNotFoundError("No trajectory store in %s" % directory)
+        else:
+            metadata = dict(columns=[], chunks=[])
+        self.columns = metadata["columns"]
+        self.chunks = metadata["chunks"]
+
+    @property
+    def _metadata_path(self):
+        return os.path.join(self.directory, "store.json")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+    def __len__(self):
+        stored = sum(len(self._read_runs(chunk)) for chunk in self.chunks)
+        return stored + len(self._buffer)
+
+    def append(self, results, parameters=None, seed=None):
+        """Add a run to the store.
+
+        Parameters
+        ----------
+
+        results
+          Either a simulation result ``{'plots': {...}, ...}`` or directly a
+          plots dict ``{'[T]': [...], '|A()|': [...]}``.
+
+        parameters
+          JSON-serializable dict of the parameters of the run (Numpy
+          scalars and arrays are converted to numbers and lists).
+
+        seed
+          Seed used for the run. Defaults to the "seed" recorded in the
+          simulation result, if any.
+        """
+        if self.mode == "r":
+            raise ValueError("Can't append to a store opened with mode='r'.")
+        if (seed is None) and ("plots" in results):
+            seed = results.get("seed")
+        # Checked (and converted) now, rather than when the chunk is written.
+        run_info = json.loads(
+            json.dumps(dict(parameters=parameters or {}, seed=seed), default=_to_json)
+        )
+        plots = results.get("plots", results)
+        plots = {k: np.asarray(v, dtype="float64") for k, v in plots.items()}
+        for column in plots:
+            if column not in self.columns:
+                self.columns.append(column)
+        self._buffer.append(dict(plots=plots, **run_info))
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered runs to disk as a new chunk, if any."""
+        if not len(self._buffer):
+            return
+        chunk = "chunk_%05d" % len(self.chunks)
+        chunk_dir = os.path.join(self.directory, chunk)
+        os.makedirs(chunk_dir)
+        lengths = [
+            max([len(s) for s in run["plots"].values()] or [0]) for run in self._buffer
+        ]
+        offsets = np.cumsum([0] + lengths)
+        np.save(os.path.join(chunk_dir, "offsets.npy"), offsets)
+        for column_index, column in enumerate(self.columns):
+            if not any(column in run["plots"] for run in self._buffer):
+                continue
+            data = np.full(offsets[-1], np.nan)
+            for run, start in zip(self._buffer, offsets):
+                series = run["plots"].get(column, ())
+                data[start : start + len(series)] = series
+            filename = "column_%d.npy" % column_index
+            np.save(os.path.join(chunk_dir, filename), data)
+        runs = [
+            dict(
+                parameters=run["parameters"],
+                seed=run["seed"],
+                columns=[self.columns.index(column) for column in run["plots"]],
+            )
+            for run in self._buffer
+        ]
+        with open(os.path.join(chunk_dir, "runs.json"), "w") as f:
+            json.dump(runs, f)
+        self.chunks.append(chunk)
+        self._buffer = []
+        with open(self._metadata_path, "w") as f:
+            json.dump(dict(columns=self.columns, chunks=self.chunks), f)
+
+    def _read_runs(self, chunk):
+        with open(os.path.join(self.directory, chunk, "runs.json"), "r") as f:
+            return json.load(f)
+
+    def read(self, columns=None, where=None):
+        """Return the runs matching ``where``, with only the selected columns.
+
+        Parameters
+        ----------
+
+        columns
+          List of plot legends to read, e.g. ``['[T]', '|B(b[.])|']``. If
+          None, all columns are read.
+
+        where
+          Either a dict {parameter: value} (runs are selected if all their
+          parameters match), or a function ``f(parameters, seed) -> bool``,
+          or None to select all runs.
+
+        Returns
+        -------
+
+        runs
+          A list of dicts ``{'parameters': {}, 'seed': seed, 'plots': {}}``
+          where the plots values are Numpy arrays. Columns absent from a run
+          are absent from its plots dict, and series shorter than the run's
+          longest series are padded with NaNs.
+        """
+        self.flush()
+        if columns is None:
+            columns = self.columns
+        unknown_columns = [c for c in columns if c not in self.columns]
+        if len(unknown_columns):
+            raise ValueError("Unknown columns: %s" % unknown_columns)
+        if where is None:
+            predicate = lambda parameters, seed: True
+        elif isinstance(where, dict):
+            predicate = lambda parameters, seed: all(
+                parameters.get(k) == v for k, v in where.items()
+            )
+        else:
+            predicate = where
+        selected_runs = []
+        for chunk in self.chunks:
+            chunk_dir = os.path.join(self.directory, chunk)
+            runs = self._read_runs(chunk)
+            selected = [
+                i
+                for i, run in enumerate(runs)
+                if predicate(run["parameters"], run["seed"])
+            ]
+            if not len(selected):
+                continue
+            offsets = np.load(os.path.join(chunk_dir, "offsets.npy"))
+            column_data = {}
+            for column in columns:
+                filename = "column_%d.npy" % self.columns.index(column)
+                path = os.path.join(chunk_dir, filename)
+                if os.path.exists(path):
+                    column_data[column] = np.load(path, mmap_mode="r")
+            for i in selected:
+                start, end = offsets[i], offsets[i + 1]
+                run_columns = [self.columns[c] for c in runs[i]["columns"]]
+                plots = {
+                    column: np.array(data[start:end])
+                    for column, data in column_data.items()
+                    if column in run_columns
+                }
+                selected_runs.append(
+                    dict(
+                        parameters=runs[i]["parameters"],
+                        seed=runs[i]["seed"],
+                        plots=plots,
+                    )
+                )
+        return selected_runs
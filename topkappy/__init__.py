@@ -5,9 +5,58 @@
 from .KappaClasses import KappaAgent, KappaSiteState, KappaRule
 from .FormattedKappaError import FormattedKappaError
 from .KappaModel import KappaModel
+from .KappaModelTemplate import KappaModelTemplate
+from .simulation_tasks import SimulationTask, run_simulation_task
+from .seeds import spawn_seeds, random_seed
+from .executors import (
+    SimulationExecutor,
+    SerialExecutor,
+    FuturesExecutor,
+    LocalThreadExecutor,
+    LocalProcessExecutor,
+    WorkerServerExecutor,
+    LocalWorkers,
+    run_worker_server,
+)
+from .ensembles import (
+    run_ensemble,
+    run_sweep,
+    run_adaptive_ensemble,
+    run_adaptive_sweep,
+)
+from .online_statistics import RunningStatistics, PlotSeriesAggregator
+from .batching import ModelsBatch, get_batched_simulation_results
+from .snapshot_inits import (
+    complex_nodes_to_kappa,
+    canonical_complex_nodes,
+    snapshot_agents_to_kappa_inits,
+)
+from .model_branching import diff_models, simulate_branches
+from .reaction_networks import ReactionNetwork, UnsupportedModelError
+from .ode_engine import simulate_ode
+from .gillespie_engine import simulate_gillespie
+from .tau_leaping import simulate_tau_leaping
+from .rate_evaluation import RuleRatesEvaluator, model_with_rule_rates
+from .sensitivity import (
+    finite_differences_sensitivities,
+    morris_screening,
+    sobol_indices,
+)
+from .calibration import RatesCalibration, sum_of_squares_loss
+from .census import snapshot_census
+from .CompactSnapshot import CompactSnapshot
+from .TrajectoryStore import TrajectoryStore
 from .agents_graphs import (
     plot_snapshot_agent_nodes_graph,
     snapshot_agent_nodes_to_graph,
     plot_snapshot_agents,
 )
+from .layouts import grid_force_directed_layout, batch_force_directed_layouts
+from .snapshot_export import (
+    complex_graph_layout,
+    complex_graph_to_json,
+    complex_graph_to_svg,
+    snapshot_agents_report_data,
+    write_snapshot_agents_report,
+)
 from .plot_simulation_time_series import plot_simulation_time_series
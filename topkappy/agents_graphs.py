@@ -2,6 +2,8 @@ import networkx as nx
 import matplotlib.pyplot as plt
 import numpy as np
 
+from .layouts import grid_force_directed_layout
+
 
 def snapshot_agent_nodes_to_graph(nodes, with_ports=True):
     """Turn a simulation result into a networkx graph of a bio-complex.
@@ -55,7 +57,10 @@ def plot_snapshot_agent_nodes_graph(
 
     positions
       A dict {node: position}. A ``layout_method`` can be provided instead
-      for automatic positioning.
+      for automatic positioning. With ``layout_method='grid'``, these
+      positions are used as a warm start (e.g. the positions of a previous
+      layout of the same complex, see ``grid_force_directed_layout``). With
+      ``layout_method=None``, they are used as they are.
 
     pos_seed
       A seed to freeze the positions when using semi-random positioning
@@ -66,9 +71,16 @@ def plot_snapshot_agent_nodes_graph(
 
     layout_method
       Networkx layout method for the graph drawing.
-      Either 'FR' (fruchterman_reingold), 'spectral' or 'spring'.
+      Either 'FR' (fruchterman_reingold), 'spectral' or 'spring', or 'grid'
+      for a much faster layout of large complexes (see
+      ``grid_force_directed_layout``).
     """
-    if layout_method == "FR":
+    if layout_method is None:
+        if positions is None:
+            raise ValueError("Provide positions when layout_method is None.")
+    elif layout_method == "grid":
+        positions = grid_force_directed_layout(graph, positions, seed=pos_seed)
+    elif layout_method == "FR":
         positions = nx.layout.fruchterman_reingold_layout(graph, seed=pos_seed)
     elif layout_method == "spectral":
         positions = nx.layout.spectral_layout(graph)
@@ -136,7 +148,8 @@ def plot_snapshot_agents(
 
     layout_method
       Networkx layout method for the graph drawing.
-      Either 'FR' (fruchterman_reingold), 'spectral' or 'spring'.
+      Either 'FR' (fruchterman_reingold), 'spectral' or 'spring', or 'grid'
+      for a much faster layout of large complexes.
 
     freq_cutoff
       All complexes with a number of occurences lower than frew_cutoff in
@@ -0,0 +1,256 @@
+import re
+
+from .KappaClasses import KappaAgent, KappaSiteState, KappaRule
+from .KappaModel import KappaModel
+from .executors import SerialExecutor
+from .plot_points import select_plot_points
+
+# KappaModel settings which apply to a whole (packed) run.
+UNBATCHABLE_SETTINGS = ("seed", "timeout", "max_events", "max_memory", "census_period")
+
+DURATION_CONDITION_REGEX = re.compile(r"^\s*\[T\]\s*>\s*([\d.eE+-]+)\s*$")
+
+
+def _agent_name(agent):
+    return agent.name if isinstance(agent, KappaAgent) else agent
+
+
+def _duration_from_pause_condition(pause_condition):
+    match = DURATION_CONDITION_REGEX.match(pause_condition)
+    if match is None:
+        raise ValueError(
+            "Only models stopping at a fixed duration can be batched, "
+            "not with stop condition %s" % pause_condition
+        )
+    return float(match.groups()[0])
+
+
+class ModelsBatch:
+    """Pack several independent KappaModels into a single Kappa model.
+
+    The agents, rules and snapshots of the i-th model are prefixed with e.g.
+    ``m3_`` so that agents of different models never interact, and the
+    packed model is simulated only once, which saves the per-run process and
+    parsing overhead when the models are small. The results of the packed
+    simulation are then split back into one result per model, with the
+    original agent names.
+
+    Note that all models must have the same ``plot_time_step``, engine and
+    a fixed duration (no custom ``stop_condition``), and no seed, limits
+    (``timeout``, ``max_events``, ``max_memory``) or ``census_period``,
+    which only make sense for the packed run as a whole. The models'
+    initial snapshots are packed too. A "deadlock" snapshot is only
+    produced when all packed models are deadlocked. As a model's run can't
+    be replayed on its own, the unpacked results have a None "seed", and
+    the seed of the packed run under "batch_seed".
+
+    Examples
+    --------
+
+    >>> batch = ModelsBatch([make_model(rate) for rate in rates])
+    >>> results = batch.get_simulation_results()  # one result per model
+
+    Parameters
+    ----------
+
+    models
+      List of KappaModels.
+
+    prefix_template
+      Template of the prefix of the i-th model's names.
+    """
+
+    def __init__(self, models, prefix_template="m%d_"):
+        self.models = models
+        self.prefixes = [prefix_template % i for i in range(len(models))]
+        plot_periods = set(m.parameters.plot_period for m in models)
+        if len(plot_periods) > 1:
+            raise ValueError("Batched models must have the same plot_time_step.")
+        engines = set(m.engine for m in models)
+        if len(engines) > 1:
+            raise ValueError("Batched models must have the same engine.")
+        for i, model in enumerate(models):
+            unsupported = [
+                name
+                for name in UNBATCHABLE_SETTINGS
+                if getattr(model, name) is not None
+            ]
+            if len(unsupported):
+                raise ValueError(
+                    "Model %d can't be batched as it has settings %s"
+                    % (i, ", ".join(unsupported))
+                )
+        self.durations = [
+            _duration_from_pause_condition(m.parameters.pause_condition) for m in models
+        ]
+        all_snapshot_times = sorted(
+            set(t for m in models for t in m.snapshot_times.values())
+        )
+        self.packed_snapshot_names = {
+            t: "batch_snapshot_%d" % i for i, t in enumerate(all_snapshot_times)
+        }
+        agents, rules, initial_quantities, plots = [], [], {}, []
+        snapshot_agents = []
+        for model, prefix in zip(models, self.prefixes):
+            agents += [self._prefixed_agent(a, prefix) for a in model.agents]
+            rules += [self._prefixed_rule(r, prefix) for r in model.rules]
+            quantities = model.initial_quantities
+            if not isinstance(quantities, dict):
+                quantities = {agent.name: quantities for agent in model.agents}
+            for agent, quantity in quantities.items():
+                initial_quantities[prefix + _agent_name(agent)] = quantity
+            if model.initial_snapshot is not None:
+                snapshot_agents += self._prefixed_snapshot_agents(
+                    model.initial_snapshot, prefix
+                )
+            agent_names = [a.name for a in model.agents]
+            plots += [
+                self._prefixed_expression(
+                    model._auto_plot_item_string(item), agent_names, prefix
+                )
+                for item in model.plots
+            ]
+        self.packed_model = KappaModel(
+            agents=agents,
+            rules=rules,
+            initial_quantities=initial_quantities,
+            snapshot_times={name: t for t, name in self.packed_snapshot_names.items()},
+            plots=plots,
+            plot_time_step=plot_periods.pop() if len(models) else 0.1,
+            duration=max(self.durations or [0]),
+            initial_snapshot=(
+                {"snapshot_agents": snapshot_agents} if len(snapshot_agents) else None
+            ),
+            engine=engines.pop() if len(models) else "kappa",
+        )
+
+    @staticmethod
+    def _prefixed_agent(agent, prefix):
+        return KappaAgent(prefix + agent.name, agent.sites)
+
+    @staticmethod
+    def _prefixed_site_state(site_state, prefix):
+        return KappaSiteState(
+            prefix + _agent_name(site_state.agent), site_state.site, site_state.state
+        )
+
+    def _prefixed_rule(self, rule, prefix):
+        return KappaRule(
+            name=prefix + rule.name,
+            reactants=[self._prefixed_site_state(s, prefix) for s in rule.reactants],
+            sense=rule.sense,
+            products=[self._prefixed_site_state(s, prefix) for s in rule.products],
+            rate=rule.rate,
+        )
+
+    @staticmethod
+    def _prefixed_expression(expression, agent_names, prefix):
+        """Prefix all agent names in a Kappa expression like |A(b[.])|."""
+        if not len(agent_names):
+            return expression
+        names_regex = "|".join(re.escape(name) for name in agent_names)
+        regex = r"(?<![\w'\"])(%s)(?=\()" % names_regex
+        return re.sub(regex, lambda match: prefix + match.group(1), expression)
+
+    @staticmethod
+    def _unprefixed_expression(expression, prefix):
+        regex = r"(?<![\w'\"])%s(?=[\w]*\()" % re.escape(prefix)
+        return re.sub(regex, "", expression)
+
+    @staticmethod
+    def _prefixed_snapshot_agents(snapshot, prefix):
+        if isinstance(snapshot, dict):
+            snapshot = snapshot["snapshot_agents"]
+        return [
+            [
+                count,
+                [dict(node, node_type=prefix + node["node_type"]) for node in nodes],
+            ]
+            for count, nodes in snapshot
+        ]
+
+    def _unpacked_snapshot(self, snapshot, prefix):
+        agents = []
+        for count, nodes in snapshot["snapshot_agents"]:
+            if not nodes[0]["node_type"].startswith(prefix):
+                continue
+            nodes = [
+                dict(node, node_type=node["node_type"][len(prefix) :]) for node in nodes
+            ]
+            agents.append([count, nodes])
+        return dict(snapshot, snapshot_agents=agents)
+
+    def unpack_results(self, packed_results):
+        """Split the results of the packed model into one result per model."""
+        packed_plots = list(packed_results["plots"].items())
+        time_label, times = packed_plots[0]
+        packed_plots = packed_plots[1:]
+        packed_snapshots = packed_results["snapshots"]
+        packed_errors = packed_results.get("snapshot_errors", {})
+        all_results = []
+        for model, prefix, duration in zip(self.models, self.prefixes, self.durations):
+            n_points = len([t for t in times if t <= duration + 1e-9])
+            plots = {time_label: times[:n_points]}
+            for label, series in packed_plots[: len(model.plots)]:
+                label = self._unprefixed_expression(label, prefix)
+                plots[label] = series[:n_points]
+            packed_plots = packed_plots[len(model.plots) :]
+            plots = select_plot_points(plots, model.plot_points, model.plot_time_step)
+            snapshots = {}
+            for sid, t in model.snapshot_times.items():
+                packed_name = self.packed_snapshot_names[t]
+                if packed_name in packed_snapshots:
+                    snapshots[sid] = self._unpacked_snapshot(
+                        packed_snapshots[packed_name], prefix
+                    )
+            if "deadlock" in packed_snapshots:
+                snapshots["deadlock"] = self._unpacked_snapshot(
+                    packed_snapshots["deadlock"], prefix
+                )
+            result = {
+                "plots": plots,
+                "snapshots": snapshots,
+                "status": packed_results.get("status", "completed"),
+                "seed": None,
+                "batch_seed": packed_results.get("seed"),
+            }
+            snapshot_errors = {
+                sid: packed_errors[self.packed_snapshot_names[t]]
+                for sid, t in model.snapshot_times.items()
+                if self.packed_snapshot_names[t] in packed_errors
+            }
+            if len(snapshot_errors):
+                result["snapshot_errors"] = snapshot_errors
+            all_results.append(result)
+        return all_results
+
+    def get_simulation_results(self, executor=None):
+        """Simulate the packed model once, return one result per model."""
+        packed_results = self.packed_model.get_simulation_results(executor=executor)
+        return self.unpack_results(packed_results)
+
+
+def get_batched_simulation_results(models, batch_size=None, executor=None):
+    """Simulate many small models by packing them in batches.
+
+    Each batch of ``batch_size`` models (all models if None) is packed into
+    a single Kappa model (see ``ModelsBatch``), and the packed models are
+    run by the executor, e.g. in parallel. Returns one result per model, in
+    the same order as the models.
+    """
+    if executor is None:
+        executor = SerialExecutor()
+    if batch_size is None:
+        batch_size = max(1, len(models))
+    batches = [
+        ModelsBatch(models[i : i + batch_size])
+        for i in range(0, len(models), batch_size)
+    ]
+    packed_results = executor.run_tasks(
+        [batch.packed_model.simulation_task() for batch in batches]
+    )
+    return [
+        results
+        for batch, batch_results in zip(batches, packed_results)
+        for results in batch.unpack_results(batch_results)
+    ]
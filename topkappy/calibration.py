@@ -0,0 +1,324 @@
+import numpy as np
+
+from .rate_evaluation import (
+    RuleRatesEvaluator,
+    model_with_rule_rates,
+    bounds_arrays,
+    unit_samples_to_rate_sets,
+)
+
+
+def sum_of_squares_loss(simulated, observed):
+    """Default calibration loss: sum of the squared errors over all series.
+
+    Parameters
+    ----------
+
+    simulated, observed
+      Dicts ``{plot_legend: values_array}`` with the simulated (averaged over
+      replicates) and measured values at the measurement times.
+    """
+    return float(sum(np.sum((simulated[k] - observed[k]) ** 2) for k in observed))
+
+
+class RatesCalibration:
+    """Fit rule rates of a model so that its plots match measured series.
+
+    Candidate rate sets are evaluated by population-based optimizers
+    (differential evolution or CMA-ES) one generation at a time, and all the
+    simulations of a generation (candidates x replicates) are submitted at
+    once to the executor, so they run in parallel. The replicates of a
+    candidate are averaged before computing the loss, and use the same seeds
+    for all candidates (common random numbers), which makes the loss much
+    smoother for stochastic models. Simulation results are cached, so that
+    re-running or warm-starting an optimization never re-simulates a rate set.
+
+    Examples
+    --------
+
+    >>> calibration = RatesCalibration(
+    >>>     model,
+    >>>     targets={"|A(b[.])|": (measured_times, measured_values)},
+    >>>     bounds={"binding": (1e-5, 1e-2), "unbinding": (1e-3, 1)},
+    >>>     executor=LocalProcessExecutor(n_workers=8),
+    >>> )
+    >>> fit = calibration.differential_evolution(generations=30)
+    >>> fitted_model = calibration.fitted_model(fit)
+
+    Parameters
+    ----------
+
+    model
+      The KappaModel to calibrate. Only rules with a single rate ('->') can
+      be calibrated.
+
+    targets
+      Measured series, as a dict ``{plot_legend: (times, values)}``, for
+      instance ``{"|A(b[.])|": ([0, 10, 20], [100, 62, 40])}``. The simulated
+      plots are linearly interpolated at the measurement times.
+
+    bounds
+      A dict ``{rule_name: (min_rate, max_rate)}`` of the rates to fit.
+
+    loss
+      Function ``f(simulated, observed) -> float`` where simulated and
+      observed are dicts ``{plot_legend: values_array}``.
+
+    replicates
+      Number of simulations averaged per candidate rate set.
+
+    log_scale
+      If True, the rates are searched in log-space (recommended when the
+      bounds span orders of magnitude).
+
+    executor
+      A topkappy executor to run the simulations, e.g. in parallel.
+
+    seed
+      Seed for the replicates (common random numbers) and the optimizers.
+    """
+
+    def __init__(
+        self,
+        model,
+        targets,
+        bounds,
+        loss=sum_of_squares_loss,
+        replicates=1,
+        log_scale=True,
+        executor=None,
+        seed=0,
+    ):
+        self.model = model
+        self.targets = {
+            legend: (np.array(times, dtype=float), np.array(values, dtype=float))
+            for legend, (times, values) in targets.items()
+        }
+        self.loss = loss
+        self.log_scale = log_scale
+        self.seed = seed
+        self.rule_names, self.lows, self.highs = bounds_arrays(bounds, log_scale)
+        self.evaluator = RuleRatesEvaluator(
+            model, replicates, self._interpolated_plots, executor=executor, seed=seed
+        )
+
+    def _interpolated_plots(self, plots):
+        values = {}
+        for legend, (times, _) in self.targets.items():
+            if legend not in plots:
+                raise ValueError("No plot %s in the simulation results" % legend)
+            series = np.interp(times, plots["[T]"], plots[legend])
+            for i, value in enumerate(series):
+                values[(legend, i)] = value
+        return values
+
+    def rates_from_unit_point(self, point):
+        """Return the rates dict corresponding to a point of [0, 1]^n."""
+        point = np.clip(np.array(point, dtype=float).reshape((1, -1)), 0, 1)
+        rate_sets = unit_samples_to_rate_sets(
+            point, self.rule_names, self.lows, self.highs, self.log_scale
+        )
+        return rate_sets[0]
+
+    def unit_point_from_rates(self, rates):
+        """Return the point of [0, 1]^n corresponding to a rates dict."""
+        values = np.array([rates[name] for name in self.rule_names], dtype=float)
+        if self.log_scale:
+            values = np.log(values)
+        return np.clip((values - self.lows) / (self.highs - self.lows), 0, 1)
+
+    def losses(self, rate_sets):
+        """Return the loss of each rates dict, simulating them in parallel."""
+        observed = {legend: values for legend, (_, values) in self.targets.items()}
+        losses = []
+        for row in self.evaluator.evaluate(rate_sets):
+            simulated = dict((legend, []) for legend in self.targets)
+            for (legend, _), value in zip(self.evaluator.observables, row):
+                simulated[legend].append(value)
+            simulated = {k: np.array(v) for k, v in simulated.items()}
+            losses.append(self.loss(simulated, observed))
+        return np.array(losses)
+
+    def _unit_losses(self, points):
+        return self.losses([self.rates_from_unit_point(p) for p in points])
+
+    def _initial_points(self, initial_rates):
+        if initial_rates is None:
+            return np.zeros((0, len(self.rule_names)))
+        if isinstance(initial_rates, dict):
+            initial_rates = [initial_rates]
+        return np.array([self.unit_point_from_rates(r) for r in initial_rates])
+
+    def _fit_result(self, points, losses, history):
+        best = int(np.argmin(losses))
+        return {
+            "rates": self.rates_from_unit_point(points[best]),
+            "loss": float(losses[best]),
+            "history": history,
+            "population": [self.rates_from_unit_point(p) for p in points],
+        }
+
+    def differential_evolution(
+        self,
+        generations=30,
+        population_size=15,
+        mutation=0.8,
+        crossover=0.7,
+        initial_rates=None,
+    ):
+        """Fit the rates with differential evolution (DE/rand/1/bin).
+
+        Parameters
+        ----------
+
+        generations
+          Number of generations. Each generation evaluates
+          ``population_size`` new candidates, in parallel.
+
+        population_size
+          Number of candidates in the population (at least 4, as each
+          mutant is built from 3 other candidates).
+
+        mutation, crossover
+          Differential weight and crossover probability of the algorithm.
+
+        initial_rates
+          Warm start: a rates dict or a list of rates dicts (for instance the
+          "population" of a previous fit) included in the initial population,
+          the rest of which is random.
+
+        Returns
+        -------
+
+        fit
+          A dict with the best "rates" found, their "loss", the "history" of
+          the best loss at each generation, and the final "population"
+          (usable as ``initial_rates`` to resume the fit).
+        """
+        if population_size < 4:
+            raise ValueError(
+                "Differential evolution requires a population_size of at least "
+                "4, not %s" % population_size
+            )
+        rng = np.random.default_rng(self.seed)
+        n_dimensions = len(self.rule_names)
+        population = rng.random((population_size, n_dimensions))
+        initial_points = self._initial_points(initial_rates)[:population_size]
+        population[: len(initial_points)] = initial_points
+        losses = self._unit_losses(population)
+        history = [float(losses.min())]
+        for _ in range(generations):
+            trials = np.zeros_like(population)
+            for i in range(population_size):
+                others = [j for j in range(population_size) if j != i]
+                a, b, c = population[rng.choice(others, 3, replace=False)]
+                mutant = np.clip(a + mutation * (b - c), 0, 1)
+                crossed = rng.random(n_dimensions) < crossover
+                crossed[rng.integers(n_dimensions)] = True
+                trials[i] = np.where(crossed, mutant, population[i])
+            trial_losses = self._unit_losses(trials)
+            improved = trial_losses <= losses
+            population[improved] = trials[improved]
+            losses[improved] = trial_losses[improved]
+            history.append(float(losses.min()))
+        return self._fit_result(population, losses, history)
+
+    def cma_es(
+        self, generations=30, population_size=None, sigma=0.3, initial_rates=None
+    ):
+        """Fit the rates with the CMA-ES evolution strategy.
+
+        Parameters
+        ----------
+
+        generations
+          Number of generations. Each generation evaluates
+          ``population_size`` candidates, in parallel.
+
+        population_size
+          Number of candidates per generation. Defaults to the standard
+          ``4 + 3 * log(n_rates)``.
+
+        sigma
+          Initial step size, as a fraction of the (log-)range of the bounds.
+
+        initial_rates
+          Warm start: a rates dict (or list of dicts, whose first element is
+          used) to start the search from. Defaults to the center of the
+          bounds.
+
+        Returns
+        -------
+
+        fit
+          A dict with the best "rates" found, their "loss", the "history" of
+          the best loss (starting with the loss of the initial mean) at each
+          generation, and the last "population".
+        """
+        rng = np.random.default_rng(self.seed)
+        n = len(self.rule_names)
+        lam = population_size or 4 + int(3 * np.log(n))
+        mu = lam // 2
+        weights = np.log(mu + 0.5) - np.log(np.arange(1, mu + 1))
+        weights /= weights.sum()
+        mueff = 1.0 / np.sum(weights**2)
+        cc = (4 + mueff / n) / (n + 4 + 2 * mueff / n)
+        cs = (mueff + 2) / (n + mueff + 5)
+        c1 = 2 / ((n + 1.3) ** 2 + mueff)
+        cmu = min(1 - c1, 2 * (mueff - 2 + 1 / mueff) / ((n + 2) ** 2 + mueff))
+        damps = 1 + 2 * max(0, np.sqrt((mueff - 1) / (n + 1)) - 1) + cs
+        chi_n = np.sqrt(n) * (1 - 1.0 / (4 * n) + 1.0 / (21 * n**2))
+
+        initial_points = self._initial_points(initial_rates)
+        mean = initial_points[0] if len(initial_points) else 0.5 * np.ones(n)
+        covariance = np.eye(n)
+        path_c, path_s = np.zeros(n), np.zeros(n)
+        # The starting point is evaluated, so that generations=0 returns it.
+        points = mean.reshape((1, -1))
+        losses = self._unit_losses(points)
+        best_point, best_loss = mean, losses[0]
+        history = [float(best_loss)]
+        for generation in range(generations):
+            eigenvalues, basis = np.linalg.eigh(covariance)
+            scales = np.sqrt(np.maximum(eigenvalues, 1e-20))
+            steps = rng.standard_normal((lam, n)).dot(np.diag(scales)).dot(basis.T)
+            points = np.clip(mean + sigma * steps, 0, 1)
+            losses = self._unit_losses(points)
+            order = np.argsort(losses)
+            if losses[order[0]] < best_loss:
+                best_point, best_loss = points[order[0]], losses[order[0]]
+            history.append(float(best_loss))
+            # The steps of the evaluated (clipped) points, so that the mean
+            # and the covariance follow the candidates actually selected.
+            selected_steps = (points[order[:mu]] - mean) / sigma
+            mean_step = weights.dot(selected_steps)
+            mean = mean + sigma * mean_step
+            inverse_sqrt = basis.dot(np.diag(1 / scales)).dot(basis.T)
+            path_s = (1 - cs) * path_s + np.sqrt(cs * (2 - cs) * mueff) * (
+                inverse_sqrt.dot(mean_step)
+            )
+            path_s_norm = np.linalg.norm(path_s)
+            h_sigma = path_s_norm / np.sqrt(
+                1 - (1 - cs) ** (2 * (generation + 1))
+            ) / chi_n < 1.4 + 2.0 / (n + 1)
+            path_c = (1 - cc) * path_c + h_sigma * np.sqrt(
+                cc * (2 - cc) * mueff
+            ) * mean_step
+            covariance = (
+                (1 - c1 - cmu) * covariance
+                + c1
+                * (
+                    np.outer(path_c, path_c)
+                    + (1 - h_sigma) * cc * (2 - cc) * covariance
+                )
+                + cmu * (selected_steps.T * weights).dot(selected_steps)
+            )
+            sigma *= np.exp((cs / damps) * (path_s_norm / chi_n - 1))
+        result = self._fit_result(points, losses, history)
+        result["rates"] = self.rates_from_unit_point(best_point)
+        result["loss"] = float(best_loss)
+        return result
+
+    def fitted_model(self, fit):
+        """Return a copy of the model with the rates of a fit's result."""
+        return model_with_rule_rates(self.model, fit["rates"])
@@ -0,0 +1,76 @@
+import json
+import re
+
+import numpy as np
+
+from .snapshot_inits import complex_nodes_to_kappa, canonical_complex_nodes
+
+CENSUS_SNAPSHOT_TEMPLATE = "census_%d"
+CENSUS_SNAPSHOT_PATTERN = re.compile(r"^census_\d+$")
+
+
+def is_census_snapshot_name(name):
+    """Return True if the name is of the form of the census snapshot names."""
+    return CENSUS_SNAPSHOT_PATTERN.match(str(name)) is not None
+
+
+def census_snapshot_times(census_period, duration):
+    """Return {snapshot_name: time} for the census of a simulation.
+
+    The census are taken every ``census_period``, from ``census_period`` to
+    the duration of the simulation (included).
+    """
+    n_census = int(np.floor(duration / census_period + 1e-9))
+    return {
+        CENSUS_SNAPSHOT_TEMPLATE % i: census_period * i for i in range(1, n_census + 1)
+    }
+
+
+def snapshot_census(snapshot, cache=None):
+    """Summarize a snapshot into histograms of complex sizes and species.
+
+    Parameters
+    ----------
+
+    snapshot
+      A snapshot dict, or its ``snapshot_agents``.
+
+    cache
+      Optional dict in which the species patterns of the complexes are
+      cached, to be shared between the successive census of a simulation,
+      where many complexes are unchanged from one census to the next. Only
+      the patterns of the complexes of the last snapshot are kept. By
+      default, a cache is only used within the snapshot.
+
+    Returns
+    -------
+
+    census
+      A dict with a "complex_sizes" histogram ``{n_agents: n_complexes}`` and
+      a "species" histogram ``{kappa_pattern: n_complexes}`` where the
+      species are the classes of identical complexes of the snapshot, e.g.
+      ``{'A(b[1]), B(b[1])': 120, 'A(b[.])': 80}``. The species patterns
+      are canonical (see ``canonical_complex_nodes``), so the species of
+      different snapshots or engines can be compared.
+    """
+    if isinstance(snapshot, dict):
+        snapshot = snapshot["snapshot_agents"]
+    previous_cache, cache = cache, {}
+    complex_sizes, species = {}, {}
+    for count, nodes in snapshot:
+        complex_sizes[len(nodes)] = complex_sizes.get(len(nodes), 0) + count
+        key = json.dumps(nodes, sort_keys=True)
+        if key not in cache:
+            if (previous_cache is not None) and (key in previous_cache):
+                cache[key] = previous_cache[key]
+            else:
+                cache[key] = complex_nodes_to_kappa(canonical_complex_nodes(nodes))
+        pattern = cache[key]
+        species[pattern] = species.get(pattern, 0) + count
+    if previous_cache is not None:
+        previous_cache.clear()
+        previous_cache.update(cache)
+    return {
+        "complex_sizes": dict(sorted(complex_sizes.items())),
+        "species": species,
+    }
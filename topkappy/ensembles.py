@@ -0,0 +1,228 @@
+import numpy as np
+
+from .executors import SerialExecutor
+from .online_statistics import RunningStatistics, normal_quantile
+from .rate_evaluation import final_values
+from .seeds import spawn_seeds
+
+
+def _models_seed_sequences(models, seed):
+    """Return one SeedSequence per model, to spawn its replicates' seeds.
+
+    Models with their own seed use it as master seed (so that an ensemble
+    of a seeded model is the same as with ``seed=model.seed``), unless a
+    master seed is given.
+    """
+    children = np.random.SeedSequence(seed).spawn(len(models))
+    return [
+        (
+            np.random.SeedSequence(model.seed).spawn(1)[0]
+            if (seed is None) and (model.seed is not None)
+            else child
+        )
+        for model, child in zip(models, children)
+    ]
+
+
+def run_ensemble(model, replicates, executor=None, seed=None):
+    """Run several replicates of a KappaModel and return the list of results.
+
+    Parameters
+    ----------
+
+    model
+      A KappaModel.
+
+    replicates
+      Number of simulations to run.
+
+    executor
+      A topkappy executor (see ``topkappy.executors``) running the
+      simulations, e.g. in parallel. By default, the simulations are run
+      one after the other in the current process.
+
+    seed
+      Master seed from which the replicates' seeds are derived (see
+      ``spawn_seeds``). Defaults to the model's seed if it has one, else to
+      a random seed. Each result records its seed.
+    """
+    return run_sweep([model], replicates=replicates, executor=executor, seed=seed)[0]
+
+
+def run_sweep(models, replicates=1, executor=None, seed=None):
+    """Run replicates of several KappaModels, all through the same executor.
+
+    Returns a list with, for each model, a list of ``replicates`` results.
+    All simulations are submitted at once, so the executor's workers are
+    kept busy over the whole sweep.
+
+    The seeds of the replicates of each model are derived from the master
+    ``seed`` (or from the model's own seed, see ``run_ensemble``), so the
+    whole sweep can be reproduced.
+
+    Examples
+    --------
+
+    >>> models = [make_model(rate=rate) for rate in [0.01, 0.1, 1]]
+    >>> with LocalProcessExecutor() as executor:
+    >>>     results = run_sweep(models, replicates=10, executor=executor)
+    """
+    if executor is None:
+        executor = SerialExecutor()
+    tasks = [
+        model.simulation_task(seed=replicate_seed)
+        for model, seed_sequence in zip(models, _models_seed_sequences(models, seed))
+        for replicate_seed in spawn_seeds(seed_sequence, replicates)
+    ]
+    results = executor.run_tasks(tasks)
+    return [results[i * replicates : (i + 1) * replicates] for i in range(len(models))]
+
+
+def run_adaptive_sweep(
+    models,
+    target_width,
+    observables=None,
+    statistic=final_values,
+    confidence=0.95,
+    min_replicates=5,
+    max_replicates=100,
+    batch_size=10,
+    executor=None,
+    seed=None,
+):
+    """Run replicates of several models until their estimates are precise.
+
+    Rather than running the same number of replicates for every model, the
+    replicates are run in rounds: each round, every model whose confidence
+    interval on one of the observables is still wider than ``target_width``
+    gets up to ``batch_size`` new replicates (estimated from its current
+    variance), and the replicates of all models of the round are submitted
+    at once to the executor. Noisy models thus get more replicates than
+    quiet ones. The means and variances are computed online, so memory use
+    does not depend on the number of replicates.
+
+    Parameters
+    ----------
+
+    models
+      A list of KappaModels.
+
+    target_width
+      Target full width of the confidence interval of the observables'
+      means. Either a number, or a dict ``{observable: width}``.
+
+    observables
+      List of the observables which must reach the target width (default:
+      all observables returned by the statistic).
+
+    statistic
+      Function ``f(plots) -> {observable: value}``. By default, the final
+      value of each plot.
+
+    confidence
+      Confidence level of the intervals.
+
+    min_replicates
+      Replicates run for every model before the first variance estimate.
+
+    max_replicates
+      Budget of replicates per model.
+
+    batch_size
+      Maximal number of new replicates per model and per round.
+
+    executor
+      A topkappy executor (see ``topkappy.executors``).
+
+    seed
+      Master seed of the replicates' seeds, see ``run_sweep``. With a seed,
+      the number of replicates and the estimates are reproducible.
+
+    Returns
+    -------
+
+    summaries
+      For each model, a dict with the "mean", "std" and
+      "confidence_interval_width" of each observable (dicts
+      ``{observable: value}``), the number of "replicates" run, and whether
+      the model "converged" (reached the target width within budget).
+    """
+    if executor is None:
+        executor = SerialExecutor()
+    all_statistics = [RunningStatistics() for _ in models]
+    observable_names = [observables] * len(models)
+    requested = [min(min_replicates, max_replicates)] * len(models)
+    converged = [False] * len(models)
+    seed_sequences = _models_seed_sequences(models, seed)
+    z = normal_quantile(0.5 + confidence / 2)
+    while sum(requested):
+        tasks, task_models = [], []
+        for i, (model, n_replicates) in enumerate(zip(models, requested)):
+            seeds = spawn_seeds(seed_sequences[i], n_replicates)
+            tasks += [model.simulation_task(seed=s) for s in seeds]
+            task_models += n_replicates * [i]
+        for i, result in zip(task_models, executor.run_tasks(tasks)):
+            values = statistic(result["plots"])
+            if observable_names[i] is None:
+                observable_names[i] = list(values)
+            all_statistics[i].add([values[name] for name in observable_names[i]])
+        for i, running_statistics in enumerate(all_statistics):
+            widths = np.atleast_1d(
+                running_statistics.confidence_interval_width(confidence)
+            )
+            targets = np.array(
+                [
+                    (
+                        target_width[name]
+                        if isinstance(target_width, dict)
+                        else target_width
+                    )
+                    for name in observable_names[i]
+                ]
+            )
+            converged[i] = bool(np.all(widths <= targets))
+            budget = max_replicates - running_statistics.count
+            if converged[i] or budget <= 0:
+                requested[i] = 0
+                continue
+            # Replicates needed so that 2 * z * std / sqrt(n) <= target.
+            stds = np.atleast_1d(running_statistics.std)
+            needed = np.max((2 * z * stds / targets) ** 2) - running_statistics.count
+            requested[i] = int(min(batch_size, budget, max(1, np.ceil(needed))))
+    summaries = []
+    for names, running_statistics, model_converged in zip(
+        observable_names, all_statistics, converged
+    ):
+        stats = [
+            running_statistics.mean,
+            running_statistics.std,
+            running_statistics.confidence_interval_width(confidence),
+        ]
+        summary = {
+            key: dict(zip(names, np.atleast_1d(values).tolist()))
+            for key, values in zip(["mean", "std", "confidence_interval_width"], stats)
+        }
+        summary["replicates"] = running_statistics.count
+        summary["converged"] = model_converged
+        summaries.append(summary)
+    return summaries
+
+
+def run_adaptive_ensemble(model, target_width, **parameters):
+    """Run replicates of a model until its observables' means are precise.
+
+    This is ``run_adaptive_sweep`` for a single model, see its documentation
+    for the parameters. Returns a dict with the "mean", "std" and
+    "confidence_interval_width" of each observable, the number of
+    "replicates" run, and whether the target width was reached
+    ("converged").
+
+    Examples
+    --------
+
+    >>> summary = run_adaptive_ensemble(
+    >>>     model, target_width=5, max_replicates=200, executor=executor
+    >>> )
+    >>> summary["mean"]["|A(b[.])|"], summary["replicates"]
+    """
+    return run_adaptive_sweep([model], target_width, **parameters)[0]
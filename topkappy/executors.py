@@ -0,0 +1,364 @@
+"""Executors to run many simulations in other threads, processes or machines.
+
+All executors implement ``map(function, tasks)`` (results are returned in the
+order of the tasks) and ``run_tasks(tasks)`` which runs SimulationTasks (see
+``KappaModel.simulation_task()``) with a warm Kappa client per worker.
+
+Examples
+--------
+
+>>> with LocalProcessExecutor(n_workers=4) as executor:
+>>>     results = run_ensemble(model, replicates=100, executor=executor)
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+import multiprocessing.connection
+import pickle
+import queue
+import threading
+import zlib
+
+from .simulation_tasks import run_warm_simulation_task
+
+
+def compress_object(obj):
+    """Pickle and zlib-compress any object, for transfer between workers."""
+    return zlib.compress(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL), 1)
+
+
+def decompress_object(data):
+    """Reverse of ``compress_object``."""
+    return pickle.loads(zlib.decompress(data))
+
+
+class SimulationExecutor:
+    """Base class of all executors. Runs the tasks serially, in this thread.
+
+    Subclasses only need to override ``map``.
+    """
+
+    def map(self, function, tasks):
+        """Return the list [function(task) for task in tasks]."""
+        return [function(task) for task in tasks]
+
+    def run_tasks(self, tasks):
+        """Run a list of SimulationTask and return the list of results."""
+        return self.map(run_warm_simulation_task, tasks)
+
+    def close(self):
+        """Release the resources (processes, connections) of the executor."""
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+SerialExecutor = SimulationExecutor
+
+
+class FuturesExecutor(SimulationExecutor):
+    """Executor running the tasks through any concurrent.futures executor.
+
+    Parameters
+    ----------
+
+    futures_executor
+      A ``concurrent.futures.Executor`` instance, e.g. a ThreadPoolExecutor
+      or a ProcessPoolExecutor.
+    """
+
+    def __init__(self, futures_executor):
+        self.futures_executor = futures_executor
+
+    def map(self, function, tasks):
+        return list(self.futures_executor.map(function, tasks))
+
+    def close(self):
+        self.futures_executor.shutdown()
+
+
+class LocalThreadExecutor(FuturesExecutor):
+    """Executor running the tasks in a pool of threads of this process.
+
+    Kappa simulations run in KaSim subprocesses, so threads mostly wait for
+    them and several simulations overlap without the cost of starting and
+    feeding worker processes. Each thread runs its tasks with its own warm
+    Kappa client (see ``get_warm_kappa_client``), and tasks are independent
+    snapshots of their models (see ``KappaModel.simulation_task``), so the
+    results of concurrent runs never mix.
+
+    Note that the in-process engines ('ode', 'gillespie', 'tau_leaping')
+    hold the GIL and don't run faster in threads.
+
+    Parameters
+    ----------
+
+    n_workers
+      Number of threads (defaults to the number of CPUs, plus 4).
+    """
+
+    def __init__(self, n_workers=None):
+        FuturesExecutor.__init__(self, ThreadPoolExecutor(n_workers))
+
+
+class LocalProcessExecutor(SimulationExecutor):
+    """Executor running the tasks in a local pool of worker processes.
+
+    Parameters
+    ----------
+
+    n_workers
+      Number of worker processes (defaults to the number of CPUs).
+    """
+
+    def __init__(self, n_workers=None):
+        self.pool = multiprocessing.Pool(n_workers)
+
+    def map(self, function, tasks):
+        return self.pool.map(function, tasks, chunksize=1)
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+
+def _serve_connection(connection, stop_event):
+    """Answer the requests of one connection, until it closes or asks to stop."""
+    with connection:
+        while True:
+            try:
+                request = decompress_object(connection.recv_bytes())
+            except (EOFError, OSError):
+                return
+            if request is None:
+                stop_event.set()
+                return
+            function, task = request
+            try:
+                answer = (True, function(task))
+            except Exception as error:
+                answer = (False, error)
+            try:
+                connection.send_bytes(compress_object(answer))
+            except OSError:
+                return
+
+
+def _accept_connections(listener, stop_event):
+    """Serve each new connection of the listener in its own thread."""
+    while not stop_event.is_set():
+        try:
+            connection = listener.accept()
+        except (OSError, multiprocessing.AuthenticationError):
+            if stop_event.is_set():
+                return  # The listener was closed.
+            continue
+        threading.Thread(
+            target=_serve_connection, args=(connection, stop_event), daemon=True
+        ).start()
+
+
+def run_worker_server(address, authkey, ready_connection=None):
+    """Serve tasks sent by WorkerServerExecutors until asked to stop.
+
+    Each request is a compressed ``(function, task)`` pair, and the answer is
+    a compressed ``(success, result_or_exception)`` pair. Functions are sent
+    by reference, so they must be importable on the worker. Each connection
+    (e.g. each executor) is served in its own thread, whose simulation tasks
+    all reuse the same warm Kappa client. A ``None`` request, sent on any
+    connection (see ``LocalWorkers.stop``), stops the server.
+
+    Parameters
+    ----------
+
+    address
+      A (host, port) pair. Use port 0 to pick any free port.
+
+    authkey
+      Bytes string, shared secret between the worker and the executors.
+
+    ready_connection
+      If provided, the actual address of the server is sent through this
+      multiprocessing connection once the server is listening.
+    """
+    stop_event = threading.Event()
+    with multiprocessing.connection.Listener(address, authkey=authkey) as listener:
+        if ready_connection is not None:
+            ready_connection.send(listener.address)
+            ready_connection.close()
+        threading.Thread(
+            target=_accept_connections, args=(listener, stop_event), daemon=True
+        ).start()
+        stop_event.wait()
+
+
+class WorkerServerExecutor(SimulationExecutor):
+    """Executor sending the tasks to worker servers over sockets.
+
+    The worker servers (see ``run_worker_server``) can run on remote nodes.
+    One connection is kept open per worker, and each worker is sent a new
+    task as soon as it returns the result of the previous one.
+
+    If a worker disconnects (e.g. it crashed), it is not used anymore and
+    the task it was running is sent to another worker, up to
+    ``max_task_retries`` times, after which ``map`` raises a
+    ConnectionError.
+
+    Parameters
+    ----------
+
+    addresses
+      List of (host, port) addresses of the worker servers.
+
+    authkey
+      Bytes string, shared secret between the worker and the executors.
+
+    max_task_retries
+      Number of times a task is sent to another worker after its worker
+      disconnected.
+    """
+
+    def __init__(self, addresses, authkey, max_task_retries=1):
+        self.connections = [
+            multiprocessing.connection.Client(address, authkey=authkey)
+            for address in addresses
+        ]
+        self.max_task_retries = max_task_retries
+
+    def _feed_worker(self, connection, function, tasks_queue, finish_task, attempts):
+        while True:
+            index_and_task = tasks_queue.get()
+            if index_and_task is None:
+                return  # All tasks are finished.
+            index, task = index_and_task
+            try:
+                connection.send_bytes(compress_object((function, task)))
+                answer = decompress_object(connection.recv_bytes())
+            except (EOFError, OSError):
+                # The worker is gone: retire it, and retry the task elsewhere.
+                self.connections.remove(connection)
+                attempts[index] += 1
+                if attempts[index] > self.max_task_retries:
+                    error = ConnectionError(
+                        "Task %d failed on %d workers which disconnected "
+                        "while running it" % (index, attempts[index])
+                    )
+                    finish_task(index, (False, error))
+                else:
+                    tasks_queue.put((index, task))
+                return
+            finish_task(index, answer)
+
+    def map(self, function, tasks):
+        tasks_queue = queue.Queue()
+        for index_and_task in enumerate(tasks):
+            tasks_queue.put(index_and_task)
+        results = [None] * tasks_queue.qsize()
+        attempts = [0] * len(results)
+        n_unfinished, lock = [len(results)], threading.Lock()
+        threads = []
+
+        def finish_task(index, result):
+            results[index] = result
+            with lock:
+                n_unfinished[0] -= 1
+                if n_unfinished[0] == 0:
+                    # One stop sentinel per feeding thread.
+                    for _ in threads:
+                        tasks_queue.put(None)
+
+        threads.extend(
+            threading.Thread(
+                target=self._feed_worker,
+                args=(connection, function, tasks_queue, finish_task, attempts),
+            )
+            for connection in list(self.connections)
+        )
+        if not len(results):
+            for _ in threads:
+                tasks_queue.put(None)
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if any(result is None for result in results):
+            raise ConnectionError(
+                "%d tasks could not be run: all workers disconnected"
+                % len([result for result in results if result is None])
+            )
+        for success, result in results:
+            if not success:
+                raise result
+        return [result for success, result in results]
+
+    def close(self):
+        for connection in self.connections:
+            connection.close()
+
+
+class LocalWorkers:
+    """Start worker servers on this machine, standing in for remote nodes.
+
+    Examples
+    --------
+
+    >>> with LocalWorkers(n_workers=4) as workers:
+    >>>     with workers.executor() as executor:
+    >>>         results = run_ensemble(model, 100, executor=executor)
+
+    Parameters
+    ----------
+
+    n_workers
+      Number of worker server processes to start.
+
+    authkey
+      Bytes string, shared secret between the worker and the executors.
+
+    host
+      Network interface on which the workers listen.
+    """
+
+    def __init__(self, n_workers=2, authkey=b"topkappy", host="localhost"):
+        self.authkey = authkey
+        self.processes, self.addresses = [], []
+        for _ in range(n_workers):
+            parent_connection, child_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=run_worker_server,
+                args=((host, 0), authkey, child_connection),
+                daemon=True,
+            )
+            process.start()
+            self.processes.append(process)
+            self.addresses.append(parent_connection.recv())
+
+    def executor(self):
+        """Return a WorkerServerExecutor connected to all the workers."""
+        return WorkerServerExecutor(self.addresses, self.authkey)
+
+    def stop(self):
+        """Ask all workers to stop and wait for them to terminate."""
+        for address in self.addresses:
+            try:
+                connection = multiprocessing.connection.Client(
+                    address, authkey=self.authkey
+                )
+            except OSError:
+                continue  # This worker already stopped (e.g. crashed).
+            # The stop request is served on its own connection, even while
+            # executors are still connected. Close it before waiting.
+            with connection:
+                connection.send_bytes(compress_object(None))
+        for process in self.processes:
+            process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
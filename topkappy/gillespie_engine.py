@@ -0,0 +1,332 @@
+import time
+
+import networkx as nx
+import numpy as np
+
+from .reaction_networks import ReactionNetwork, model_plot_times
+from .plot_points import select_plot_points
+from .census import snapshot_census
+
+
+class _IndexedPool:
+    """Set of elements with O(1) addition, removal and random sampling."""
+
+    def __init__(self):
+        self.elements = []
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.elements)
+
+    def add(self, element):
+        self.positions[element] = len(self.elements)
+        self.elements.append(element)
+
+    def remove(self, element):
+        position = self.positions.pop(element)
+        last = self.elements.pop()
+        if position < len(self.elements):
+            self.elements[position] = last
+            self.positions[last] = position
+
+    def sample(self, rng):
+        return self.elements[rng.integers(len(self.elements))]
+
+    def sample_pair(self, rng):
+        i, j = rng.choice(len(self.elements), size=2, replace=False)
+        return self.elements[i], self.elements[j]
+
+
+class GillespieSimulation:
+    """Agent-level exact stochastic simulation of a simple KappaModel.
+
+    Each agent and bond is represented explicitly, so that snapshots of the
+    complexes can be produced, and the rules are fired with Gillespie's
+    direct method, with the propensities of the model's ReactionNetwork
+    (see ``ReactionNetwork`` for the rules and plots supported).
+
+    Use ``simulate_gillespie`` or ``KappaModel(engine='gillespie')`` rather
+    than this class directly.
+
+    Parameters
+    ----------
+
+    model
+      A KappaModel.
+
+    seed
+      Seed of the random number generator (None for a random seed).
+    """
+
+    def __init__(self, model, seed=None):
+        self.model = model
+        self.network = network = ReactionNetwork(model)
+        self.rng = np.random.default_rng(seed)
+        self.sites = dict(network.sites)
+        self.pools = [_IndexedPool() for _ in network.species]
+        self.agent_types, self.agent_links = [], []
+        for agent, quantity in model.initial_quantities.items():
+            agent = getattr(agent, "name", agent)
+            for _ in range(quantity):
+                self._new_agent(agent, self.sites[agent])
+        if model.initial_snapshot is not None:
+            self._add_snapshot_agents(model.initial_snapshot)
+        self.counts = np.array([len(pool) for pool in self.pools], dtype=float)
+        self.n_events = 0
+
+    def _free_pool(self, agent_type, site):
+        return self.pools[self.network.species_indices[("free", agent_type, site)]]
+
+    def _bond_pool(self, end1, end2):
+        key = self.network._bond_key(end1, end2)
+        return self.pools[self.network.species_indices[key]]
+
+    def _new_agent(self, agent_type, sites):
+        agent = len(self.agent_types)
+        self.agent_types.append(agent_type)
+        self.agent_links.append({})
+        for site in sites:
+            self._free_pool(agent_type, site).add((agent, site))
+        return agent
+
+    def _add_snapshot_agents(self, snapshot):
+        if isinstance(snapshot, dict):
+            snapshot = snapshot["snapshot_agents"]
+        for count, nodes in snapshot:
+            for _ in range(count):
+                agents = [self._new_agent(node["node_type"], ()) for node in nodes]
+                for agent, node in zip(agents, nodes):
+                    site_names = [s["site_name"] for s in node["node_sites"]]
+                    self.sites.setdefault(node["node_type"], site_names)
+                    for site in node["node_sites"]:
+                        site_type, site_data = site["site_type"]
+                        links = site_data["port_links"] if site_type == "port" else []
+                        if len(links) == 0:
+                            self._free_pool(node["node_type"], site["site_name"]).add(
+                                (agent, site["site_name"])
+                            )
+                            continue
+                        k, l = links[0]
+                        partner = agents[k]
+                        partner_site = nodes[k]["node_sites"][l]["site_name"]
+                        self.agent_links[agent][site["site_name"]] = (
+                            partner,
+                            partner_site,
+                        )
+                        if (agent, site["site_name"]) < (partner, partner_site):
+                            self._add_bond(
+                                agent, site["site_name"], partner, partner_site
+                            )
+
+    def _add_bond(self, agent1, site1, agent2, site2):
+        end1 = (self.agent_types[agent1], site1)
+        end2 = (self.agent_types[agent2], site2)
+        if end1 > end2:
+            agent1, site1, agent2, site2 = agent2, site2, agent1, site1
+        self._bond_pool(end1, end2).add((agent1, site1, agent2, site2))
+
+    def _fire(self, reaction):
+        """Fire a reaction. Return False if the event was a null event."""
+        reactants, products, _, symmetric = self.network.reactions[reaction]
+        if len(reactants) == 2:
+            # Binding
+            pool1, pool2 = [self.pools[i] for i in reactants]
+            if symmetric:
+                (agent1, site1), (agent2, site2) = pool1.sample_pair(self.rng)
+            else:
+                agent1, site1 = pool1.sample(self.rng)
+                agent2, site2 = pool2.sample(self.rng)
+                if agent1 == agent2:
+                    return False
+            pool1.remove((agent1, site1))
+            pool2.remove((agent2, site2))
+            self.agent_links[agent1][site1] = (agent2, site2)
+            self.agent_links[agent2][site2] = (agent1, site1)
+            self._add_bond(agent1, site1, agent2, site2)
+        else:
+            # Unbinding
+            bond_pool = self.pools[reactants[0]]
+            bond = agent1, site1, agent2, site2 = bond_pool.sample(self.rng)
+            bond_pool.remove(bond)
+            del self.agent_links[agent1][site1]
+            del self.agent_links[agent2][site2]
+            self.pools[products[0]].add((agent1, site1))
+            self.pools[products[1]].add((agent2, site2))
+        self.counts += self.network.stoichiometry[:, reaction]
+        return True
+
+    def _complex_nodes(self, agents):
+        """Return the kappy-style nodes of a complex (list of agents)."""
+        node_indices = {agent: i for i, agent in enumerate(agents)}
+        nodes = []
+        for agent in agents:
+            sites = self.sites[self.agent_types[agent]]
+            node_sites = []
+            for site in sites:
+                links = []
+                if site in self.agent_links[agent]:
+                    partner, partner_site = self.agent_links[agent][site]
+                    partner_sites = self.sites[self.agent_types[partner]]
+                    links = [[node_indices[partner], partner_sites.index(partner_site)]]
+                port = {"port_links": links, "port_states": []}
+                node_sites.append({"site_name": site, "site_type": ["port", port]})
+            nodes.append(
+                {"node_type": self.agent_types[agent], "node_sites": node_sites}
+            )
+        return nodes
+
+    def _complexes_graph(self):
+        graph = nx.Graph()
+        for agent, links in enumerate(self.agent_links):
+            graph.add_node(agent)
+            for partner, _ in links.values():
+                graph.add_edge(agent, partner)
+        return graph
+
+    def snapshot(self, name):
+        """Return a kappy-like snapshot of the current complexes."""
+        classes = {}  # {hash: [[count, site_graph, agents], ...]}
+        for component in nx.connected_components(self._complexes_graph()):
+            agents = sorted(component)
+            site_graph = nx.Graph()
+            for agent in agents:
+                site_graph.add_node(agent, label=self.agent_types[agent])
+                for site in self.sites[self.agent_types[agent]]:
+                    site_graph.add_node((agent, site), label=site)
+                    site_graph.add_edge(agent, (agent, site))
+                for site, (partner, partner_site) in self.agent_links[agent].items():
+                    site_graph.add_edge((agent, site), (partner, partner_site))
+            graph_hash = nx.weisfeiler_lehman_graph_hash(site_graph, node_attr="label")
+            same_hash_classes = classes.setdefault(graph_hash, [])
+            for complex_class in same_hash_classes:
+                if nx.is_isomorphic(
+                    complex_class[1],
+                    site_graph,
+                    node_match=lambda n1, n2: n1["label"] == n2["label"],
+                ):
+                    complex_class[0] += 1
+                    break
+            else:
+                same_hash_classes.append([1, site_graph, agents])
+        snapshot_agents = [
+            [count, self._complex_nodes(agents)]
+            for same_hash_classes in classes.values()
+            for count, _, agents in same_hash_classes
+        ]
+        return {
+            "snapshot_file": name,
+            "snapshot_event": self.n_events,
+            "snapshot_agents": snapshot_agents,
+            "snapshot_tokens": [],
+        }
+
+    def run(self, timeout=None, max_events=None, cancel_event=None):
+        """Run the simulation, return a result dict {plots, snapshots, status}.
+
+        Like in Kappa, the simulation stops early if no rule can be applied
+        anymore, in which case a snapshot named "deadlock" is recorded.
+
+        The simulation is also interrupted after ``timeout`` seconds,
+        ``max_events`` events, or when the cancel_event (threading.Event) is
+        set, in which case the result has the plots recorded so far and a
+        status 'timeout', 'max_events' or 'cancelled' (else 'completed').
+        """
+        model, network = self.model, self.network
+        plot_times = model_plot_times(model)
+        duration = model.duration
+        checkpoints = sorted(
+            [(t, "plot", None) for t in plot_times]
+            + [(t, "snapshot", sid) for sid, t in model.snapshot_times.items()]
+            + [(t, "census", sid) for sid, t in model.census_snapshot_times.items()],
+            key=lambda checkpoint: checkpoint[0],
+        )
+        checkpoints = [c for c in checkpoints if c[0] <= duration]
+        recorded_times, recorded_states, snapshots, census = [], [], {}, []
+        census_cache = {}
+        t, next_checkpoint = 0.0, 0
+        start_time, status = time.time(), "completed"
+
+        def record_checkpoints_until(end_time, include_end=False):
+            checkpoint_index = next_checkpoint
+            while checkpoint_index < len(checkpoints):
+                checkpoint_time, kind, sid = checkpoints[checkpoint_index]
+                if (checkpoint_time > end_time) or (
+                    checkpoint_time == end_time and not include_end
+                ):
+                    break
+                if kind == "plot":
+                    recorded_times.append(checkpoint_time)
+                    recorded_states.append(self.counts.copy())
+                elif kind == "census":
+                    census_data = snapshot_census(self.snapshot(sid), census_cache)
+                    census.append(dict(time=checkpoint_time, **census_data))
+                else:
+                    snapshots[sid] = self.snapshot(sid)
+                checkpoint_index += 1
+            return checkpoint_index
+
+        while True:
+            if (max_events is not None) and (self.n_events >= max_events):
+                status = "max_events"
+                break
+            if self.n_events % 1000 == 0:
+                if (cancel_event is not None) and cancel_event.is_set():
+                    status = "cancelled"
+                    break
+                if (timeout is not None) and (time.time() - start_time > timeout):
+                    status = "timeout"
+                    break
+            propensities = network.propensities(self.counts, stochastic=True)
+            total = propensities.sum()
+            if total <= 0:
+                next_checkpoint = record_checkpoints_until(t, include_end=True)
+                if next_checkpoint < len(checkpoints):
+                    snapshots["deadlock"] = self.snapshot("deadlock")
+                break
+            t_next = t + self.rng.exponential(1.0 / total)
+            next_checkpoint = record_checkpoints_until(min(t_next, duration), True)
+            if t_next > duration:
+                break
+            cumulated = np.cumsum(propensities)
+            reaction = np.searchsorted(cumulated, self.rng.random() * total, "right")
+            reaction = min(reaction, len(propensities) - 1)
+            if self._fire(reaction):
+                self.n_events += 1
+            t = t_next
+
+        states = np.array(recorded_states).T.reshape((len(network.species), -1))
+        plots = network.plots_dict(recorded_times, states)
+        plots = select_plot_points(plots, model.plot_points, model.plot_time_step)
+        result = {"plots": plots, "snapshots": snapshots, "status": status}
+        if model.census_period is not None:
+            result["census"] = census
+        return result
+
+
+def simulate_gillespie(
+    model, seed=None, timeout=None, max_events=None, cancel_event=None
+):
+    """Simulate a simple KappaModel in-process with an exact stochastic method.
+
+    This engine needs no Kappa binaries and no subprocess, which makes it
+    much faster than Kappa for tiny simulations (and unit tests). It only
+    supports simple binding/unbinding rules and plots (see
+    ``ReactionNetwork``), and returns results with the same structure as
+    ``KappaModel.get_simulation_results()``, including snapshots.
+
+    Parameters
+    ----------
+
+    model
+      A KappaModel.
+
+    seed
+      Seed of the random number generator (None for a random seed).
+
+    timeout, max_events, cancel_event
+      Limits interrupting the simulation, see ``GillespieSimulation.run``.
+    """
+    simulation = GillespieSimulation(model, seed=seed)
+    return simulation.run(
+        timeout=timeout, max_events=max_events, cancel_event=cancel_event
+    )
@@ -0,0 +1,286 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class _Grid:
+    """Bucketing of 2D points in a grid of square cells, for neighbor queries."""
+
+    def __init__(self, positions, cell_size):
+        cells = np.floor(positions / cell_size).astype(np.int64)
+        cells -= cells.min(axis=0)
+        self.n_rows = cells[:, 1].max() + 3
+        self.keys = cells[:, 0] * self.n_rows + cells[:, 1]
+        self.order = np.argsort(self.keys, kind="stable")
+        self.sorted_keys = self.keys[self.order]
+
+    def neighbor_pairs(self, nodes_slice):
+        """Return the pairs (i, j) with i in the slice and j in a nearby cell.
+
+        Each point i is paired with all points of the 3x3 cells around its
+        own, except itself, with vectorized NumPy operations only.
+        """
+        keys = self.keys[nodes_slice]
+        all_i, all_j = [], []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                neighbor_keys = keys + dx * self.n_rows + dy
+                starts = np.searchsorted(self.sorted_keys, neighbor_keys, "left")
+                ends = np.searchsorted(self.sorted_keys, neighbor_keys, "right")
+                lengths = ends - starts
+                total = lengths.sum()
+                # Indices starts[i], starts[i] + 1, ..., ends[i] - 1 for each i.
+                offsets = np.arange(total) - np.repeat(
+                    np.cumsum(lengths) - lengths, lengths
+                )
+                all_i.append(
+                    np.repeat(np.arange(nodes_slice.start, nodes_slice.stop), lengths)
+                )
+                all_j.append(self.order[np.repeat(starts, lengths) + offsets])
+        i, j = np.concatenate(all_i), np.concatenate(all_j)
+        different = i != j
+        return i[different], j[different]
+
+
+def _repulsion(positions, grid, nodes_slice, k):
+    """Compute the repulsive displacement of the nodes of a slice.
+
+    Like in the grid variant of Fruchterman-Reingold, nodes only repel the
+    nodes closer than 2k.
+    """
+    i, j = grid.neighbor_pairs(nodes_slice)
+    delta = positions[i] - positions[j]
+    distance = np.maximum(np.sqrt((delta**2).sum(axis=1)), 1e-9)
+    within = distance < 2 * k
+    force = (k**2 / distance**2)[within].reshape((-1, 1)) * delta[within]
+    n_slice = nodes_slice.stop - nodes_slice.start
+    displacement = np.zeros((n_slice, 2))
+    for dimension in (0, 1):
+        displacement[:, dimension] = np.bincount(
+            i[within] - nodes_slice.start, force[:, dimension], minlength=n_slice
+        )
+    return displacement
+
+
+def grid_force_directed_layout(
+    graph,
+    positions=None,
+    iterations=50,
+    seed=123,
+    temperature=None,
+    n_threads=1,
+):
+    """Compute a force-directed layout of a large graph, in near-linear time.
+
+    This is the grid variant of the Fruchterman-Reingold algorithm: the
+    repulsive forces are only computed between nodes in neighbouring cells
+    of a grid (with cells twice the ideal edge length), rather than between
+    all pairs of nodes, which makes each iteration O(n) instead of O(n²)
+    for graphs like complexes, whose nodes are evenly spread. All forces are
+    computed with vectorized NumPy operations, and the repulsions can be
+    split between several threads.
+
+    Parameters
+    ----------
+
+    graph
+      A networkx graph.
+
+    positions
+      A dict {node: (x, y)} of initial positions, e.g. a previous layout of
+      the same complex (warm start). Nodes without a position are placed at
+      the barycenter of their positioned neighbours (or randomly), and the
+      layout starts with a lower temperature so it only refines the
+      positions.
+
+    iterations
+      Number of iterations of the algorithm.
+
+    seed
+      Seed for the random initial positions.
+
+    temperature
+      Maximal displacement of the nodes at the first iteration, as a
+      fraction of the layout's width. Defaults to 0.1, or 0.02 for warm
+      starts. The temperature decreases linearly to 0.
+
+    n_threads
+      Number of threads computing the repulsive forces.
+
+    Returns
+    -------
+
+    positions
+      A dict {node: np.array([x, y])} with coordinates in [-1, 1] (like the
+      networkx layouts).
+    """
+    nodes = list(graph.nodes())
+    n_nodes = len(nodes)
+    if n_nodes == 0:
+        return {}
+    indices = {node: i for i, node in enumerate(nodes)}
+    edges = np.array(
+        [[indices[u], indices[v]] for u, v in graph.edges() if u != v], dtype=int
+    ).reshape((-1, 2))
+    rng = np.random.default_rng(seed)
+    xy = rng.random((n_nodes, 2))
+    warm_start = positions is not None and len(positions) > 0
+    if warm_start:
+        known = [indices[node] for node in positions if node in indices]
+        known_xy = np.array([positions[nodes[i]] for i in known], dtype=float)
+        extent = np.maximum(known_xy.max(axis=0) - known_xy.min(axis=0), 1e-9)
+        xy[known] = (known_xy - known_xy.min(axis=0)) / extent.max()
+        known = set(known)
+        for node in nodes:
+            i = indices[node]
+            if i in known:
+                continue
+            neighbors = [indices[n] for n in graph.neighbors(node)]
+            neighbors = [n for n in neighbors if n in known]
+            if len(neighbors):
+                xy[i] = xy[neighbors].mean(axis=0) + 0.01 * rng.standard_normal(2)
+    if temperature is None:
+        temperature = 0.02 if warm_start else 0.1
+    k = np.sqrt(1.0 / n_nodes)
+    slices = [
+        slice(start, min(start + int(np.ceil(n_nodes / n_threads)), n_nodes))
+        for start in range(0, n_nodes, int(np.ceil(n_nodes / n_threads)))
+    ]
+    pool = ThreadPoolExecutor(n_threads) if n_threads > 1 else None
+    try:
+        for iteration in range(iterations):
+            width = np.ptp(xy, axis=0).max() or 1.0
+            scaled_k = k * width
+            grid = _Grid(xy, 2 * scaled_k)
+            if pool is None:
+                displacement = _repulsion(xy, grid, slices[0], scaled_k)
+            else:
+                parts = pool.map(lambda s: _repulsion(xy, grid, s, scaled_k), slices)
+                displacement = np.vstack(list(parts))
+            if len(edges):
+                delta = xy[edges[:, 0]] - xy[edges[:, 1]]
+                distance = np.sqrt((delta**2).sum(axis=1)).reshape((-1, 1))
+                attraction = delta * distance / scaled_k
+                for dimension in (0, 1):
+                    displacement[:, dimension] -= np.bincount(
+                        edges[:, 0], attraction[:, dimension], minlength=n_nodes
+                    )
+                    displacement[:, dimension] += np.bincount(
+                        edges[:, 1], attraction[:, dimension], minlength=n_nodes
+                    )
+            length = np.maximum(np.sqrt((displacement**2).sum(axis=1)), 1e-9)
+            step = temperature * width * (1 - 1.0 * iteration / iterations)
+            xy += displacement * (np.minimum(length, step) / length).reshape((-1, 1))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    xy -= xy.mean(axis=0)
+    xy /= np.abs(xy).max() or 1.0
+    return {node: xy[i] for node, i in indices.items()}
+
+
+def _padded_size(n_nodes, multiple=8):
+    return multiple * int(np.ceil(1.0 * n_nodes / multiple))
+
+
+# Each (graphs, nodes, nodes) float32 array of the batched layouts takes
+# 4 bytes per element, and about 10 such arrays are alive at once.
+BATCH_LAYOUT_BYTES_PER_PAIR = 40
+
+
+def _batch_layout_group(graphs, size, rng, iterations):
+    """Lay out graphs of at most ``size`` nodes together, see below."""
+    n_graphs = len(graphs)
+    valid = np.zeros((n_graphs, size), dtype=bool)
+    adjacency = np.zeros((n_graphs, size, size), dtype=np.float32)
+    all_nodes = []
+    for g, graph in enumerate(graphs):
+        nodes = list(graph)
+        node_indices = {node: i for i, node in enumerate(nodes)}
+        valid[g, : len(nodes)] = True
+        for u, v in graph.edges():
+            i, j = node_indices[u], node_indices[v]
+            if i != j:
+                adjacency[g, i, j] = adjacency[g, j, i] = 1
+        all_nodes.append(nodes)
+    pairs = (valid[:, :, None] & valid[:, None, :]).astype(np.float32)
+    n_nodes = np.maximum(valid.sum(axis=1), 1).reshape((-1, 1, 1))
+    k = np.sqrt(1.0 / n_nodes).astype(np.float32)
+    # Repulsion and attraction coefficients, zero for padding nodes.
+    repulsion, attraction = k**2 * pairs, adjacency / k
+    del pairs, adjacency
+    x, y = rng.random((2, n_graphs, size)).astype(np.float32)
+    for iteration in range(iterations):
+        dx = x[:, :, None] - x[:, None, :]
+        dy = y[:, :, None] - y[:, None, :]
+        distance = np.maximum(np.sqrt(dx * dx + dy * dy), 0.01)
+        force = repulsion / (distance * distance) - attraction * distance
+        del distance
+        displacement_x = (dx * force).sum(axis=2)
+        displacement_y = (dy * force).sum(axis=2)
+        del dx, dy, force
+        length = np.sqrt(displacement_x**2 + displacement_y**2)
+        length = np.maximum(length, 0.01)
+        step = 0.1 * (1 - 1.0 * iteration / iterations)
+        factor = np.minimum(length, step) / length
+        x += displacement_x * factor
+        y += displacement_y * factor
+    xy = np.stack([x, y], axis=2).astype(float)
+    positions_list = []
+    for g, nodes in enumerate(all_nodes):
+        graph_xy = xy[g, : len(nodes)]
+        graph_xy = graph_xy - graph_xy.mean(axis=0)
+        graph_xy /= np.abs(graph_xy).max() or 1.0
+        positions_list.append({node: graph_xy[i] for i, node in enumerate(nodes)})
+    return positions_list
+
+
+def batch_force_directed_layouts(graphs, iterations=50, seed=123, max_memory=256):
+    """Compute Fruchterman-Reingold layouts of many small graphs at once.
+
+    The graphs are grouped by size (padded to the next multiple of 8), and the
+    layouts of each group are computed together, with all-pairs forces on
+    arrays of shape (graphs, nodes, nodes). This makes the layout of
+    thousands of small complexes (e.g. for a snapshot report) much faster
+    than one networkx layout per complex. Large groups are split in batches
+    so that the arrays stay under ``max_memory``. For graphs of more than a
+    few hundred nodes, use ``grid_force_directed_layout``.
+
+    Parameters
+    ----------
+
+    graphs
+      A list of networkx graphs.
+
+    iterations
+      Number of iterations of the algorithm.
+
+    seed
+      Seed for the random initial positions.
+
+    max_memory
+      Approximate memory budget of the computations, in megabytes.
+
+    Returns
+    -------
+
+    positions_list
+      A list of dicts {node: np.array([x, y])}, one per graph, with
+      coordinates in [-1, 1].
+    """
+    rng = np.random.default_rng(seed)
+    groups = {}
+    for index, graph in enumerate(graphs):
+        groups.setdefault(_padded_size(len(graph)), []).append(index)
+    positions_list = [{} for _ in graphs]
+    for size, group in groups.items():
+        bytes_per_graph = BATCH_LAYOUT_BYTES_PER_PAIR * size * size
+        batch_size = max(1, int(max_memory * 2**20 // bytes_per_graph))
+        for start in range(0, len(group), batch_size):
+            batch = group[start : start + batch_size]
+            batch_positions = _batch_layout_group(
+                [graphs[index] for index in batch], size, rng, iterations
+            )
+            for index, positions in zip(batch, batch_positions):
+                positions_list[index] = positions
+    return positions_list
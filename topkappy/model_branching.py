@@ -0,0 +1,205 @@
+from .executors import SerialExecutor
+from .plot_points import select_plot_points
+
+# Engines returning snapshots, from which a second phase can restart.
+BRANCHING_ENGINES = ("kappa", "gillespie")
+
+MODEL_SECTIONS = {
+    "agents": "_kappa_script_for_agents_declarations",
+    "rules": "_kappa_script_for_rules",
+    "initial_quantities": "_kappa_script_for_initial_quantities",
+    "snapshots": "_kappa_script_for_snapshots",
+    "plots": "_kappa_script_for_plotted",
+}
+
+
+def diff_models(model_a, model_b):
+    """Return the differences between the Kappa scripts of two models.
+
+    The result is a dict ``{section: {'added': [...], 'removed': [...]}}``
+    listing, for each section of the script that differs ('agents',
+    'rules', 'initial_quantities', 'snapshots', 'plots', and 'parameters'
+    for the simulation parameters), the lines of model_b absent from model_a
+    and the lines of model_a absent from model_b. Identical models give {}.
+
+    Examples
+    --------
+
+    >>> diff_models(model, model.copy(rules=new_rules))
+    {'rules': {'added': ["'a.b' A(b[.]),B(b[.]) -> A(b[1]),B(b[1]) @ 0.1"],
+               'removed': ["'a.b' A(b[.]),B(b[.]) -> A(b[1]),B(b[1]) @ 0.01"]}}
+    """
+    diff = {}
+    for section, method_name in MODEL_SECTIONS.items():
+        lines_a = getattr(model_a, method_name)().split("\n")
+        lines_b = getattr(model_b, method_name)().split("\n")
+        added = [line for line in lines_b if line and line not in lines_a]
+        removed = [line for line in lines_a if line and line not in lines_b]
+        if len(added) or len(removed):
+            diff[section] = dict(added=added, removed=removed)
+    parameters_a, parameters_b = [
+        ["plot_period: %s" % m.parameters.plot_period]
+        + ["pause_condition: %s" % m.parameters.pause_condition]
+        for m in (model_a, model_b)
+    ]
+    if parameters_a != parameters_b:
+        diff["parameters"] = dict(
+            added=[p for p in parameters_b if p not in parameters_a],
+            removed=[p for p in parameters_a if p not in parameters_b],
+        )
+    return diff
+
+
+def _can_branch_from(base_model, model):
+    """Return True if the model can reuse the base model's first phase."""
+    if model.duration is None or model.stop_condition is not None:
+        return False
+    if model.engine != base_model.engine or model.census_period is not None:
+        return False
+    diff = diff_models(base_model, model)
+    return not any(
+        section in diff for section in ("agents", "initial_quantities", "plots")
+    ) and (model.plot_time_step == base_model.plot_time_step)
+
+
+def _concatenate_plots(first_plots, second_plots, time_offset):
+    plots = {}
+    for label, series in first_plots.items():
+        continuation = list(second_plots[label])[1:]
+        if label == "[T]":
+            continuation = [t + time_offset for t in continuation]
+        plots[label] = list(series) + continuation
+    return plots
+
+
+def simulate_branches(base_model, models, branch_time, executor=None):
+    """Simulate models sharing the same first phase only once up to branch_time.
+
+    A typical use is a "what-if" study where the models differ from
+    ``base_model`` only by the rules (e.g. a rate) applied after
+    ``branch_time``. The base model is simulated up to ``branch_time``,
+    then each model's simulation restarts from the base's final snapshot
+    (see the ``initial_snapshot`` parameter of KappaModel) for the rest of
+    its duration. The results have the same form as
+    ``KappaModel.get_simulation_results()``, with the plots of the two
+    phases concatenated.
+
+    Models whose agents, initial quantities, plots, plot time step or
+    engine differ from the base (as detected by ``diff_models``), which
+    have no fixed duration, or which take a census (see ``census_period``)
+    are simulated from t=0. The base model's engine must return snapshots
+    ('kappa' or 'gillespie'), and the other models must last longer than
+    ``branch_time``.
+
+    Snapshots of the models are taken in the second phase (times are
+    relative to the start of the simulation), except snapshots before
+    ``branch_time`` which are taken from the base model's first phase.
+    The "seed" of a branched result is the pair of the seeds of its first
+    and second phases.
+
+    Parameters
+    ----------
+
+    base_model
+      The KappaModel simulated in the first phase.
+
+    models
+      List of KappaModel to simulate.
+
+    branch_time
+      Time at which the simulation of the models branches from the base.
+
+    executor
+      A topkappy executor to run the simulations (by default, in this
+      thread).
+    """
+    if base_model.engine not in BRANCHING_ENGINES:
+        raise ValueError(
+            "Models can only branch with engines returning snapshots %s, not %s"
+            % (BRANCHING_ENGINES, base_model.engine)
+        )
+    branched = [_can_branch_from(base_model, model) for model in models]
+    for model, is_branched in zip(models, branched):
+        if is_branched and not (model.duration > branch_time):
+            raise ValueError(
+                "Model duration %s is not after the branch time %s"
+                % (model.duration, branch_time)
+            )
+    if executor is None:
+        executor = SerialExecutor()
+    branch_snapshot = "branch_at_%s" % branch_time
+    # Different models may use the same name for snapshots at different times.
+    early_snapshot_times = {
+        "%s_%s" % (sid, t): t
+        for m in models
+        for sid, t in m.snapshot_times.items()
+        if t < branch_time
+    }
+    early_snapshot_times[branch_snapshot] = branch_time
+    first_phase_model = base_model.copy(
+        duration=branch_time,
+        stop_condition=None,
+        snapshot_times=early_snapshot_times,
+        plot_points="all",
+        census_period=None,
+    )
+    first_phase = first_phase_model.get_simulation_results(executor=executor)
+    first_phase_errors = first_phase.get("snapshot_errors", {})
+    if branch_snapshot not in first_phase["snapshots"]:
+        raise ValueError(
+            "The first phase (status %s) produced no snapshot at the branch "
+            "time: %s"
+            % (first_phase["status"], first_phase_errors.get(branch_snapshot))
+        )
+    initial_snapshot = first_phase["snapshots"][branch_snapshot]
+
+    second_phase_models = []
+    for model, is_branched in zip(models, branched):
+        if is_branched:
+            second_phase_models.append(
+                model.copy(
+                    initial_quantities={},
+                    initial_snapshot=initial_snapshot,
+                    duration=model.duration - branch_time,
+                    snapshot_times={
+                        sid: t - branch_time
+                        for sid, t in model.snapshot_times.items()
+                        if t >= branch_time
+                    },
+                    plot_points="all",
+                )
+            )
+        else:
+            second_phase_models.append(model)
+    tasks = [model.simulation_task() for model in second_phase_models]
+    second_phases = executor.run_tasks(tasks)
+
+    all_results = []
+    for model, is_branched, second_phase in zip(models, branched, second_phases):
+        if not is_branched:
+            all_results.append(second_phase)
+            continue
+        snapshots, snapshot_errors = {}, {}
+        for sid, t in model.snapshot_times.items():
+            if t >= branch_time:
+                continue
+            early_name = "%s_%s" % (sid, t)
+            if early_name in first_phase["snapshots"]:
+                snapshots[sid] = first_phase["snapshots"][early_name]
+            elif early_name in first_phase_errors:
+                snapshot_errors[sid] = first_phase_errors[early_name]
+        snapshots.update(second_phase["snapshots"])
+        snapshot_errors.update(second_phase.get("snapshot_errors", {}))
+        plots = _concatenate_plots(
+            first_phase["plots"], second_phase["plots"], branch_time
+        )
+        plots = select_plot_points(plots, model.plot_points, model.plot_time_step)
+        statuses = [first_phase.get("status"), second_phase.get("status")]
+        status = ([s for s in statuses if s != "completed"] + ["completed"])[0]
+        result = {"plots": plots, "snapshots": snapshots, "status": status}
+        # Replaying a branched run requires the seeds of both phases.
+        result["seed"] = (first_phase.get("seed"), second_phase.get("seed"))
+        if len(snapshot_errors):
+            result["snapshot_errors"] = snapshot_errors
+        all_results.append(result)
+    return all_results
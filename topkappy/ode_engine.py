@@ -0,0 +1,72 @@
+import numpy as np
+
+from .reaction_networks import ReactionNetwork, model_plot_times
+from .plot_points import select_plot_points
+
+try:
+    from scipy.integrate import solve_ivp
+
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+
+def _integrate_rk4(derivative, initial_state, times, substeps=10):
+    """Integrate with a fixed-step Runge-Kutta 4, returning the states at times."""
+    states = [initial_state]
+    state = initial_state
+    for t_start, t_end in zip(times[:-1], times[1:]):
+        dt = (t_end - t_start) / substeps
+        t = t_start
+        for _ in range(substeps):
+            k1 = derivative(t, state)
+            k2 = derivative(t + dt / 2, state + dt * k1 / 2)
+            k3 = derivative(t + dt / 2, state + dt * k2 / 2)
+            k4 = derivative(t + dt, state + dt * k3)
+            state = state + dt * (k1 + 2 * k2 + 2 * k3 + k4) / 6
+            t += dt
+        states.append(state)
+    return np.array(states).T
+
+
+def simulate_ode(model, rtol=1e-6, atol=1e-6, rk4_substeps=10):
+    """Simulate the mean-field (deterministic) dynamics of a simple KappaModel.
+
+    The model's rules are compiled into a site-level reaction network (see
+    ``ReactionNetwork`` for the supported rules and plots), whose
+    mass-action ODEs are integrated over the model's duration. This is much
+    faster than a stochastic Kappa simulation at high copy numbers, and
+    useful for screening before running full Kappa simulations.
+
+    The result has the same form as ``KappaModel.get_simulation_results()``
+    with plots at every ``plot_time_step``, and no snapshots.
+
+    If Scipy is installed, the ODEs are integrated with ``solve_ivp`` (LSODA
+    method, with the given tolerances), else with a fixed-step Runge-Kutta
+    method (rk4_substeps steps per plot time step).
+    """
+    network = ReactionNetwork(model)
+    times = model_plot_times(model)
+    stoichiometry = network.stoichiometry
+
+    def derivative(t, state):
+        return stoichiometry.dot(network.propensities(state))
+
+    if SCIPY_AVAILABLE:
+        solution = solve_ivp(
+            derivative,
+            (times[0], times[-1]),
+            network.initial_state,
+            t_eval=times,
+            method="LSODA",
+            rtol=rtol,
+            atol=atol,
+        )
+        states = solution.y
+    else:
+        states = _integrate_rk4(
+            derivative, network.initial_state, times, substeps=rk4_substeps
+        )
+    plots = network.plots_dict(times, states)
+    plots = select_plot_points(plots, model.plot_points, model.plot_time_step)
+    return {"plots": plots, "snapshots": {}}
@@ -0,0 +1,246 @@
+import math
+
+import numpy as np
+
+try:
+    from scipy.stats import norm
+
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+
+def normal_quantile(p):
+    """Return the p-quantile of the standard normal distribution.
+
+    Uses Scipy if it is installed, else a bisection on the normal CDF (the
+    standard library's NormalDist needs Python 3.8).
+    """
+    if SCIPY_AVAILABLE:
+        return float(norm.ppf(p))
+    low, high = -40.0, 40.0
+    for _ in range(100):
+        middle = (low + high) / 2
+        if 0.5 * (1 + math.erf(middle / math.sqrt(2))) < p:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+class RunningStatistics:
+    """Online mean and variance of a stream of values (Welford's algorithm).
+
+    The values can be scalars or arrays (e.g. one value per observable), in
+    which case the statistics are computed element-wise. Memory use does not
+    depend on the number of values added.
+
+    Examples
+    --------
+
+    >>> statistics = RunningStatistics()
+    >>> for value in [1.0, 2.0, 4.0]:
+    >>>     statistics.add(value)
+    >>> statistics.mean, statistics.variance  # (2.333, 2.333)
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.sum_of_squares = 0.0
+
+    def add(self, value):
+        """Update the statistics with a new value (scalar or array)."""
+        value = np.asarray(value, dtype=float)
+        self.count += 1
+        delta = value - self.mean
+        self.mean = self.mean + delta / self.count
+        self.sum_of_squares = self.sum_of_squares + delta * (value - self.mean)
+
+    def merge(self, other):
+        """Update the statistics with those of another RunningStatistics."""
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        self.sum_of_squares = (
+            self.sum_of_squares
+            + other.sum_of_squares
+            + delta**2 * self.count * other.count / count
+        )
+        self.count = count
+
+    @property
+    def variance(self):
+        """Unbiased sample variance (NaN with fewer than 2 values)."""
+        if self.count < 2:
+            return np.nan * np.asarray(self.sum_of_squares)
+        return self.sum_of_squares / (self.count - 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    @property
+    def standard_error(self):
+        """Standard error of the mean."""
+        return self.std / np.sqrt(max(self.count, 1))
+
+    def confidence_interval_width(self, confidence=0.95):
+        """Full width of the (normal-approximation) confidence interval."""
+        z = normal_quantile(0.5 + confidence / 2)
+        return 2 * z * self.standard_error
+
+
+class _P2Quantile:
+    """Streaming estimate of a quantile of many series at once (P² algorithm).
+
+    Implements the algorithm of Jain & Chlamtac (1985), vectorized over the
+    columns (e.g. time points): each column keeps 5 markers whose heights
+    approximate the minimum, p/2, p, (1+p)/2 quantiles and maximum.
+    """
+
+    def __init__(self, p):
+        self.p = p
+        self.first_values = []
+        self.heights = None
+        self.increments = np.array([0, p / 2, p, (1 + p) / 2, 1]).reshape((5, 1))
+
+    def add(self, values):
+        if self.heights is None:
+            self.first_values.append(values)
+            if len(self.first_values) == 5:
+                self.heights = np.sort(np.array(self.first_values), axis=0)
+                n_columns = self.heights.shape[1]
+                self.positions = np.tile(np.arange(5.0).reshape((5, 1)), n_columns)
+                self.desired = np.tile(4 * self.increments, n_columns)
+                self.first_values = []
+            return
+        q, n = self.heights, self.positions
+        q[0] = np.minimum(q[0], values)
+        q[4] = np.maximum(q[4], values)
+        cell = (q[1:4] <= values).sum(axis=0)
+        n += np.arange(5).reshape((5, 1)) > cell
+        self.desired += self.increments
+        columns = np.arange(q.shape[1])
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            move = ((d >= 1) & (n[i + 1] - n[i] > 1)) | (
+                (d <= -1) & (n[i - 1] - n[i] < -1)
+            )
+            if not move.any():
+                continue
+            d = np.sign(d) * move
+            with np.errstate(divide="ignore", invalid="ignore"):
+                parabolic = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                neighbour = (i + d).astype(int)
+                linear = q[i] + d * (q[neighbour, columns] - q[i]) / (
+                    n[neighbour, columns] - n[i]
+                )
+            in_bounds = (q[i - 1] < parabolic) & (parabolic < q[i + 1])
+            q[i] = np.where(move, np.where(in_bounds, parabolic, linear), q[i])
+            n[i] += d
+
+    @property
+    def value(self):
+        if self.heights is None:
+            return np.quantile(np.array(self.first_values), self.p, axis=0)
+        return self.heights[2].copy()
+
+
+class PlotSeriesAggregator:
+    """Aggregate the plots of many simulations as they finish, in constant memory.
+
+    Each result added is interpolated onto a shared time grid, then used to
+    update, for each plot and time point, the mean and variance (Welford),
+    the minimum and maximum, and approximate quantiles (P² algorithm). The
+    simulation results can be discarded right after being added, so memory
+    use is proportional to the number of time points, whatever the number
+    of replicates.
+
+    Examples
+    --------
+
+    >>> aggregator = PlotSeriesAggregator(quantiles=(0.05, 0.5, 0.95))
+    >>> for result in executor.map(run_simulation_task, tasks):
+    >>>     aggregator.add(result)
+    >>> summary = aggregator.summary()
+    >>> summary["|A(b[.])|"]["quantiles"][0.5]  # median series
+
+    Parameters
+    ----------
+
+    times
+      The time grid. Defaults to the time points of the first result added.
+
+    quantiles
+      The quantiles to estimate at each time point.
+    """
+
+    def __init__(self, times=None, quantiles=(0.05, 0.5, 0.95)):
+        self.times = None if times is None else np.array(times, dtype=float)
+        self.quantiles = quantiles
+        self.series_statistics = {}
+
+    def __len__(self):
+        if not len(self.series_statistics):
+            return 0
+        return list(self.series_statistics.values())[0]["running"].count
+
+    def _new_series_statistics(self):
+        return {
+            "running": RunningStatistics(),
+            "min": np.full(len(self.times), np.inf),
+            "max": np.full(len(self.times), -np.inf),
+            "quantiles": [_P2Quantile(p) for p in self.quantiles],
+        }
+
+    def add(self, result):
+        """Update the statistics with a simulation result (or its plots)."""
+        plots = result.get("plots", result)
+        result_times = np.array(plots["[T]"], dtype=float)
+        if self.times is None:
+            self.times = result_times
+        same_times = (len(result_times) == len(self.times)) and np.allclose(
+            result_times, self.times
+        )
+        for label, series in plots.items():
+            if label == "[T]":
+                continue
+            values = np.array(series, dtype=float)
+            if not same_times:
+                values = np.interp(self.times, result_times, values)
+            if label not in self.series_statistics:
+                self.series_statistics[label] = self._new_series_statistics()
+            statistics = self.series_statistics[label]
+            statistics["running"].add(values)
+            statistics["min"] = np.minimum(statistics["min"], values)
+            statistics["max"] = np.maximum(statistics["max"], values)
+            for quantile in statistics["quantiles"]:
+                quantile.add(values)
+
+    def summary(self):
+        """Return the statistics of each plot on the time grid.
+
+        The result is a dict ``{'[T]': times, label: series_summary}`` where
+        each series summary is a dict with keys "mean", "std", "min", "max"
+        (arrays of the same length as the times) and "quantiles" (a dict
+        ``{quantile: array}``).
+        """
+        summary = {"[T]": self.times}
+        for label, statistics in self.series_statistics.items():
+            running = statistics["running"]
+            summary[label] = {
+                "mean": np.array(running.mean),
+                "std": np.array(running.std),
+                "min": statistics["min"].copy(),
+                "max": statistics["max"].copy(),
+                "quantiles": {
+                    q.p: q.value for q in statistics["quantiles"] if running.count
+                },
+            }
+        return summary
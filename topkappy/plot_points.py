@@ -0,0 +1,57 @@
+from numbers import Integral, Real
+
+
+def _is_positive_int(value):
+    return isinstance(value, Integral) and not isinstance(value, bool) and value > 0
+
+
+def _is_times_list(value):
+    return isinstance(value, (list, tuple)) and all(
+        isinstance(t, Real) and not isinstance(t, bool) and t >= 0 for t in value
+    )
+
+
+def check_plot_points(plot_points):
+    """Raise a ValueError if plot_points is not a valid plot points spec.
+
+    In {'every': k}, k must be a positive integer, and in {'times': [...]}
+    the times must be a list of non-negative numbers.
+    """
+    valid = (plot_points in ("all", "final")) or (
+        isinstance(plot_points, dict)
+        and len(plot_points) == 1
+        and (
+            _is_positive_int(plot_points.get("every"))
+            or _is_times_list(plot_points.get("times"))
+        )
+    )
+    if not valid:
+        raise ValueError(
+            "plot_points should be 'all', 'final', {'every': k} or "
+            "{'times': [t1, t2...]}, not %s" % (plot_points,)
+        )
+
+
+def plot_points_indices(plot_points, plot_period):
+    """Return the indices of the plot points to keep for a {'times': []}."""
+    return sorted(set(int(round(t / plot_period)) for t in plot_points["times"]))
+
+
+def select_plot_points(plots, plot_points, plot_period):
+    """Keep only some points of a plots dict {'[T]': [...], ...}.
+
+    This is the in-memory equivalent of what ``get_plot_data`` does when
+    retrieving plots from the simulator.
+    """
+    if plot_points == "all":
+        return plots
+    n_points = len(plots.get("[T]", ()))
+    if plot_points == "final":
+        indices = range(max(0, n_points - 1), n_points)
+    elif "every" in plot_points:
+        indices = range(0, n_points, plot_points["every"])
+    else:
+        indices = [
+            i for i in plot_points_indices(plot_points, plot_period) if i < n_points
+        ]
+    return {label: tuple(series[i] for i in indices) for label, series in plots.items()}
@@ -0,0 +1,162 @@
+import numpy as np
+
+from .KappaClasses import KappaRule
+from .executors import SerialExecutor
+from .seeds import random_seed, spawn_seeds
+
+
+def model_with_rule_rates(model, rates):
+    """Return a copy of the model where some rules have new rates.
+
+    Parameters
+    ----------
+
+    model
+      A KappaModel.
+
+    rates
+      A dict {rule_name: rate}.
+    """
+    unknown_rules = set(rates).difference([rule.name for rule in model.rules])
+    if len(unknown_rules):
+        raise ValueError("Unknown rules: %s" % sorted(unknown_rules))
+    rules = [
+        KappaRule(
+            name=rule.name,
+            reactants=rule.reactants,
+            sense=rule.sense,
+            products=rule.products,
+            rate=rates.get(rule.name, rule.rate),
+        )
+        for rule in model.rules
+    ]
+    return model.copy(rules=rules)
+
+
+def bounds_arrays(bounds, log_scale):
+    """Return (rule_names, lows, highs) from bounds {rule: (low, high)}.
+
+    With log_scale, lows and highs are the logarithms of the bounds.
+    """
+    rule_names = list(bounds)
+    lows, highs = np.array([bounds[name] for name in rule_names], dtype=float).T
+    if log_scale:
+        if (lows <= 0).any():
+            raise ValueError("Log-scale sampling requires positive bounds.")
+        lows, highs = np.log(lows), np.log(highs)
+    return rule_names, lows, highs
+
+
+def unit_samples_to_rate_sets(unit_samples, rule_names, lows, highs, log_scale):
+    """Return rates dicts from points of [0, 1]^n (see ``bounds_arrays``)."""
+    values = lows + unit_samples * (highs - lows)
+    if log_scale:
+        values = np.exp(values)
+    return [dict(zip(rule_names, row)) for row in values]
+
+
+def final_values(plots):
+    """Default statistic: the final value of each plotted observable."""
+    return {label: series[-1] for label, series in plots.items() if label != "[T]"}
+
+
+class RuleRatesEvaluator:
+    """Evaluate statistics of a model's simulations for many sets of rates.
+
+    All simulations needed for a batch of rate sets are submitted at once to
+    the executor, so they run in parallel. Replicate i of every rate set is
+    run with the same seed (common random numbers), which reduces the
+    variance of the differences between rate sets, and results are cached so
+    that duplicate points are never simulated twice.
+
+    Parameters
+    ----------
+
+    model
+      The KappaModel whose rules rates will be changed.
+
+    replicates
+      Number of simulations per rate set. The statistics are averaged over
+      the replicates.
+
+    statistic
+      Function ``f(plots) -> {observable: value}`` computing scalar
+      observables from a simulation's plots. Defaults to the final value of
+      each plot.
+
+    executor
+      A topkappy executor (see ``topkappy.executors``) to run the
+      simulations. Defaults to running them serially in this thread.
+
+    seed
+      Seed from which the replicates' seeds are derived (see
+      ``spawn_seeds``). Use None to disable common random numbers.
+    """
+
+    def __init__(
+        self, model, replicates=1, statistic=final_values, executor=None, seed=0
+    ):
+        self.model = model
+        self.replicates = replicates
+        self.statistic = statistic
+        self.executor = SerialExecutor() if executor is None else executor
+        self.seed = seed
+        self.replicate_seeds = None
+        if seed is not None:
+            self.replicate_seeds = spawn_seeds(seed, replicates)
+        self.cache = {}
+        self.observables = None
+
+    def _replicate_seed(self, replicate):
+        if self.replicate_seeds is None:
+            return random_seed()
+        return self.replicate_seeds[replicate]
+
+    @staticmethod
+    def _cache_key(rates, seed):
+        # Rates are rounded so that round-trips (e.g. through log-space) of
+        # the same point still hit the cache.
+        rounded = [(name, float("%.12g" % rate)) for name, rate in rates.items()]
+        return (tuple(sorted(rounded)), seed)
+
+    def evaluate(self, rate_sets):
+        """Return an array (rate sets x observables) of averaged statistics.
+
+        Parameters
+        ----------
+
+        rate_sets
+          A list of dicts {rule_name: rate}.
+        """
+        keys = [
+            [
+                self._cache_key(rates, self._replicate_seed(r))
+                for r in range(self.replicates)
+            ]
+            for rates in rate_sets
+        ]
+        if self.seed is None:
+            # Without common random numbers, each run is a new point.
+            self.cache = {}
+            keys = [
+                [key + (i, r) for r, key in enumerate(rate_set_keys)]
+                for i, rate_set_keys in enumerate(keys)
+            ]
+        new_runs = {}
+        for rates, rate_set_keys in zip(rate_sets, keys):
+            for key in rate_set_keys:
+                if (key not in self.cache) and (key not in new_runs):
+                    model = model_with_rule_rates(self.model, rates)
+                    new_runs[key] = model.simulation_task(seed=key[1])
+        results = self.executor.run_tasks(list(new_runs.values()))
+        for key, result in zip(new_runs, results):
+            statistics = self.statistic(result["plots"])
+            if self.observables is None:
+                self.observables = list(statistics)
+            self.cache[key] = [statistics[name] for name in self.observables]
+        return np.array(
+            [
+                np.mean([self.cache[key] for key in rate_set_keys], axis=0)
+                for rate_set_keys in keys
+            ]
+        ).reshape((len(rate_sets), -1))
@@ -0,0 +1,252 @@
+import re
+
+import numpy as np
+
+from .KappaClasses import KappaAgent, KappaSiteState
+
+AGENT_COUNT_REGEX = re.compile(r"^\|\s*([\w+-]+)\(\s*\)\s*\|$")
+FREE_SITE_REGEX = re.compile(r"^\|\s*([\w+-]+)\(\s*([\w+-]+)\[\.\]\s*\)\s*\|$")
+
+
+def _name(agent):
+    return agent.name if isinstance(agent, KappaAgent) else agent
+
+
+def _is_bond_label(state):
+    return state.isdigit()
+
+
+class UnsupportedModelError(ValueError):
+    """Raised when a model is out of the scope of the native engines."""
+
+
+class ReactionNetwork:
+    """Site-level mass-action reaction network compiled from a KappaModel.
+
+    This is the representation used by the native (non-Kappa) simulation
+    engines. The species are the free sites ``('free', agent, site)`` and the
+    bonds ``('bond', (agent1, site1), (agent2, site2))`` of the model, so
+    the compiled rules must be simple binding and unbinding rules without
+    context, like the rules of the README example::
+
+        A(b[.]),B(b[.]) -> A(b[1]),B(b[1])   (binding)
+        A(b[1]),B(b[1]) -> A(b[.]),B(b[.])   (unbinding)
+
+    (or both at once with '<->' and a pair of rates). The supported plots
+    are agents counts like ``|A()|`` and free sites counts like
+    ``|A(b[.])|``. Everything else raises an UnsupportedModelError.
+
+    The propensity of a binding rule is ``rate * n_site1 * n_site2`` (as the
+    number of rule embeddings in Kappa), that of an unbinding rule is
+    ``rate * n_bonds``. Note that these propensities ignore the (rare) cases
+    where both free sites belong to the same agent.
+
+    Parameters
+    ----------
+
+    model
+      A KappaModel.
+    """
+
+    def __init__(self, model):
+        self.species = []
+        self.species_indices = {}
+        self.agent_counts = {}
+        self.sites = {a.name: list(a.sites) for a in model.agents}
+        for agent in model.agents:
+            for site in agent.sites:
+                self._species_index(("free", agent.name, site))
+        initial = {}
+        for agent, quantity in model.initial_quantities.items():
+            agent = _name(agent)
+            self.agent_counts[agent] = self.agent_counts.get(agent, 0) + quantity
+            for site in self.sites[agent]:
+                key = ("free", agent, site)
+                initial[key] = initial.get(key, 0) + quantity
+        if model.initial_snapshot is not None:
+            self._add_snapshot_quantities(model.initial_snapshot, initial)
+        self.reactions = []
+        for rule in model.rules:
+            self._add_rule(rule)
+        indices = [self._species_index(key) for key in initial]
+        self.initial_state = np.zeros(len(self.species))
+        self.initial_state[indices] = list(initial.values())
+        self._compile_reactions()
+        self._compile_observables(model)
+
+    def _species_index(self, key):
+        if key not in self.species_indices:
+            self.species_indices[key] = len(self.species)
+            self.species.append(key)
+        return self.species_indices[key]
+
+    @staticmethod
+    def _bond_key(end1, end2):
+        return ("bond",) + tuple(sorted([end1, end2]))
+
+    def _add_snapshot_quantities(self, snapshot, initial):
+        if isinstance(snapshot, dict):
+            snapshot = snapshot["snapshot_agents"]
+        for count, nodes in snapshot:
+            for i, node in enumerate(nodes):
+                agent = node["node_type"]
+                self.agent_counts[agent] = self.agent_counts.get(agent, 0) + count
+                for j, site in enumerate(node["node_sites"]):
+                    site_type, site_data = site["site_type"]
+                    links = site_data["port_links"] if site_type == "port" else []
+                    if len(links) == 0:
+                        key = ("free", agent, site["site_name"])
+                    else:
+                        k, l = links[0]
+                        if (k, l) < (i, j):
+                            continue  # The bond was counted from its other end.
+                        partner = nodes[k]
+                        key = self._bond_key(
+                            (agent, site["site_name"]),
+                            (
+                                partner["node_type"],
+                                partner["node_sites"][l]["site_name"],
+                            ),
+                        )
+                    initial[key] = initial.get(key, 0) + count
+
+    def _add_rule(self, rule):
+        if rule.sense == "<->":
+            if not isinstance(rule.rate, (list, tuple)):
+                raise UnsupportedModelError(
+                    "Rule %s: '<->' requires a pair of rates." % rule.name
+                )
+            forward_rate, backward_rate = rule.rate
+            self._add_reaction(rule.name, rule.reactants, rule.products, forward_rate)
+            self._add_reaction(rule.name, rule.products, rule.reactants, backward_rate)
+        elif rule.sense == "->":
+            self._add_reaction(rule.name, rule.reactants, rule.products, rule.rate)
+        else:
+            raise UnsupportedModelError("Unsupported rule sense %s" % rule.sense)
+
+    def _add_reaction(self, name, reactants, products, rate):
+        error = UnsupportedModelError(
+            "Rule %s is not a simple binding or unbinding rule" % name
+        )
+        if (len(reactants) != 2) or (len(products) != 2):
+            raise error
+        ends = []
+        for reactant, product in zip(reactants, products):
+            if (_name(reactant.agent), reactant.site) != (
+                _name(product.agent),
+                product.site,
+            ):
+                raise error
+            ends.append((_name(reactant.agent), reactant.site))
+        states_before = [s.state for s in reactants]
+        states_after = [s.state for s in products]
+        bond = self._species_index(self._bond_key(*ends))
+        free_sites = [self._species_index(("free",) + end) for end in ends]
+        symmetric = ends[0] == ends[1]
+        if states_before == [".", "."] and (
+            _is_bond_label(states_after[0]) and states_after[0] == states_after[1]
+        ):
+            self.reactions.append((free_sites, [bond], float(rate), symmetric))
+        elif states_after == [".", "."] and (
+            _is_bond_label(states_before[0]) and states_before[0] == states_before[1]
+        ):
+            self.reactions.append(([bond], free_sites, float(rate), False))
+        else:
+            raise error
+
+    def _compile_reactions(self):
+        n_reactions = len(self.reactions)
+        self.stoichiometry = np.zeros((len(self.species), n_reactions))
+        self.first_reactants = np.zeros(n_reactions, dtype=int)
+        self.second_reactants = np.zeros(n_reactions, dtype=int)
+        self.is_bimolecular = np.zeros(n_reactions, dtype=bool)
+        self.is_symmetric = np.zeros(n_reactions, dtype=bool)
+        self.rates = np.zeros(n_reactions)
+        for r, (reactants, products, rate, symmetric) in enumerate(self.reactions):
+            for species in reactants:
+                self.stoichiometry[species, r] -= 1
+            for species in products:
+                self.stoichiometry[species, r] += 1
+            self.first_reactants[r] = reactants[0]
+            self.second_reactants[r] = reactants[-1]
+            self.is_bimolecular[r] = len(reactants) == 2
+            self.is_symmetric[r] = symmetric
+            self.rates[r] = rate
+
+    def propensities(self, state, stochastic=False):
+        """Return the propensity of each reaction in the given state(s).
+
+        The state can be a vector of species counts, or a 2D array with one
+        column per replicate, in which case one column of propensities per
+        replicate is returned.
+
+        If stochastic is True, the propensity of symmetric binding rules
+        like ``A(x[.]),A(x[.])`` counts pairs of distinct sites,
+        n * (n - 1) / 2, rather than n * n / 2.
+        """
+        state = np.asarray(state, dtype=float)
+        extra_dims = (1,) * (state.ndim - 1)
+        first = state[self.first_reactants]
+        second = state[self.second_reactants]
+        symmetric = self.is_symmetric.reshape((-1,) + extra_dims)
+        bimolecular = self.is_bimolecular.reshape((-1,) + extra_dims)
+        if stochastic:
+            second = second - symmetric
+        second = np.where(bimolecular, second, 1.0)
+        factor = np.where(symmetric, 0.5, 1.0)
+        rates = self.rates.reshape((-1,) + extra_dims)
+        return np.maximum(rates * factor * first * second, 0)
+
+    def _compile_observables(self, model):
+        self.observable_labels = []
+        rows, offsets = [], []
+        for item in model.plots:
+            label = model._auto_plot_item_string(item)
+            row = np.zeros(len(self.species))
+            offset = 0
+            agent_match = AGENT_COUNT_REGEX.match(label)
+            site_match = FREE_SITE_REGEX.match(label)
+            if isinstance(item, KappaAgent) or agent_match:
+                agent = (
+                    item.name if isinstance(item, KappaAgent) else agent_match.group(1)
+                )
+                offset = self.agent_counts.get(agent, 0)
+            elif site_match or (isinstance(item, KappaSiteState) and item.state == "."):
+                if site_match:
+                    key = ("free",) + site_match.groups()
+                else:
+                    key = ("free", _name(item.agent), item.site)
+                if key not in self.species_indices:
+                    raise UnsupportedModelError("Unknown site in plot %s" % label)
+                row[self.species_indices[key]] = 1
+            else:
+                raise UnsupportedModelError("Unsupported plot %s" % label)
+            self.observable_labels.append(label)
+            rows.append(row)
+            offsets.append(offset)
+        self.observable_matrix = np.array(rows).reshape((-1, len(self.species)))
+        self.observable_offsets = np.array(offsets, dtype=float)
+
+    def observables(self, states):
+        """Return the plots values for an array (species x time points)."""
+        values = self.observable_matrix.dot(states)
+        return values + self.observable_offsets.reshape(
+            (-1,) + (1,) * (values.ndim - 1)
+        )
+
+    def plots_dict(self, times, states):
+        """Return a plots dict {'[T]': times, label: values} like kappy's."""
+        plots = {"[T]": tuple(float(t) for t in times)}
+        for label, values in zip(self.observable_labels, self.observables(states)):
+            plots[label] = tuple(float(v) for v in values)
+        return plots
+
+
+def model_plot_times(model):
+    """Return the time points of the plots of a fixed-duration model."""
+    if model.duration is None or model.stop_condition is not None:
+        raise UnsupportedModelError(
+            "Native engines only support models with a fixed duration."
+        )
+    n_points = int(np.floor(model.duration / model.plot_time_step + 1e-9)) + 1
+    return model.plot_time_step * np.arange(n_points)
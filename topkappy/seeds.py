@@ -0,0 +1,43 @@
+import numpy as np
+
+# Seeds are kept below 2^30 so they are valid OCaml integers for KaSim, even
+# on 32-bit platforms.
+MAX_SEED = 2**30 - 1
+
+
+def _seed_from_sequence(seed_sequence):
+    return int(seed_sequence.generate_state(1)[0]) & MAX_SEED
+
+
+def random_seed():
+    """Return a new random seed, drawn from the OS entropy."""
+    return _seed_from_sequence(np.random.SeedSequence())
+
+
+def spawn_seeds(seed, n_seeds):
+    """Return a list of independent seeds derived from a master seed.
+
+    The seeds are derived with NumPy's ``SeedSequence.spawn``, so they are
+    statistically independent even for consecutive master seeds, and the
+    same master seed always gives the same seeds.
+
+    Examples
+    --------
+
+    >>> seeds = spawn_seeds(123, n_seeds=10)
+    >>> tasks = [model.simulation_task(seed=seed) for seed in seeds]
+
+    Parameters
+    ----------
+
+    seed
+      Master seed: an integer, None for a random master seed, or a
+      ``numpy.random.SeedSequence``, which then gives new seeds at each
+      call (e.g. to add replicates to an ensemble).
+
+    n_seeds
+      Number of seeds to derive.
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return [_seed_from_sequence(child) for child in seed.spawn(n_seeds)]
@@ -0,0 +1,268 @@
+import numpy as np
+
+from .rate_evaluation import (
+    RuleRatesEvaluator,
+    final_values,
+    bounds_arrays,
+    unit_samples_to_rate_sets,
+)
+
+
+def _rule_rates(model, rule_names):
+    rates = {rule.name: rule.rate for rule in model.rules}
+    for name in rule_names:
+        if name not in rates:
+            raise ValueError("Unknown rule: %s" % name)
+        if isinstance(rates[name], (list, tuple)):
+            raise ValueError("Rule %s has several rates, use '->' rules." % name)
+    return {name: float(rates[name]) for name in rule_names}
+
+
+def _indices_dict(evaluator, rule_names, *arrays):
+    """Return {observable: {rule: value or (values...)}} from (k x obs) arrays."""
+    return {
+        observable: {
+            rule: (
+                float(arrays[0][r, o])
+                if len(arrays) == 1
+                else tuple(float(a[r, o]) for a in arrays)
+            )
+            for r, rule in enumerate(rule_names)
+        }
+        for o, observable in enumerate(evaluator.observables)
+    }
+
+
+def finite_differences_sensitivities(
+    model,
+    rule_names=None,
+    relative_step=0.1,
+    replicates=1,
+    statistic=final_values,
+    executor=None,
+    seed=0,
+    evaluator=None,
+):
+    """Return the elasticity of each observable with respect to each rule rate.
+
+    The elasticity ``d log(observable) / d log(rate)`` is estimated with
+    central finite differences, i.e. from simulations with each rate
+    multiplied and divided by ``1 + relative_step``. Thanks to common random
+    numbers (same seeds for all rates), few replicates are needed even for
+    stochastic simulations.
+
+    Parameters
+    ----------
+
+    model
+      A KappaModel. Only rules with a single rate can be analyzed.
+
+    rule_names
+      Names of the rules whose rate is varied (all rules if None).
+
+    relative_step
+      Relative change of the rates used to compute the differences.
+
+    replicates
+      Number of simulations (with different seeds) averaged per point.
+
+    statistic
+      Function ``f(plots) -> {observable: value}``. By default, the final
+      value of each plot.
+
+    executor
+      A topkappy executor to run the simulations, e.g. in parallel.
+
+    seed
+      Seed from which the replicates' seeds are derived, see
+      ``RuleRatesEvaluator``.
+
+    evaluator
+      A RuleRatesEvaluator to use instead of creating a new one (to share
+      its cache between analyses).
+
+    Returns
+    -------
+
+    sensitivities
+      A dict ``{observable: {rule_name: elasticity}}``.
+    """
+    if rule_names is None:
+        rule_names = [rule.name for rule in model.rules]
+    rates = _rule_rates(model, rule_names)
+    if evaluator is None:
+        evaluator = RuleRatesEvaluator(
+            model, replicates, statistic, executor=executor, seed=seed
+        )
+    factor = 1.0 + relative_step
+    rate_sets = [dict(rates)]
+    for name in rule_names:
+        rate_sets.append(dict(rates, **{name: rates[name] * factor}))
+        rate_sets.append(dict(rates, **{name: rates[name] / factor}))
+    values = evaluator.evaluate(rate_sets)
+    reference, ups, downs = values[0], values[1::2], values[2::2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        elasticities = (ups - downs) / (2 * np.log(factor) * reference)
+    return _indices_dict(evaluator, rule_names, elasticities)
+
+
+def morris_screening(
+    model,
+    bounds,
+    trajectories=10,
+    levels=4,
+    log_scale=True,
+    replicates=1,
+    statistic=final_values,
+    executor=None,
+    seed=0,
+    evaluator=None,
+):
+    """Screen the influence of rule rates with Morris' elementary effects.
+
+    Each trajectory starts at a random point of a grid of ``levels`` values
+    per rate and changes the rates one at a time, in random order, by a step
+    of ``levels / (2 * (levels - 1))`` of their range. All points of all
+    trajectories are simulated at once (e.g. in parallel, with the executor),
+    and points shared by several trajectories are simulated only once.
+
+    Parameters
+    ----------
+
+    model
+      A KappaModel. Only rules with a single rate can be analyzed.
+
+    bounds
+      A dict ``{rule_name: (min_rate, max_rate)}`` of the rates to screen.
+
+    trajectories
+      Number of one-at-a-time trajectories. Each costs
+      ``len(bounds) + 1`` points.
+
+    levels
+      Number of grid levels per rate (an even number).
+
+    log_scale
+      If True, the grid is regular in log-space (rates spanning several
+      orders of magnitude).
+
+    replicates, statistic, executor, seed, evaluator
+      See ``finite_differences_sensitivities``. The seed is also used to
+      draw the trajectories.
+
+    Returns
+    -------
+
+    indices
+      A dict ``{observable: {rule_name: (mu_star, sigma)}}`` where mu_star
+      is the mean absolute elementary effect (the overall influence of the
+      rate) and sigma the standard deviation of the effects (non-linearity
+      or interactions). The effects are per unit of the (log-)range.
+    """
+    rule_names, lows, highs = bounds_arrays(bounds, log_scale)
+    if evaluator is None:
+        evaluator = RuleRatesEvaluator(
+            model, replicates, statistic, executor=executor, seed=seed
+        )
+    rng = np.random.default_rng(seed)
+    n_rules = len(rule_names)
+    delta = levels / (2.0 * (levels - 1))
+    start_levels = np.arange(levels // 2) / (levels - 1.0)
+    points, moves = [], []
+    for _ in range(trajectories):
+        point = rng.choice(start_levels, size=n_rules)
+        directions = rng.choice([-1, 1], size=n_rules)
+        point = np.where(directions < 0, point + delta, point)
+        trajectory = [point.copy()]
+        order = rng.permutation(n_rules)
+        for rule_index in order:
+            point[rule_index] += directions[rule_index] * delta
+            trajectory.append(point.copy())
+        points.extend(trajectory)
+        moves.append((order, directions))
+    rate_sets = unit_samples_to_rate_sets(
+        np.array(points), rule_names, lows, highs, log_scale
+    )
+    values = evaluator.evaluate(rate_sets)
+    values = values.reshape((trajectories, n_rules + 1, -1))
+    effects = np.zeros((trajectories, n_rules, values.shape[2]))
+    for t, (order, directions) in enumerate(moves):
+        differences = np.diff(values[t], axis=0)
+        effects[t, order] = differences / (directions[order] * delta)[:, None]
+    mu_star = np.abs(effects).mean(axis=0)
+    sigma = effects.std(axis=0, ddof=1) if trajectories > 1 else 0 * mu_star
+    return _indices_dict(evaluator, rule_names, mu_star, sigma)
+
+
+def sobol_indices(
+    model,
+    bounds,
+    samples=64,
+    log_scale=True,
+    replicates=1,
+    statistic=final_values,
+    executor=None,
+    seed=0,
+    evaluator=None,
+):
+    """Estimate first-order and total Sobol indices of the rule rates.
+
+    Uses the Saltelli sampling scheme: two random matrices A and B of
+    ``samples`` rate sets, plus, for each rule, the matrix A with the rule's
+    column taken from B, i.e. ``samples * (len(bounds) + 2)`` points, all
+    simulated at once. The first-order indices use the estimator of Saltelli
+    et al. (2010) and the total indices that of Jansen (1999).
+
+    Parameters
+    ----------
+
+    model
+      A KappaModel. Only rules with a single rate can be analyzed.
+
+    bounds
+      A dict ``{rule_name: (min_rate, max_rate)}``. The rates are sampled
+      uniformly between the bounds (in log-space if ``log_scale``).
+
+    samples
+      Number of base samples. Sobol estimates are noisy below a few hundreds.
+
+    log_scale
+      If True, the rates are sampled uniformly in log-space.
+
+    replicates, statistic, executor, seed, evaluator
+      See ``finite_differences_sensitivities``. The seed is also used to
+      draw the samples.
+
+    Returns
+    -------
+
+    indices
+      A dict ``{observable: {rule_name: (first_order, total)}}``. The first
+      order index is the fraction of the observable's variance explained by
+      the rate alone, the total index also counts its interactions.
+    """
+    rule_names, lows, highs = bounds_arrays(bounds, log_scale)
+    if evaluator is None:
+        evaluator = RuleRatesEvaluator(
+            model, replicates, statistic, executor=executor, seed=seed
+        )
+    rng = np.random.default_rng(seed)
+    n_rules = len(rule_names)
+    matrix_a = rng.random((samples, n_rules))
+    matrix_b = rng.random((samples, n_rules))
+    matrices = [matrix_a, matrix_b]
+    for rule_index in range(n_rules):
+        matrix_ab = matrix_a.copy()
+        matrix_ab[:, rule_index] = matrix_b[:, rule_index]
+        matrices.append(matrix_ab)
+    unit_samples = np.vstack(matrices)
+    rate_sets = unit_samples_to_rate_sets(
+        unit_samples, rule_names, lows, highs, log_scale
+    )
+    values = evaluator.evaluate(rate_sets).reshape((n_rules + 2, samples, -1))
+    f_a, f_b, f_ab = values[0], values[1], values[2:]
+    variance = np.var(np.vstack([f_a, f_b]), axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        first_order = np.mean(f_b * (f_ab - f_a), axis=1) / variance
+        total = 0.5 * np.mean((f_a - f_ab) ** 2, axis=1) / variance
+    return _indices_dict(evaluator, rule_names, first_order, total)
@@ -0,0 +1,528 @@
+import copy
+import hashlib
+import threading
+import time
+
+import kappy
+
+try:
+    import psutil
+
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+from .FormattedKappaError import FormattedKappaError
+from .census import snapshot_census
+from .plot_points import plot_points_indices
+from .ode_engine import simulate_ode
+from .gillespie_engine import simulate_gillespie
+from .tau_leaping import simulate_tau_leaping
+from .seeds import random_seed
+
+_warm_clients = threading.local()
+
+NATIVE_ENGINES = {
+    "ode": lambda task, cancel_event: simulate_ode(task.model),
+    "gillespie": lambda task, cancel_event: simulate_gillespie(
+        task.model,
+        seed=task.seed,
+        timeout=task.timeout,
+        max_events=task.max_events,
+        cancel_event=cancel_event,
+    ),
+    "tau_leaping": lambda task, cancel_event: simulate_tau_leaping(
+        task.model,
+        seed=task.seed,
+        timeout=task.timeout,
+        max_events=task.max_events,
+        cancel_event=cancel_event,
+    )[0],
+}
+
+# Seconds between two checks of the limits of a running Kappa simulation.
+LIMITS_POLLING_PERIOD = 0.1
+
+
+class SimulationTask:
+    """Everything needed to run one Kappa simulation, in a picklable form.
+
+    Tasks are created with ``KappaModel.simulation_task()`` and can be sent to
+    other processes or machines, where they are run with
+    ``run_simulation_task``.
+
+    Parameters
+    ----------
+
+    model_string
+      The full Kappa script of the model (or None if model_file is used).
+
+    plot_period
+      Time interval between two points of the plots.
+
+    pause_condition
+      Kappa expression for the end of the simulation, e.g. ``[T] > 10``.
+
+    snapshot_names
+      Names of the snapshots declared in the script.
+
+    seed
+      Seed of the simulator's random number generator (None for random).
+
+    model_file
+      Path to a file containing the Kappa script, loaded by the simulator
+      instead of the model_string. The file must be readable by the
+      process running the task.
+
+    plot_points
+      Which plot points to retrieve, see ``KappaModel``.
+
+    engine
+      Simulation engine, see ``KappaModel``.
+
+    model
+      The KappaModel itself, for engines other than 'kappa' (which only
+      need the model_string).
+
+    timeout
+      Maximal wall-clock duration of the simulation, in seconds.
+
+    max_events
+      Maximal number of simulation events.
+
+    max_memory
+      Maximal memory used by the simulator process, in megabytes (checked
+      with psutil, or /proc on Linux).
+
+    census_snapshot_times
+      Dict {snapshot_name: time} of the snapshots declared in the script
+      for the complexes census (see ``KappaModel``).
+
+    template_id, template_string
+      For tasks created by a ``KappaModelTemplate``: the ID and script of
+      the template, which is loaded by the simulator in addition to the
+      model_string (which then only declares the template's variables).
+    """
+
+    def __init__(
+        self,
+        model_string,
+        plot_period,
+        pause_condition,
+        snapshot_names,
+        seed=None,
+        model_file=None,
+        plot_points="all",
+        engine="kappa",
+        model=None,
+        timeout=None,
+        max_events=None,
+        max_memory=None,
+        census_snapshot_times=None,
+        template_id=None,
+        template_string=None,
+    ):
+        self.model_string = model_string
+        self.engine = engine
+        self.model = model
+        self.model_file = model_file
+        self.plot_points = plot_points
+        self.plot_period = plot_period
+        self.pause_condition = pause_condition
+        self.snapshot_names = list(snapshot_names)
+        self.seed = seed
+        self.timeout = timeout
+        self.max_events = max_events
+        self.max_memory = max_memory
+        self.census_snapshot_times = census_snapshot_times or {}
+        self.template_id = template_id
+        self.template_string = template_string
+
+    def has_limits(self):
+        """Return whether the task has a timeout, event or memory limit."""
+        limits = [self.timeout, self.max_events, self.max_memory]
+        return any(limit is not None for limit in limits)
+
+    def cache_key(self):
+        """Return a key identifying the results of this task (None if unseeded).
+
+        The key is a hash of everything determining the results (script,
+        engine, parameters, limits and seed), stable across processes and
+        sessions, so it can be used to store and look up results, e.g. in a
+        file cache. Tasks without a seed have random results, hence no key.
+        """
+        if self.seed is None:
+            return None
+        script = self.model_string
+        if self.model_file is not None:
+            with open(self.model_file, "r") as f:
+                script = f.read()
+        elif self.model is not None:
+            script = self.model._full_kappa_script()
+        fields = [
+            self.engine,
+            script,
+            self.template_string,
+            self.plot_period,
+            self.pause_condition,
+            self.snapshot_names,
+            self.plot_points,
+            sorted(self.census_snapshot_times.items()),
+            [self.timeout, self.max_events, self.max_memory],
+            self.seed,
+        ]
+        key = hashlib.sha1()
+        for field in fields:
+            key.update(repr(field).encode("utf-8") + b"\0")
+        return key.hexdigest()
+
+    def simulation_parameter(self):
+        """Return the kappy.SimulationParameter for this task."""
+        return kappy.SimulationParameter(
+            plot_period=self.plot_period,
+            pause_condition=self.pause_condition,
+            seed=self.seed,
+        )
+
+
+def get_warm_kappa_client():
+    """Return a KappaStd client reused across the runs of this thread.
+
+    Starting a KappaStd client spawns three Kappa processes, so workers
+    running many simulations keep one client alive and only reset its
+    project between runs.
+    """
+    client = getattr(_warm_clients, "client", None)
+    if client is None:
+        client = _warm_clients.client = kappy.KappaStd()
+        _warm_clients.file_ids = []
+        _warm_clients.template_id = None
+    return client
+
+
+def _load_warm_template(client, template_id, template_string):
+    """Make sure the warm client has this template loaded (and no other).
+
+    The template file is kept by the client between runs, so the template
+    is only uploaded once for all the runs of the same template.
+    """
+    if _warm_clients.template_id == template_id:
+        return
+    if _warm_clients.template_id is not None:
+        client.file_delete(_warm_clients.template_id)
+        _warm_clients.template_id = None
+    if template_id is not None:
+        client.add_model_string(template_string, position=1, file_id=template_id)
+        _warm_clients.template_id = template_id
+
+
+def _reset_warm_kappa_client(discard=False):
+    """Remove the previous model of the warm client (or discard the client)."""
+    client = _warm_clients.client
+    if discard:
+        client.shutdown()
+        _warm_clients.client = None
+        return
+    try:
+        client.simulation_delete()
+    except kappy.KappaError:
+        pass  # No simulation to delete.
+    try:
+        while _warm_clients.file_ids:
+            client.file_delete(_warm_clients.file_ids.pop())
+    except kappy.KappaError:
+        client.shutdown()
+        _warm_clients.client = None
+
+
+def get_plot_data(kappa_client, plot_points="all", plot_period=None, page_size=1000):
+    """Retrieve (some of) the plot points of a finished simulation.
+
+    Only the points selected by plot_points (see ``KappaModel``) are
+    retrieved from the simulator when possible: 'final' and {'times': []}
+    only query the selected points, {'every': k} fetches the plot by pages
+    and only keeps every k-th point.
+
+    Returns a dict {'[T]': (...), 'legend_1': (...)}, with the same form as
+    ``select_plot_points``: all series are present, possibly empty.
+    """
+    if plot_points == "all":
+        pages = [kappa_client.simulation_plot()]
+    elif plot_points == "final":
+        pages = [kappa_client.simulation_plot(kappy.PlotLimit(points=1))]
+    elif "times" in plot_points:
+        pages = [
+            kappa_client.simulation_plot(kappy.PlotLimit(offset=index, points=1))
+            for index in plot_points_indices(plot_points, plot_period)
+        ]
+        if not len(pages):
+            # Only fetch the legend, to return empty series.
+            legend_page = kappa_client.simulation_plot(kappy.PlotLimit(points=1))
+            pages = [dict(legend_page, series=[])]
+    else:
+        every, offset, pages = plot_points["every"], 0, []
+        while True:
+            page = kappa_client.simulation_plot(
+                kappy.PlotLimit(offset=offset, points=page_size)
+            )
+            n_page_points = len(page["series"])
+            page["series"] = page["series"][(-offset) % every :: every]
+            pages.append(page)
+            if n_page_points < page_size:
+                break
+            offset += page_size
+    legend = pages[0]["legend"]
+    rows = [row for page in pages for row in page["series"]]
+    # Without any point (e.g. times past the end), each series is empty.
+    columns = list(zip(*rows)) if len(rows) else [()] * len(legend)
+    return dict(zip(legend, columns))
+
+
+def process_memory(pid):
+    """Return the resident memory of a process in megabytes (None if unknown)."""
+    if PSUTIL_AVAILABLE:
+        try:
+            return psutil.Process(pid).memory_info().rss / 1e6
+        except psutil.Error:
+            return None
+    try:
+        with open("/proc/%d/status" % pid, "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1e3
+    except (IOError, ValueError):
+        return None
+    return None
+
+
+def wait_for_simulation_stop(kappa_client, task, cancel_event=None):
+    """Wait for the end of a simulation, or stop it when it exceeds its limits.
+
+    The simulation is polled until it stops, exceeds the task's timeout,
+    number of events or memory limit, or the cancel_event (a
+    threading.Event) is set, in which case the simulation is paused.
+
+    Returns the status of the simulation: 'completed', 'timeout',
+    'max_events', 'max_memory' or 'cancelled'.
+    """
+    if (not task.has_limits()) and (cancel_event is None):
+        kappa_client.wait_for_simulation_stop()
+        return "completed"
+    start_time = time.time()
+    pid = kappa_client.sim_agent.pid if task.max_memory is not None else None
+    while True:
+        info = kappa_client.simulation_info()
+        progress = info["simulation_info_progress"]
+        if not progress["simulation_progress_is_running"]:
+            return "completed"
+        status = None
+        if (cancel_event is not None) and cancel_event.is_set():
+            status = "cancelled"
+        elif (task.timeout is not None) and (time.time() - start_time > task.timeout):
+            status = "timeout"
+        elif (task.max_events is not None) and (
+            progress["simulation_progress_event"] >= task.max_events
+        ):
+            status = "max_events"
+        elif pid is not None:
+            memory = process_memory(pid)
+            if (memory is not None) and (memory > task.max_memory):
+                status = "max_memory"
+        if status is not None:
+            kappa_client.simulation_pause()
+            return status
+        time.sleep(LIMITS_POLLING_PERIOD)
+
+
+def list_snapshot_ids(kappa_client):
+    """Return the IDs of all snapshots produced by the last simulation.
+
+    This is a single request to the simulator (its snapshot catalog).
+    """
+    catalog = kappa_client.simulation_snapshots()
+    if isinstance(catalog, dict):
+        catalog = catalog.get("snapshot_ids", [])
+    return list(catalog)
+
+
+def _find_snapshot_id(name, snapshot_ids):
+    """Return the ID of snapshot "name" in the catalog (or None if absent).
+
+    Depending on the KaSim version, snapshot IDs may have a ".ka" extension.
+    """
+    for snapshot_id in (name + ".ka", name):
+        if snapshot_id in snapshot_ids:
+            return snapshot_id
+    return None
+
+
+def get_snapshots(kappa_client, snapshot_names, snapshot_ids=None):
+    """Retrieve the snapshots with the given names, in one pass.
+
+    The snapshots are looked up in the simulator's snapshot catalog (see
+    ``list_snapshot_ids``), so only the snapshots which exist are requested.
+    The "deadlock" snapshot is also retrieved if the simulation produced it.
+
+    Returns a pair (snapshots, snapshot_errors) of dicts {name: snapshot}
+    and {name: error_message}, where the errors are for the snapshots which
+    were not produced by the simulation or could not be retrieved.
+    """
+    if snapshot_ids is None:
+        snapshot_ids = list_snapshot_ids(kappa_client)
+    snapshot_ids = set(snapshot_ids)
+    snapshots, snapshot_errors = {}, {}
+    for name in list(snapshot_names) + ["deadlock"]:
+        snapshot_id = _find_snapshot_id(name, snapshot_ids)
+        if snapshot_id is None:
+            if name != "deadlock":
+                snapshot_errors[name] = "Snapshot not produced by the simulation"
+            continue
+        try:
+            snapshots[name] = kappa_client.simulation_snapshot(snapshot_id)
+        except kappy.KappaError as error:
+            snapshot_errors[name] = "Snapshot retrieval failed: %s" % error
+    return snapshots, snapshot_errors
+
+
+def get_census(kappa_client, census_snapshot_times, snapshot_ids=None):
+    """Retrieve the census snapshots one by one, and reduce them to census.
+
+    Each snapshot is discarded as soon as its census is computed, so that
+    at most one snapshot is held in memory. Returns a pair (census,
+    snapshot_errors) where census is a list of dicts {time, complex_sizes,
+    species} (see ``snapshot_census``) for the census snapshots which were
+    produced, and snapshot_errors is a dict {name: error_message} of the
+    census snapshots which were not produced by the simulation or could not
+    be retrieved, as in ``get_snapshots``.
+    """
+    if snapshot_ids is None:
+        snapshot_ids = list_snapshot_ids(kappa_client)
+    snapshot_ids = set(snapshot_ids)
+    census, snapshot_errors = [], {}
+    for sid, t in sorted(census_snapshot_times.items(), key=lambda item: item[1]):
+        snapshot_id = _find_snapshot_id(sid, snapshot_ids)
+        if snapshot_id is None:
+            snapshot_errors[sid] = "Snapshot not produced by the simulation"
+            continue
+        try:
+            snapshot = kappa_client.simulation_snapshot(snapshot_id)
+        except kappy.KappaError as error:
+            snapshot_errors[sid] = "Snapshot retrieval failed: %s" % error
+            continue
+        census.append(dict(time=t, **snapshot_census(snapshot)))
+    return census, snapshot_errors
+
+
+def run_simulation_task(task, kappa_client=None, cancel_event=None):
+    """Run a SimulationTask and return results as a dict.
+
+    The result is of the form {plots: {}, snapshots {}, status: ''}, see
+    ``KappaModel.get_simulation_results`` for more details.
+
+    If the task has limits (timeout, max_events, max_memory) or a
+    cancel_event (threading.Event) is provided and set during the run, the
+    simulation is interrupted, and the result contains the plots up to the
+    interruption, with a status 'timeout', 'max_events', 'max_memory' or
+    'cancelled' instead of 'completed'. The client created for the run is
+    then shut down, as well as the warm client after a memory limit is hit,
+    to free the memory.
+
+    If no kappa_client is provided, a new kappy.KappaStd client is created
+    for the run, unless ``kappa_client='warm'`` in which case a client is
+    reused across the runs of the current thread (see
+    ``get_warm_kappa_client``).
+
+    Tasks with another engine than 'kappa' are run in this process by the
+    corresponding engine, and the kappa_client is ignored.
+
+    The result also records the "seed" of the simulation. Tasks without a
+    seed are run with a new random seed, so that any run can be replayed.
+    """
+    if task.seed is None:
+        task = copy.copy(task)
+        task.seed = random_seed()
+    if task.engine in NATIVE_ENGINES:
+        result = NATIVE_ENGINES[task.engine](task, cancel_event)
+        result.setdefault("status", "completed")
+        result["seed"] = task.seed
+        return result
+    use_warm_client = kappa_client == "warm"
+    own_client = kappa_client is None
+    if use_warm_client:
+        kappa_client = get_warm_kappa_client()
+    elif own_client:
+        kappa_client = kappy.KappaStd()
+    if use_warm_client:
+        _load_warm_template(kappa_client, task.template_id, task.template_string)
+    elif task.template_id is not None:
+        kappa_client.add_model_string(
+            task.template_string, position=1, file_id=task.template_id
+        )
+    file_id = kappa_client.make_unique_id("inlined_input")
+    # The variables of template tasks must be declared before the template.
+    position = 0 if task.template_id is not None else 1
+    if task.model_file is not None:
+        kappa_client.add_model_file(task.model_file, position, file_id=file_id)
+    else:
+        kappa_client.add_model_string(task.model_string, position, file_id=file_id)
+    if use_warm_client:
+        _warm_clients.file_ids.append(file_id)
+    status = None
+    try:
+        try:
+            kappa_client.project_parse()
+        except kappy.KappaError as kappa_error:
+            model_string = task.model_string
+            if task.template_id is not None:
+                model_string = task.template_string
+            elif task.model_file is not None:
+                with open(task.model_file, "r") as f:
+                    model_string = f.read()
+            raise FormattedKappaError.from_kappa_error(kappa_error, model_string)
+        kappa_client.simulation_start(task.simulation_parameter())
+        status = wait_for_simulation_stop(kappa_client, task, cancel_event)
+        plot_data = get_plot_data(kappa_client, task.plot_points, task.plot_period)
+        snapshot_ids = list_snapshot_ids(kappa_client)
+        # The catalog can lag a little behind the end of the simulation.
+        # Interrupted simulations rarely have snapshots: don't wait for them.
+        expected_names = list(task.snapshot_names) + list(task.census_snapshot_times)
+        for _try in range(2 if status == "completed" else 0):
+            if all(_find_snapshot_id(n, snapshot_ids) for n in expected_names):
+                break
+            time.sleep(0.2)
+            snapshot_ids = list_snapshot_ids(kappa_client)
+        snapshots, snapshot_errors = get_snapshots(
+            kappa_client, task.snapshot_names, snapshot_ids
+        )
+        census, census_errors = get_census(
+            kappa_client, task.census_snapshot_times, snapshot_ids
+        )
+        snapshot_errors.update(census_errors)
+    finally:
+        if use_warm_client:
+            _reset_warm_kappa_client(discard=status == "max_memory")
+        elif own_client and status != "completed":
+            # Don't leave an interrupted simulator running in the background.
+            kappa_client.shutdown()
+
+    result = {
+        "plots": plot_data,
+        "snapshots": snapshots,
+        "status": status,
+        "seed": task.seed,
+    }
+    if len(task.census_snapshot_times):
+        result["census"] = census
+    if len(snapshot_errors):
+        result["snapshot_errors"] = snapshot_errors
+    return result
+
+
+def run_warm_simulation_task(task):
+    """Run a SimulationTask with the warm Kappa client of the current thread.
+
+    This is the function sent to executors' workers (see
+    ``topkappy.executors``), so that each worker keeps a single KappaStd
+    client for all the tasks it runs.
+    """
+    return run_simulation_task(task, kappa_client="warm")
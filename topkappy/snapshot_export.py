@@ -0,0 +1,288 @@
+import json
+from xml.sax.saxutils import escape
+
+import networkx as nx
+
+from .agents_graphs import snapshot_agent_nodes_to_graph
+from .layouts import grid_force_directed_layout, batch_force_directed_layouts
+
+# Complexes with more nodes are laid out with the grid layout.
+MAX_DENSE_LAYOUT_NODES = 300
+
+SVG_STYLE = (
+    ".port{stroke:#5d51da;stroke-width:4}"
+    ".link{stroke:black;stroke-width:1}"
+    "rect{stroke:grey;stroke-width:1}"
+    ".agent rect{fill:#e7e5f9}.site rect{fill:white}"
+    "text{font-family:sans-serif;font-size:11px;"
+    "text-anchor:middle;dominant-baseline:central}"
+    ".agent text{font-weight:bold}"
+    ".title{font-size:13px}"
+)
+
+
+def _node_id(node):
+    """Return a string ID for a graph node, e.g. '3' or '3.1' (port 1 of 3)."""
+    if isinstance(node, tuple):
+        return ".".join(str(e) for e in node)
+    return str(node)
+
+
+def complex_graph_layout(graph, layout_method="auto", positions=None, seed=123):
+    """Return the positions {node: (x, y)} of a complex graph, in [-1, 1].
+
+    With ``layout_method='auto'``, small graphs are laid out with a dense
+    Fruchterman-Reingold (method 'dense', see
+    ``batch_force_directed_layouts``), and graphs of more than 300 nodes
+    with the faster ``grid_force_directed_layout`` (method 'grid'). Other
+    methods are networkx's 'FR' and 'spectral'. If positions are provided
+    with ``layout_method=None``, they are returned as they are.
+    """
+    if layout_method == "auto":
+        too_large = len(graph) > MAX_DENSE_LAYOUT_NODES
+        layout_method = "grid" if too_large else "dense"
+    if layout_method is None:
+        return positions
+    if len(graph) == 1:
+        return {node: (0.0, 0.0) for node in graph}
+    if layout_method == "grid":
+        return grid_force_directed_layout(graph, positions, seed=seed)
+    elif layout_method == "dense":
+        return batch_force_directed_layouts([graph], seed=seed)[0]
+    elif layout_method == "FR":
+        return nx.layout.fruchterman_reingold_layout(graph, seed=seed)
+    elif layout_method == "spectral":
+        return nx.layout.spectral_layout(graph)
+    raise ValueError("Unsupported layout_method %s" % layout_method)
+
+
+def complex_graph_to_json(graph, positions):
+    """Return a JSON-serializable dict describing a laid-out complex graph.
+
+    The result has the form ``{"nodes": [{"id", "name", "type", "x", "y"}],
+    "edges": [{"source", "target", "type"}]}`` where node types are 'agent'
+    or 'port' and edge types are 'port' (agent-site) or 'link' (bond). It
+    can be used e.g. to draw the complex in a web page.
+    """
+    return {
+        "nodes": [
+            {
+                "id": _node_id(node),
+                "name": data["node_name"],
+                "type": data["node_type"],
+                "x": round(float(positions[node][0]), 4),
+                "y": round(float(positions[node][1]), 4),
+            }
+            for node, data in graph.nodes(data=True)
+        ],
+        "edges": [
+            {
+                "source": _node_id(u),
+                "target": _node_id(v),
+                "type": data.get("edge_type", "link"),
+            }
+            for u, v, data in graph.edges(data=True)
+        ],
+    }
+
+
+def _svg_complex_elements(complex_json, x0, y0, size, margin=20):
+    """Yield the SVG elements of a complex drawn in the given square box."""
+    scale = 0.5 * size - margin
+
+    def coordinates(node):
+        return (
+            x0 + 0.5 * size + scale * node["x"],
+            y0 + 0.5 * size - scale * node["y"],
+        )
+
+    nodes = {node["id"]: coordinates(node) for node in complex_json["nodes"]}
+    for edge in complex_json["edges"]:
+        (x1, y1), (x2, y2) = nodes[edge["source"]], nodes[edge["target"]]
+        yield '<line class="%s" x1="%.1f" y1="%.1f" x2="%.1f" y2="%.1f"/>' % (
+            "port" if edge["type"] == "port" else "link",
+            x1,
+            y1,
+            x2,
+            y2,
+        )
+    for node in complex_json["nodes"]:
+        x, y = nodes[node["id"]]
+        width = 7 * len(node["name"]) + 8
+        yield (
+            '<g class="%s"><rect x="%.1f" y="%.1f" width="%d" height="16" rx="4"/>'
+            '<text x="%.1f" y="%.1f">%s</text></g>'
+        ) % (
+            "agent" if node["type"] == "agent" else "site",
+            x - width / 2.0,
+            y - 8,
+            width,
+            x,
+            y,
+            escape(node["name"]),
+        )
+
+
+def complex_graph_to_svg(graph, positions=None, layout_method="auto", size=300):
+    """Return an SVG drawing of a complex graph, as a string.
+
+    This is a lightweight alternative to ``plot_snapshot_agent_nodes_graph``,
+    with the same drawing conventions, which builds the SVG text directly
+    instead of creating matplotlib objects.
+
+    Parameters
+    ----------
+
+    graph
+      A complex graph, as returned by ``snapshot_agent_nodes_to_graph``.
+
+    positions
+      A dict {node: (x, y)} of precomputed positions in [-1, 1] (see
+      ``complex_graph_layout``). If provided with a 'grid' layout method,
+      the positions are a warm start.
+
+    layout_method
+      See ``complex_graph_layout``.
+
+    size
+      Width and height of the drawing, in pixels.
+    """
+    positions = complex_graph_layout(graph, layout_method, positions)
+    elements = _svg_complex_elements(
+        complex_graph_to_json(graph, positions), 0, 0, size
+    )
+    return _svg_document(size, size, elements)
+
+
+def _svg_document(width, height, elements):
+    return "".join(
+        [
+            '<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" '
+            'viewBox="0 0 %d %d">' % (width, height, width, height),
+            "<style>%s</style>" % SVG_STYLE,
+        ]
+        + list(elements)
+        + ["</svg>"]
+    )
+
+
+def snapshot_agents_report_data(
+    agents, with_ports=True, freq_cutoff=0, layout_method="auto"
+):
+    """Return a JSON-serializable description of all complexes of a snapshot.
+
+    Returns a list of complexes, by decreasing frequency, each a dict with
+    the "count" of the complex in the snapshot, its "frequency" (percentage
+    of all complexes), and the "nodes" and "edges" of its laid-out graph
+    (see ``complex_graph_to_json``).
+
+    See ``write_snapshot_agents_report`` for the parameters.
+    """
+    if isinstance(agents, dict):
+        agents = agents["snapshot_agents"]
+    total = sum(count for count, _ in agents)
+    agents = [
+        (count, nodes)
+        for count, nodes in sorted(agents, key=lambda agent: -agent[0])
+        if (1.0 * count / total) > freq_cutoff
+    ]
+    graphs = [
+        snapshot_agent_nodes_to_graph(nodes, with_ports=with_ports)
+        for _, nodes in agents
+    ]
+    # Small complexes are laid out all at once, which is much faster.
+    batched = [
+        i
+        for i, graph in enumerate(graphs)
+        if (layout_method in ("auto", "dense"))
+        and (len(graph) <= MAX_DENSE_LAYOUT_NODES or layout_method == "dense")
+    ]
+    batched_positions = batch_force_directed_layouts([graphs[i] for i in batched])
+    all_positions = dict(zip(batched, batched_positions))
+    complexes = []
+    for i, ((count, _), graph) in enumerate(zip(agents, graphs)):
+        positions = all_positions.get(i)
+        if positions is None:
+            positions = complex_graph_layout(graph, layout_method)
+        data = complex_graph_to_json(graph, positions)
+        data.update(count=count, frequency=round(100.0 * count / total, 3))
+        complexes.append(data)
+    return complexes
+
+
+def write_snapshot_agents_report(
+    agents,
+    target,
+    with_ports=True,
+    columns=10,
+    size=250,
+    freq_cutoff=0,
+    layout_method="auto",
+):
+    """Write a SVG or JSON report of all the complexes of a snapshot.
+
+    This is a fast alternative to ``plot_snapshot_agents`` for snapshots
+    with many complexes: the complexes are laid out and written directly as
+    SVG elements (or JSON data), in a grid, with their frequencies as
+    titles. Thousands of complexes take seconds and produce a compact file.
+
+    Parameters
+    ----------
+
+    agents
+      Snapshot agents as provided in the result of
+      ``get_simulation_results()`` by
+      ``simulation_results['snapshots']['SNAP_NAME']['snapshot_agents']``
+      (or the snapshot dict).
+
+    target
+      Path to a '.svg' or '.json' file, or a file-like object (which then
+      receives SVG).
+
+    with_ports
+      If true, ports (= agents binding sites) will be represented.
+
+    columns
+      Number of complexes per line in the SVG report.
+
+    size
+      Width and height of each complex's drawing, in pixels.
+
+    freq_cutoff
+      Complexes with a frequency lower than this fraction are ignored.
+
+    layout_method
+      Method for computing the complexes layouts, see
+      ``complex_graph_layout``.
+    """
+    complexes = snapshot_agents_report_data(
+        agents,
+        with_ports=with_ports,
+        freq_cutoff=freq_cutoff,
+        layout_method=layout_method,
+    )
+    is_path = isinstance(target, str)
+    if is_path and target.lower().endswith(".json"):
+        with open(target, "w") as f:
+            json.dump(complexes, f, separators=(",", ":"))
+        return
+
+    def elements():
+        for i, complex_data in enumerate(complexes):
+            x0, y0 = size * (i % columns), size * (i // columns)
+            yield '<text class="title" x="%.1f" y="%.1f">%.01f%%</text>' % (
+                x0 + size / 2.0,
+                y0 + 12,
+                complex_data["frequency"],
+            )
+            for element in _svg_complex_elements(complex_data, x0, y0 + 10, size - 10):
+                yield element
+
+    rows = (len(complexes) + columns - 1) // columns
+    width = size * min(columns, max(len(complexes), 1))
+    svg = _svg_document(width, size * rows, elements())
+    if is_path:
+        with open(target, "w") as f:
+            f.write(svg)
+    else:
+        target.write(svg)
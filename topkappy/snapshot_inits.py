@@ -0,0 +1,251 @@
+def complex_nodes_to_kappa(nodes):
+    """Return the Kappa pattern of a snapshot complex, e.g. 'A(b[1]), B(b[1])'.
+
+    The "nodes" are from the representation of a snapshot agent, as in
+    ``snapshot_agent_nodes_to_graph``. Bonds are given new labels 1, 2, ...
+    """
+    bond_labels = {}
+    agents = []
+    for i, node in enumerate(nodes):
+        sites = []
+        for j, site in enumerate(node["node_sites"]):
+            site_type, site_data = site["site_type"]
+            if site_type != "port":
+                raise ValueError("Unsupported site type %s" % site_type)
+            links = []
+            for link in site_data["port_links"]:
+                bond = frozenset([(i, j), tuple(link)])
+                if bond not in bond_labels:
+                    bond_labels[bond] = len(bond_labels) + 1
+                links.append(str(bond_labels[bond]))
+            site_string = "%s[%s]" % (site["site_name"], " ".join(links) or ".")
+            if len(site_data["port_states"]):
+                site_string += "{%s}" % " ".join(site_data["port_states"])
+            sites.append(site_string)
+        agents.append("%s(%s)" % (node["node_type"], ", ".join(sites)))
+    return ", ".join(agents)
+
+
+def _reordered_complex_nodes(nodes, order):
+    """Return the nodes in the given order, with sites sorted by name."""
+    new_indices = {old: new for new, old in enumerate(order)}
+    site_orders = [
+        sorted(
+            range(len(node["node_sites"])),
+            key=lambda j, node=node: node["node_sites"][j]["site_name"],
+        )
+        for node in nodes
+    ]
+    new_site_indices = [
+        {old: new for new, old in enumerate(site_order)} for site_order in site_orders
+    ]
+    reordered = []
+    for i in order:
+        node = nodes[i]
+        sites = []
+        for j in site_orders[i]:
+            site = node["node_sites"][j]
+            site_type, site_data = site["site_type"]
+            links = sorted(
+                [new_indices[i2], new_site_indices[i2][j2]]
+                for i2, j2 in site_data["port_links"]
+            )
+            site_data = dict(site_data, port_links=links)
+            sites.append(dict(site, site_type=[site_type, site_data]))
+        reordered.append(dict(node, node_sites=sites))
+    return reordered
+
+
+# Rounds of color refinement used to narrow down the traversal roots.
+COLOR_REFINEMENT_ROUNDS = 8
+
+
+def _ranks(keys):
+    """Replace each key by its rank among the distinct keys."""
+    ranks = {key: rank for rank, key in enumerate(sorted(set(keys)))}
+    return [ranks[key] for key in keys]
+
+
+def _refined_colors(nodes, site_orders, rounds=COLOR_REFINEMENT_ROUNDS):
+    """Return colors of the nodes, by Weisfeiler-Lehman-style refinement.
+
+    The colors only depend on the structure of the complex, not on the order
+    of its nodes: nodes of different colors can't be swapped by an
+    isomorphism. The refinement stops early when no color class is split.
+    """
+
+    def site_data(i, j):
+        return nodes[i]["node_sites"][j]["site_type"][1]
+
+    def site_name(i, j):
+        return nodes[i]["node_sites"][j]["site_name"]
+
+    colors = _ranks(
+        [
+            (
+                node["node_type"],
+                tuple(
+                    (
+                        site_name(i, j),
+                        len(site_data(i, j)["port_links"]),
+                        tuple(site_data(i, j)["port_states"]),
+                    )
+                    for j in site_orders[i]
+                ),
+            )
+            for i, node in enumerate(nodes)
+        ]
+    )
+    n_colors = len(set(colors))
+    for _ in range(rounds):
+        colors = _ranks(
+            [
+                (
+                    colors[i],
+                    tuple(
+                        tuple(
+                            sorted(
+                                (colors[i2], site_name(i2, j2))
+                                for i2, j2 in site_data(i, j)["port_links"]
+                            )
+                        )
+                        for j in site_orders[i]
+                    ),
+                )
+                for i in range(len(nodes))
+            ]
+        )
+        if len(set(colors)) == n_colors:
+            break
+        n_colors = len(set(colors))
+    return colors
+
+
+def _traversal_tokens(nodes, site_orders, colors, root, order):
+    """Yield one token per node of a traversal of the complex from the root.
+
+    The traversal visits the sites in alphabetical order, and the nodes are
+    appended to ``order`` as they are discovered. Each token describes a
+    node with its links given as (traversal index, site name), so two
+    traversals giving the same tokens describe the same complex.
+    """
+    new_indices = {root: 0}
+    order.append(root)
+    for i in order:
+        node = nodes[i]
+        sites = []
+        for j in site_orders[i]:
+            site = node["node_sites"][j]
+            site_data = site["site_type"][1]
+            partners = sorted(
+                site_data["port_links"],
+                key=lambda link: (
+                    colors[link[0]],
+                    nodes[link[0]]["node_sites"][link[1]]["site_name"],
+                ),
+            )
+            links = []
+            for i2, j2 in partners:
+                if i2 not in new_indices:
+                    new_indices[i2] = len(order)
+                    order.append(i2)
+                links.append(
+                    (new_indices[i2], nodes[i2]["node_sites"][j2]["site_name"])
+                )
+            sites.append(
+                (
+                    site["site_name"],
+                    tuple(site_data["port_states"]),
+                    tuple(sorted(links)),
+                )
+            )
+        yield (node["node_type"], tuple(sites))
+
+
+def canonical_complex_nodes(nodes):
+    """Return the nodes of a snapshot complex in a canonical order.
+
+    Two snapshots of the same complex species, whatever the order of their
+    agents and sites (e.g. from KaSim and from the 'gillespie' engine), give
+    the same canonical nodes, hence the same ``complex_nodes_to_kappa``
+    pattern. The agents are ordered by a traversal of the complex (sites in
+    alphabetical order) from the root giving the smallest traversal, among
+    the agents of the smallest color (see ``_refined_colors``).
+
+    Traversals are compared lazily and abandoned at the first difference,
+    and roots equivalent (by symmetry) to an already traversed root are
+    skipped, so symmetric complexes like rings or polymers of identical
+    agents take a time nearly linear in their size.
+    """
+    if not len(nodes):
+        return []
+    site_orders = [
+        sorted(
+            range(len(node["node_sites"])),
+            key=lambda j, node=node: node["node_sites"][j]["site_name"],
+        )
+        for node in nodes
+    ]
+    colors = _refined_colors(nodes, site_orders)
+    smallest_color = min(colors)
+    roots = [i for i, color in enumerate(colors) if color == smallest_color]
+
+    # Union-find of the nodes which are swapped by a known symmetry, with
+    # the classes containing an already traversed root.
+    parents = list(range(len(nodes)))
+    traversed = [False] * len(nodes)
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    best_tokens, best_order = None, None
+    for root in roots:
+        if traversed[find(root)]:
+            continue
+        traversed[find(root)] = True
+        order = []
+        tokens = _traversal_tokens(nodes, site_orders, colors, root, order)
+        if best_tokens is None:
+            best_tokens, best_order = list(tokens), order
+            continue
+        for k, token in enumerate(tokens):
+            if token != best_tokens[k]:
+                if token < best_tokens[k]:
+                    best_tokens = best_tokens[:k] + [token] + list(tokens)
+                    best_order = order
+                break
+        else:
+            # Same traversal: mapping one order to the other is a symmetry.
+            for i, i2 in zip(best_order, order):
+                class_1, class_2 = find(i), find(i2)
+                if class_1 != class_2:
+                    parents[class_1] = class_2
+                    traversed[class_2] = traversed[class_2] or traversed[class_1]
+    # Agents not connected to the root (not a proper complex) go last.
+    seen = set(best_order)
+    best_order = best_order + [i for i in range(len(nodes)) if i not in seen]
+    return _reordered_complex_nodes(nodes, best_order)
+
+
+def iter_snapshot_agents_kappa_inits(snapshot_agents):
+    """Yield the Kappa '%init:' lines reproducing a snapshot's state.
+
+    The snapshot_agents can be either a list of [count, nodes] complexes, as
+    in ``simulation_results['snapshots']['NAME']['snapshot_agents']``, or the
+    full snapshot dict.
+    """
+    if isinstance(snapshot_agents, dict):
+        snapshot_agents = snapshot_agents["snapshot_agents"]
+    for count, nodes in snapshot_agents:
+        yield "%%init: %d %s" % (count, complex_nodes_to_kappa(nodes))
+
+
+def snapshot_agents_to_kappa_inits(snapshot_agents):
+    """Return a list of Kappa '%init:' lines reproducing a snapshot's state.
+
+    See ``iter_snapshot_agents_kappa_inits`` for details.
+    """
+    return list(iter_snapshot_agents_kappa_inits(snapshot_agents))